@@ -0,0 +1,51 @@
+"""
+Cold-start cost of the model modules, measured in fresh interpreters:
+
+  lazy   import img_processing + text_processing (what the API pays now)
+  eager  the same imports followed by registry.warmup(), i.e. the old
+         behaviour of loading BLIP, CLIP and DistilBERT at import time
+
+    python bench_cold_start.py --runs 3
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+
+PROBE = """
+import json, resource, time
+start = time.perf_counter()
+import img_processing, text_processing
+imported = time.perf_counter() - start
+if {warmup}:
+    from model_registry import registry
+    registry.warmup()
+total = time.perf_counter() - start
+rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps({{"import_s": imported, "total_s": total, "peak_rss_mb": rss_mb}}))
+"""
+
+
+def run_probe(warmup: bool) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE.format(warmup=warmup)],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Measure model-module cold start.")
+    ap.add_argument("--runs", type=int, default=3)
+    args = ap.parse_args()
+
+    print(f"{'mode':<6} {'import s':>9} {'ready s':>9} {'peak RSS MB':>12}")
+    for name, warmup in (("lazy", False), ("eager", True)):
+        runs = [run_probe(warmup) for _ in range(args.runs)]
+        best = min(runs, key=lambda r: r["total_s"])
+        print(f"{name:<6} {best['import_s']:>9.2f} {best['total_s']:>9.2f} {best['peak_rss_mb']:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
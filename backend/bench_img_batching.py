@@ -0,0 +1,58 @@
+"""
+Images/sec of img_processing.embed_images (BLIP caption + CLIP image/text
+features) at several batch sizes, using the screenshots in ./screenshots:
+
+    python bench_img_batching.py --images 32 --batch_sizes 1 4 8 16
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import torch
+from PIL import Image
+
+from img_processing import embed_images, make_clip_embeddings, generate_descriptions
+
+
+def load_images(directory: str, limit: int) -> list[Image.Image]:
+    paths = sorted(Path(directory).glob("*.png"))[:limit]
+    if not paths:
+        raise SystemExit(f"No .png files found in {directory}")
+    return [Image.open(path).convert("RGB") for path in paths]
+
+
+def timed(fn, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark batched BLIP/CLIP inference.")
+    ap.add_argument("--screenshots", default="screenshots")
+    ap.add_argument("--images", type=int, default=32)
+    ap.add_argument("--batch_sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    ap.add_argument("--threads", type=int, default=None, help="torch.set_num_threads")
+    args = ap.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    images = load_images(args.screenshots, args.images)
+    captions = ["a website with an atmosphere that feels calm and minimal"] * len(images)
+    print(f"{len(images)} images, torch threads={torch.get_num_threads()}, cuda={torch.cuda.is_available()}")
+
+    embed_images(images[:2], batch_size=2)  # warm up weights and kernels
+
+    print(f"{'batch':>5} {'BLIP img/s':>11} {'CLIP img/s':>11} {'total img/s':>12}")
+    for batch_size in args.batch_sizes:
+        blip = timed(generate_descriptions, images, batch_size=batch_size)
+        clip = timed(make_clip_embeddings, images, captions, batch_size=batch_size)
+        total = timed(embed_images, images, batch_size=batch_size)
+        n = len(images)
+        print(f"{batch_size:>5} {n / blip:>11.2f} {n / clip:>11.2f} {n / total:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
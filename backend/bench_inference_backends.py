@@ -0,0 +1,118 @@
+"""
+Latency, memory and output parity of the inference backends
+(INFERENCE_BACKEND=torch | onnx | onnx-int8) for CLIP image, CLIP text and
+DistilBERT text embedding.
+
+Each backend runs in a fresh interpreter so peak RSS is its own. Outputs are
+compared with the torch backend by cosine similarity; the script exits with
+status 1 if any backend falls below --min_cosine, so it doubles as a parity check:
+
+    python bench_inference_backends.py --images 16 --texts 64
+    python bench_inference_backends.py --backends onnx-int8 --min_cosine 0.97
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+PROBE = """
+import os
+os.environ["STAGE_CACHE_PATH"] = ""
+import json, random, resource, time
+import numpy as np
+from PIL import Image
+from model_registry import registry
+import onnx_backend
+from img_processing import clip_image_features, clip_text_features
+from text_processing import get_text_embeddings_batch
+
+rng = random.Random(0)
+words = "calm bold playful minimal vibrant dark soft sharp organic clean retro news shop blog video".split()
+images = [Image.fromarray(np.random.default_rng(i).integers(0, 255, (384, 512, 3), dtype=np.uint8)) for i in range({images})]
+captions = [" ".join(rng.choices(words, k=rng.randint(4, 20))) for _ in range({texts})]
+documents = [" ".join(rng.choices(words, k=rng.choice([40, 150, 400]))) for _ in range({texts})]
+
+start = time.perf_counter()
+clip_image_features(images[:1]); clip_text_features(captions[:1]); get_text_embeddings_batch(documents[:1])
+load_s = time.perf_counter() - start
+
+timings = {{}}
+outputs = {{}}
+for name, fn in (
+    ("clip_image", lambda: clip_image_features(images)),
+    ("clip_text", lambda: clip_text_features(captions)),
+    ("distilbert", lambda: get_text_embeddings_batch(documents)),
+):
+    runs = []
+    for _ in range({repeat}):
+        start = time.perf_counter()
+        outputs[name] = fn()
+        runs.append(time.perf_counter() - start)
+    timings[name] = min(runs)
+
+np.savez({out!r}, **{{name: np.asarray(value, dtype=np.float32) for name, value in outputs.items()}})
+print(json.dumps({{
+    "load_s": load_s,
+    "timings": timings,
+    "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}}))
+"""
+
+
+def run_backend(backend: str, args, out_path: str) -> dict:
+    env = {**os.environ, "INFERENCE_BACKEND": backend}
+    code = PROBE.format(images=args.images, texts=args.texts, repeat=args.repeat, out=out_path)
+    out = subprocess.run([sys.executable, "-c", code], env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def min_cosine(a: np.ndarray, b: np.ndarray) -> float:
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return float((a * b).sum(axis=1).min())
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark and parity-check inference backends.")
+    ap.add_argument("--backends", default="onnx,onnx-int8", help="Compared against torch")
+    ap.add_argument("--images", type=int, default=16)
+    ap.add_argument("--texts", type=int, default=64)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--min_cosine", type=float, default=0.98)
+    args = ap.parse_args()
+
+    backends = ["torch"] + [b for b in args.backends.split(",") if b and b != "torch"]
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        for backend in backends:
+            results[backend] = run_backend(backend, args, os.path.join(tmp, f"{backend}.npz"))
+        reference = np.load(os.path.join(tmp, "torch.npz"))
+
+        print(f"{args.images} images, {args.texts} captions / documents; best of {args.repeat}")
+        print(f"{'backend':<10} {'stage':<11} {'ms/item':>8} {'min cos':>8} {'load s':>7} {'peak RSS MB':>12}")
+        for backend in backends:
+            outputs = np.load(os.path.join(tmp, f"{backend}.npz"))
+            result = results[backend]
+            for stage, seconds in result["timings"].items():
+                items = args.images if stage == "clip_image" else args.texts
+                cosine = min_cosine(outputs[stage], reference[stage])
+                ok = cosine >= args.min_cosine
+                failed |= not ok
+                print(
+                    f"{backend:<10} {stage:<11} {1000 * seconds / items:>8.2f} {cosine:>8.4f}"
+                    f" {result['load_s']:>7.1f} {result['peak_rss_mb']:>12.0f}{'' if ok else '  FAIL'}"
+                )
+
+    if failed:
+        print(f"Parity check failed: cosine similarity below {args.min_cosine}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Throughput benchmark: asyncio JobEngine vs the old queue.Queue worker threads.
+
+Jobs are simulated (an awaited "crawl" plus a little CPU work), so this
+measures scheduling overhead and concurrency, not crawl4ai itself:
+
+    python bench_job_engine.py --jobs 200 --io_ms 200
+"""
+
+import argparse
+import asyncio
+import queue
+import threading
+import time
+
+from job_engine import JobEngine
+
+
+def make_job(io_ms: float, cpu_iters: int):
+    async def fake_job(url: str):
+        await asyncio.sleep(io_ms / 1000)
+        total = 0
+        for i in range(cpu_iters):
+            total += i * i
+        return {"status": "completed"}
+    return fake_job
+
+
+def bench_threads(jobs: int, workers: int, fake_job) -> float:
+    """The previous design: daemon threads, a new event loop per job."""
+    job_queue = queue.Queue()
+
+    def process_queue():
+        while True:
+            url = job_queue.get()
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            try:
+                loop.run_until_complete(fake_job(url))
+            finally:
+                loop.close()
+                job_queue.task_done()
+
+    for _ in range(workers):
+        threading.Thread(target=process_queue, daemon=True).start()
+
+    start = time.perf_counter()
+    for i in range(jobs):
+        job_queue.put(f"https://site-{i}.example")
+    job_queue.join()
+    return time.perf_counter() - start
+
+
+async def bench_engine(jobs: int, concurrency: int, fake_job) -> float:
+    engine = JobEngine(lambda job: fake_job(job.url), concurrency=concurrency)
+    await engine.start()
+    start = time.perf_counter()
+    for i in range(jobs):
+        engine.submit(f"https://site-{i}.example")
+    await engine.queue.join()
+    elapsed = time.perf_counter() - start
+    await engine.stop()
+    return elapsed
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare job engine throughput.")
+    ap.add_argument("--jobs", type=int, default=200)
+    ap.add_argument("--io_ms", type=float, default=200, help="Simulated crawl latency per job")
+    ap.add_argument("--cpu_iters", type=int, default=20000, help="Simulated CPU work per job")
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[3, 16, 64])
+    args = ap.parse_args()
+
+    fake_job = make_job(args.io_ms, args.cpu_iters)
+    print(f"{args.jobs} jobs, {args.io_ms:.0f} ms simulated I/O each")
+    print(f"{'design':<22} {'seconds':>8} {'jobs/s':>8}")
+
+    elapsed = bench_threads(args.jobs, 3, fake_job)
+    print(f"{'threads (3 workers)':<22} {elapsed:>8.2f} {args.jobs / elapsed:>8.1f}")
+
+    for concurrency in args.concurrency:
+        elapsed = asyncio.run(bench_engine(args.jobs, concurrency, fake_job))
+        name = f"engine (c={concurrency})"
+        print(f"{name:<22} {elapsed:>8.2f} {args.jobs / elapsed:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
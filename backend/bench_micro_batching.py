@@ -0,0 +1,61 @@
+"""
+Throughput and queueing latency of MicroBatcher against unbatched calls,
+using a simulated model whose forward pass costs a fixed overhead plus a
+smaller per-item cost (the shape of a CLIP/DistilBERT batch on CPU):
+
+    python bench_micro_batching.py --callers 1,8,32 --max_wait_ms 10
+"""
+
+import argparse
+import asyncio
+import time
+
+from micro_batcher import MicroBatcher
+
+
+def simulated_model(overhead: float, per_item: float):
+    device = asyncio.Lock()  # one forward pass at a time, like a single model worker
+
+    async def run_batch(items):
+        async with device:
+            await asyncio.sleep(overhead + per_item * len(items))
+        return [item * 2 for item in items]
+    return run_batch
+
+
+async def run(callers: int, requests: int, batcher: MicroBatcher) -> float:
+    async def caller(offset: int):
+        for i in range(offset, requests, callers):
+            assert await batcher.submit(i) == i * 2
+
+    start = time.perf_counter()
+    await asyncio.gather(*(caller(offset) for offset in range(callers)))
+    batcher.close()
+    return time.perf_counter() - start
+
+
+async def main():
+    ap = argparse.ArgumentParser(description="Benchmark cross-request micro-batching.")
+    ap.add_argument("--callers", default="1,8,32")
+    ap.add_argument("--requests", type=int, default=256)
+    ap.add_argument("--max_wait_ms", type=float, default=10)
+    ap.add_argument("--max_batch", type=int, default=32)
+    ap.add_argument("--overhead_ms", type=float, default=20)
+    ap.add_argument("--per_item_ms", type=float, default=2)
+    args = ap.parse_args()
+
+    print(f"{'callers':>7} {'mode':<10} {'req/s':>8} {'batch':>6} {'fill':>6} {'queue p50 ms':>13} {'queue p95 ms':>13}")
+    for callers in [int(c) for c in args.callers.split(",")]:
+        for mode, max_wait in (("unbatched", 0), ("batched", args.max_wait_ms / 1000)):
+            model = simulated_model(args.overhead_ms / 1000, args.per_item_ms / 1000)
+            batcher = MicroBatcher("bench", model, max_batch=args.max_batch, max_wait=max_wait)
+            elapsed = await run(callers, args.requests, batcher)
+            stats = batcher.stats()
+            print(
+                f"{callers:>7} {mode:<10} {args.requests / elapsed:>8.1f} {stats['avg_batch_size']:>6.1f}"
+                f" {stats['fill_ratio']:>6.2f} {stats['queue_ms_p50']:>13.2f} {stats['queue_ms_p95']:>13.2f}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,228 @@
+"""
+Offline benchmark of the embedding pipeline on a fixed local corpus, plus
+retrieval quality against the reference rankings in v1/*.json.gz.
+
+The corpus is the screenshots in ./screenshots (abc_es.png -> abc.es). Saved
+pages in --html_dir use the same file names with .html. Every page goes
+through each stage in turn, with the stage cache disabled:
+
+  preprocess      decode screenshot + viewport tiles
+  extract         visible-text extraction (only with --html_dir)
+  caption         BLIP captions per tile
+  clip_image      CLIP image features per tile
+  clip_text       CLIP text features per caption
+  text_embedding  DistilBERT embedding of the page text (only with --html_dir)
+
+Each stage reports latency, throughput, current RSS and peak RSS. Site
+vectors are combined the way crawler_loader does. Each v1 word is embedded
+with CLIP text features, and the resulting ranking of corpus sites is scored
+against the reference ranking:
+
+  top1    our best site is the reference's best site among the corpus
+  ndcg@3  graded by reference score (sites missing from the reference count 0)
+
+Results go to a JSON file for regression tracking; --compare prints the
+change from an earlier run:
+
+    python bench_pipeline.py --limit 100 --out bench_results/pipeline.json
+    python bench_pipeline.py --html_dir saved_pages/ --compare bench_results/pipeline.json
+"""
+
+import os
+
+os.environ["STAGE_CACHE_PATH"] = ""
+
+import argparse
+import gzip
+import json
+import resource
+import subprocess
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import psutil
+
+import onnx_backend
+from image_preprocess import decode_screenshot, tile_screenshot
+from img_processing import IMG_BATCH_SIZE, clip_image_features, clip_text_features, generate_descriptions
+from text_extraction import count_tokens, extract_visible_text
+from text_processing import TEXT_BATCH_SIZE, get_text_embeddings_batch
+from url_utils import normalize_url
+
+
+def load_corpus(screenshot_dir: str, html_dir: str | None, limit: int) -> list[dict]:
+    pages = []
+    for path in sorted(Path(screenshot_dir).glob("*.png"))[:limit]:
+        html_path = Path(html_dir) / f"{path.stem}.html" if html_dir else None
+        pages.append({
+            "id": normalize_url(path.stem.replace("_", ".")),
+            "screenshot": path.read_bytes(),
+            "html": html_path.read_text(errors="ignore") if html_path and html_path.exists() else None,
+        })
+    return pages
+
+
+def load_reference(rankings_dir: str) -> dict[str, dict[str, float]]:
+    reference = {}
+    for path in sorted(Path(rankings_dir).glob("*.json.gz")):
+        with gzip.open(path, "rt") as f:
+            data = json.load(f)
+        reference[data["w"]] = {normalize_url(url): score for url, score in data["r"]}
+    return reference
+
+
+def run_stage(stages: dict, name: str, items: int, fn):
+    start = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - start
+    stages[name] = {
+        "items": items,
+        "seconds": round(seconds, 3),
+        "ms_per_item": round(1000 * seconds / items, 2) if items else 0.0,
+        "items_per_s": round(items / seconds, 2) if seconds else 0.0,
+        "rss_mb": round(psutil.Process().memory_info().rss / 2**20, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+    print(f"[Bench] {name:<15} {items:>5} items {seconds:>8.2f}s {stages[name]['items_per_s']:>8.2f}/s "
+          f"rss {stages[name]['rss_mb']:.0f} MB")
+    return result
+
+
+def ndcg_at_k(ranked: list[str], gains: dict[str, float], k: int) -> float:
+    dcg = sum(gains.get(site, 0.0) / np.log2(i + 2) for i, site in enumerate(ranked[:k]))
+    ideal = sorted(gains.values(), reverse=True)[:k]
+    idcg = sum(gain / np.log2(i + 2) for i, gain in enumerate(ideal))
+    return dcg / idcg if idcg else 0.0
+
+
+def score_rankings(site_ids: list[str], site_vectors: np.ndarray, reference: dict, k: int = 3) -> dict:
+    """top-1 accuracy and NDCG@k of CLIP-text queries against the reference rankings"""
+    words = list(reference)
+    queries = np.asarray(clip_text_features(words), dtype=np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    sites = site_vectors / np.linalg.norm(site_vectors, axis=1, keepdims=True)
+    scores = queries @ sites.T
+
+    corpus = set(site_ids)
+    per_word = {}
+    for word, row in zip(words, scores):
+        in_corpus = {site: score for site, score in reference[word].items() if site in corpus}
+        if not in_corpus:
+            continue
+        # Min-max the reference scores within the corpus so gains are in (0, 1]
+        low, high = min(in_corpus.values()), max(in_corpus.values())
+        gains = {site: (score - low) / (high - low) if high > low else 1.0 for site, score in in_corpus.items()}
+        gains = {site: gain + 1e-3 for site, gain in gains.items()}  # the lowest listed site still beats unlisted ones
+        ranked = [site_ids[i] for i in np.argsort(-row)]
+        per_word[word] = {
+            "candidates": len(in_corpus),
+            "top1": float(ranked[0] == max(in_corpus, key=in_corpus.get)),
+            f"ndcg@{k}": round(float(ndcg_at_k(ranked, gains, k)), 4),
+        }
+    mean = {
+        metric: round(float(np.mean([m[metric] for m in per_word.values()])), 4)
+        for metric in ("top1", f"ndcg@{k}")
+    } if per_word else {}
+    return {"mean": mean, "per_word": per_word}
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: dict, previous_path: str):
+    with open(previous_path) as f:
+        previous = json.load(f)
+    print(f"\nChange vs {previous_path} ({previous['meta'].get('commit')})")
+    for name, stage in current["stages"].items():
+        before = previous["stages"].get(name)
+        if before and before["items_per_s"]:
+            change = stage["items_per_s"] / before["items_per_s"] - 1
+            print(f"  {name:<15} {before['items_per_s']:>8.2f} -> {stage['items_per_s']:>8.2f} items/s ({change:+.0%})")
+    for metric, value in current["quality"]["mean"].items():
+        before = previous["quality"]["mean"].get(metric)
+        if before is not None:
+            print(f"  {metric:<15} {before:>8.4f} -> {value:>8.4f} ({value - before:+.4f})")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark the embedding pipeline and score retrieval quality.")
+    ap.add_argument("--screenshots", default="screenshots")
+    ap.add_argument("--html_dir", help="Saved pages named like the screenshots, with .html")
+    ap.add_argument("--rankings", default="v1", help="Directory of reference <word>.json.gz rankings")
+    ap.add_argument("--limit", type=int, default=1000, help="Max pages")
+    ap.add_argument("--out", default="bench_results/pipeline.json")
+    ap.add_argument("--compare", help="Earlier result JSON to diff against")
+    args = ap.parse_args()
+
+    pages = load_corpus(args.screenshots, args.html_dir, args.limit)
+    reference = load_reference(args.rankings)
+    print(f"[Bench] {len(pages)} pages, {len(reference)} reference words, backend={onnx_backend.INFERENCE_BACKEND}")
+    stages = {}
+
+    tiles_per_page = run_stage(stages, "preprocess", len(pages), lambda: [
+        tile_screenshot(decode_screenshot(page["screenshot"])) for page in pages
+    ])
+    tiles = [tile for page_tiles in tiles_per_page for tile in page_tiles]
+    captions = run_stage(stages, "caption", len(tiles), lambda: generate_descriptions(tiles))
+    image_vectors = run_stage(stages, "clip_image", len(tiles), lambda: clip_image_features(tiles))
+    caption_vectors = run_stage(stages, "clip_text", len(captions), lambda: clip_text_features(captions))
+
+    text_vectors = {}
+    token_counts = None
+    with_html = [page for page in pages if page["html"]]
+    if with_html:
+        texts = run_stage(stages, "extract", len(with_html), lambda: [extract_visible_text(p["html"]) for p in with_html])
+        token_counts = {
+            "raw": sum(count_tokens(p["html"]) for p in with_html),
+            "extracted": sum(count_tokens(text) for text in texts),
+        }
+        vectors = run_stage(stages, "text_embedding", len(texts), lambda: get_text_embeddings_batch(texts))
+        text_vectors = {page["id"]: vector for page, vector in zip(with_html, vectors)}
+
+    # Site vector: mean over tiles of (CLIP image + caption) / 2, then averaged with the text vector
+    site_vectors = []
+    position = 0
+    for page, page_tiles in zip(pages, tiles_per_page):
+        count = len(page_tiles)
+        image_vector = np.mean(
+            [image_vectors[position:position + count], caption_vectors[position:position + count]], axis=(0, 1)
+        )
+        position += count
+        if page["id"] in text_vectors:
+            image_vector = np.mean([image_vector, text_vectors[page["id"]]], axis=0)
+        site_vectors.append(image_vector)
+
+    quality = score_rankings([page["id"] for page in pages], np.asarray(site_vectors, dtype=np.float32), reference)
+    print(f"[Bench] quality: {quality['mean']}")
+
+    result = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "commit": git_commit(),
+            "inference_backend": onnx_backend.INFERENCE_BACKEND,
+            "img_batch_size": IMG_BATCH_SIZE,
+            "text_batch_size": TEXT_BATCH_SIZE,
+            "pages": len(pages),
+            "tiles": len(tiles),
+            "pages_with_html": len(with_html),
+            "text_tokens": token_counts,
+        },
+        "stages": stages,
+        "quality": quality,
+    }
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    if args.compare:
+        compare(result, args.compare)
+    with open(args.out, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"[Bench] Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+CPU time and peak Python-heap memory of screenshot preprocessing for BLIP and
+CLIP on tall pages. It compares the two paths:
+
+  processors  each HF processor resizes and normalizes the full page
+  tiles       decode once, viewport tiles, one PIL resize per model, normalize
+
+It also reports the largest pixel difference between the two paths on a
+single viewport-sized image, where both should agree. Only the processors are
+loaded; the model weights are not:
+
+    python bench_screenshot_preprocess.py --height 12000 --runs 5
+"""
+
+import argparse
+import base64
+import io
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+from transformers import BlipProcessor, CLIPProcessor
+
+from image_preprocess import decode_screenshot, tile_screenshot
+from img_processing import blip_pixel_values, clip_pixel_values
+
+
+def fake_page(width: int, height: int) -> str:
+    """A noisy full-page PNG, base64-encoded like crawl4ai's result.screenshot"""
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 255, (height // 8, width // 8, 3), dtype=np.uint8)
+    img = Image.fromarray(pixels).resize((width, height), Image.NEAREST)
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return base64.b64encode(buf.getvalue()).decode()
+
+
+def measure(fn, runs: int) -> tuple[float, float]:
+    best = float("inf")
+    tracemalloc.start()
+    for _ in range(runs):
+        start = time.process_time()
+        fn()
+        best = min(best, time.process_time() - start)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak / 2**20
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark screenshot preprocessing.")
+    ap.add_argument("--width", type=int, default=1080)
+    ap.add_argument("--height", type=int, default=12000)
+    ap.add_argument("--runs", type=int, default=5)
+    args = ap.parse_args()
+
+    blip_processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-large")
+    clip_processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
+    screenshot = fake_page(args.width, args.height)
+
+    def processors():
+        page = Image.open(io.BytesIO(base64.b64decode(screenshot)))
+        blip_processor(images=[page], return_tensors="pt")
+        clip_processor(images=[page], return_tensors="pt")
+
+    def tiles():
+        page_tiles = tile_screenshot(decode_screenshot(screenshot))
+        blip_pixel_values(blip_processor, page_tiles)
+        clip_pixel_values(clip_processor, page_tiles)
+
+    print(f"page {args.width}x{args.height}, best of {args.runs}")
+    print(f"{'path':<11} {'cpu s':>7} {'peak MB':>8}")
+    for name, fn in (("processors", processors), ("tiles", tiles)):
+        cpu, peak = measure(fn, args.runs)
+        print(f"{name:<11} {cpu:>7.3f} {peak:>8.1f}")
+
+    viewport = tile_screenshot(decode_screenshot(screenshot))[0]
+    blip_diff = (blip_processor(images=[viewport], return_tensors="pt")["pixel_values"]
+                 - blip_pixel_values(blip_processor, [viewport])).abs().max().item()
+    clip_diff = (clip_processor(images=[viewport], return_tensors="pt")["pixel_values"]
+                 - clip_pixel_values(clip_processor, [viewport])).abs().max().item()
+    print(f"max |diff| on one viewport: blip {blip_diff:.2e}, clip {clip_diff:.2e}")
+
+
+if __name__ == "__main__":
+    main()
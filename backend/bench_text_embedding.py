@@ -0,0 +1,70 @@
+"""
+Documents/sec for DistilBERT text embedding: the one-at-a-time path vs the
+length-bucketed batch API, and the long-document (windowed) mode.
+
+Uses saved HTML files when given, otherwise synthetic documents of mixed
+length. The stage cache is disabled so every document is really embedded:
+
+    python bench_text_embedding.py --docs 64
+    python bench_text_embedding.py --html_dir saved_pages/
+"""
+
+import os
+
+os.environ["STAGE_CACHE_PATH"] = ""
+
+import argparse
+import random
+import time
+from pathlib import Path
+
+from model_registry import registry
+from text_processing import get_text_embeddings_batch, embed_windows
+
+WORDS = "calm bold playful minimal vibrant dark soft sharp organic clean retro news shop blog video".split()
+
+
+def synthetic_docs(n: int) -> list[str]:
+    rng = random.Random(0)
+    return [" ".join(rng.choices(WORDS, k=rng.choice([40, 150, 400, 1500, 6000]))) for _ in range(n)]
+
+
+def one_at_a_time(texts: list[str]):
+    """The previous behaviour: one tokenizer call and one forward pass per document"""
+    tokenizer, _ = registry.get("distilbert")
+    for text in texts:
+        ids = tokenizer(text, truncation=True, max_length=512)["input_ids"]
+        embed_windows([ids], batch_size=1)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark batched text embedding.")
+    ap.add_argument("--docs", type=int, default=64)
+    ap.add_argument("--html_dir", help="Directory of saved .html pages")
+    ap.add_argument("--batch_size", type=int, default=16)
+    args = ap.parse_args()
+
+    if args.html_dir:
+        texts = [p.read_text(errors="ignore") for p in sorted(Path(args.html_dir).glob("*.html"))][:args.docs]
+    else:
+        texts = synthetic_docs(args.docs)
+
+    registry.warmup(["distilbert", "text_projection"])
+    get_text_embeddings_batch(texts[:2])  # warm up kernels
+
+    runs = [
+        ("one-at-a-time", lambda: one_at_a_time(texts)),
+        (f"batch (bs={args.batch_size})", lambda: get_text_embeddings_batch(texts, batch_size=args.batch_size)),
+        ("long-document", lambda: get_text_embeddings_batch(texts, batch_size=args.batch_size, long_document=True)),
+    ]
+    print(f"{len(texts)} documents")
+    print(f"{'mode':<18} {'seconds':>8} {'docs/s':>8}")
+    for name, fn in runs:
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        print(f"{name:<18} {elapsed:>8.2f} {len(texts) / elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Bulk indexing throughput: one index.upsert per vector (the old behaviour)
+against the buffered UpsertWriter.
+
+The index is a local stand-in that keeps the vectors in a dict. Each request
+costs a simulated round-trip plus a per-vector cost, and can fail at random,
+which exercises the writer's retry and split handling:
+
+    python bench_upsert_writer.py --vectors 2000 --dim 3072 --rtt_ms 40 --fail_rate 0.05
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+import numpy as np
+
+from server_utils import run_blocking
+from upsert_writer import UpsertWriter
+
+
+class StandInIndex:
+    def __init__(self, rtt: float, per_vector: float, fail_rate: float):
+        self.rtt = rtt
+        self.per_vector = per_vector
+        self.fail_rate = fail_rate
+        self.vectors = {}
+        self.requests = 0
+        self.rng = random.Random(0)
+
+    def upsert(self, vectors: list[dict], namespace: str = ""):
+        self.requests += 1
+        time.sleep(self.rtt + self.per_vector * len(vectors))
+        if self.rng.random() < self.fail_rate:
+            raise ConnectionError("simulated upsert failure")
+        for vector in vectors:
+            self.vectors[vector["id"]] = vector["values"]
+        return {"upserted_count": len(vectors)}
+
+
+async def unbatched(index: StandInIndex, vectors: list[dict], concurrency: int):
+    """One upsert per vector from `concurrency` callers, retrying failures"""
+    queue = list(vectors)
+
+    async def caller():
+        while queue:
+            vector = queue.pop()
+            while True:
+                try:
+                    await run_blocking(index.upsert, vectors=[vector], namespace="")
+                    break
+                except ConnectionError:
+                    await asyncio.sleep(0.05)
+
+    await asyncio.gather(*(caller() for _ in range(concurrency)))
+
+
+async def batched(index: StandInIndex, vectors: list[dict], batch_size: int, parallel: int) -> dict:
+    writer = UpsertWriter(index, batch_size=batch_size, max_parallel=parallel, flush_interval=0.05)
+    results = await asyncio.gather(*(writer.add(vector) for vector in vectors), return_exceptions=True)
+    await writer.close()
+    failed = sum(isinstance(result, Exception) for result in results)
+    return {**writer.stats(), "caller_failures": failed}
+
+
+async def main():
+    ap = argparse.ArgumentParser(description="Benchmark batched Pinecone upserts against a local stand-in.")
+    ap.add_argument("--vectors", type=int, default=2000)
+    ap.add_argument("--dim", type=int, default=3072)
+    ap.add_argument("--rtt_ms", type=float, default=40)
+    ap.add_argument("--per_vector_ms", type=float, default=0.05)
+    ap.add_argument("--fail_rate", type=float, default=0.05)
+    ap.add_argument("--concurrency", type=int, default=8, help="Callers in the unbatched run")
+    ap.add_argument("--batch_size", type=int, default=100)
+    ap.add_argument("--parallel", type=int, default=4)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = [
+        {"id": f"site-{i}.example", "values": rng.standard_normal(args.dim).astype(np.float32).tolist()}
+        for i in range(args.vectors)
+    ]
+    print(f"{args.vectors} vectors x {args.dim}d, rtt {args.rtt_ms} ms, fail rate {args.fail_rate}")
+    print(f"{'mode':<28} {'seconds':>8} {'vectors/s':>10} {'requests':>9} {'written':>8}")
+
+    def stand_in():
+        return StandInIndex(args.rtt_ms / 1000, args.per_vector_ms / 1000, args.fail_rate)
+
+    index = stand_in()
+    start = time.perf_counter()
+    await unbatched(index, vectors, args.concurrency)
+    elapsed = time.perf_counter() - start
+    print(f"{f'unbatched (c={args.concurrency})':<28} {elapsed:>8.2f} {args.vectors / elapsed:>10.1f} "
+          f"{index.requests:>9} {len(index.vectors):>8}")
+
+    index = stand_in()
+    start = time.perf_counter()
+    stats = await batched(index, vectors, args.batch_size, args.parallel)
+    elapsed = time.perf_counter() - start
+    print(f"{f'writer (bs={args.batch_size}, p={args.parallel})':<28} {elapsed:>8.2f} {args.vectors / elapsed:>10.1f} "
+          f"{index.requests:>9} {len(index.vectors):>8}")
+    print(f"writer stats: {stats}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,93 @@
+"""
+Latency and recall benchmark for the local vector index modes.
+
+Compares exact float32 search (the reference), exact float16 and HNSW on
+either an exported snapshot or a synthetic corpus:
+
+    python bench_vector_index.py --snapshot index_snapshot
+    python bench_vector_index.py --n 5000 --dim 3072
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from vector_index import LocalIndex, hnswlib, write_snapshot
+
+
+def percentile_ms(samples, pct):
+    return float(np.percentile(samples, pct) * 1000)
+
+
+def run_queries(local_index: LocalIndex, queries, top_k):
+    latencies, results = [], []
+    for q in queries:
+        start = time.perf_counter()
+        response = local_index.query(q, top_k=top_k)
+        latencies.append(time.perf_counter() - start)
+        results.append([m["id"] for m in response.matches])
+    return latencies, results
+
+
+def recall_at_k(reference, candidate):
+    hits = [len(set(r) & set(c)) / max(len(r), 1) for r, c in zip(reference, candidate)]
+    return float(np.mean(hits))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark local vector index modes.")
+    ap.add_argument("--snapshot", help="Existing snapshot directory (default: synthetic corpus)")
+    ap.add_argument("--n", type=int, default=5000, help="Synthetic corpus size")
+    ap.add_argument("--dim", type=int, default=3072, help="Synthetic vector dimension")
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--top_k", type=int, default=500)
+    ap.add_argument("--ef", type=int, default=600, help="HNSW search ef (must be >= top_k)")
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    workdir = Path(tempfile.mkdtemp(prefix="bench_index_"))
+
+    if args.snapshot:
+        source = LocalIndex(args.snapshot)
+        ids = source.ids
+        vectors = np.asarray(source.matrix, dtype=np.float32)
+    else:
+        ids = [f"site-{i}" for i in range(args.n)]
+        # Clustered vectors look more like real embeddings than pure noise
+        centers = rng.normal(size=(32, args.dim))
+        vectors = centers[rng.integers(0, 32, size=args.n)] + 0.5 * rng.normal(size=(args.n, args.dim))
+
+    write_snapshot(workdir / "f32", ids, vectors, dtype="float32")
+    write_snapshot(workdir / "f16", ids, vectors, dtype="float16")
+
+    # Queries near real rows, like an adjective landing in a cluster of sites
+    picks = rng.integers(0, len(ids), size=args.queries)
+    queries = np.asarray(vectors, dtype=np.float32)[picks] + 0.3 * rng.normal(size=(args.queries, vectors.shape[1]))
+
+    modes = [("exact-f32", workdir / "f32", "exact"), ("exact-f16", workdir / "f16", "exact")]
+    if hnswlib is not None:
+        modes.append(("hnsw-f32", workdir / "f32", "hnsw"))
+    else:
+        print("hnswlib not installed, skipping HNSW")
+
+    print(f"Corpus: {len(ids)} x {vectors.shape[1]}, {args.queries} queries, top_k={args.top_k}")
+    print(f"{'mode':<10} {'p50 ms':>8} {'p99 ms':>8} {'recall':>8}")
+
+    reference = None
+    for name, path, mode in modes:
+        local_index = LocalIndex(path, mode=mode, ef=args.ef)
+        run_queries(local_index, queries[:5], args.top_k)  # warm page cache / BLAS
+        latencies, results = run_queries(local_index, queries, args.top_k)
+        if reference is None:
+            reference = results
+        print(
+            f"{name:<10} {percentile_ms(latencies, 50):>8.2f} {percentile_ms(latencies, 99):>8.2f} "
+            f"{recall_at_k(reference, results):>8.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
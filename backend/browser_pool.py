@@ -0,0 +1,109 @@
+"""
+Pool of long-lived crawl4ai browsers.
+
+Starting Chromium costs far more than loading a page, so the pool keeps `size`
+browsers warm and leases them to crawl tasks. A browser is recycled (closed and
+relaunched) after `max_pages` pages, or right away if a crawl on it raises.
+"""
+
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from crawl4ai import AsyncWebCrawler, BrowserConfig
+
+
+class BrowserSlot:
+    def __init__(self, slot_id: int):
+        self.slot_id = slot_id
+        self.crawler = None
+        self.pages = 0
+
+
+class BrowserPool:
+    def __init__(self, size: int = 2, max_pages: int = 100, browser_config: BrowserConfig | None = None):
+        self.size = size
+        self.max_pages = max_pages
+        self.browser_config = browser_config or BrowserConfig(verbose=False)
+
+        self.available = None
+        self.slots = []
+        self.page_times = deque()  # completion times over the last minute
+        self.counters = {"pages": 0, "failures": 0, "recycled": 0}
+        self.started_at = None
+
+    async def _launch(self, slot: BrowserSlot):
+        slot.crawler = AsyncWebCrawler(config=self.browser_config)
+        await slot.crawler.start()
+        slot.pages = 0
+
+    async def _recycle(self, slot: BrowserSlot):
+        try:
+            await slot.crawler.close()
+        except Exception as e:
+            print(f"[Browsers] Error closing browser {slot.slot_id}: {e}")
+        self.counters["recycled"] += 1
+        try:
+            await self._launch(slot)
+        except Exception as e:
+            # Retried on the next lease of this slot
+            print(f"[Browsers] Error relaunching browser {slot.slot_id}: {e}")
+            slot.crawler = None
+
+    async def start(self):
+        self.available = asyncio.Queue()
+        self.slots = [BrowserSlot(i) for i in range(self.size)]
+        await asyncio.gather(*(self._launch(slot) for slot in self.slots))
+        for slot in self.slots:
+            self.available.put_nowait(slot)
+        self.started_at = time.time()
+        print(f"[Browsers] Started {self.size} browsers")
+
+    async def close(self):
+        for slot in self.slots:
+            if slot.crawler is not None:
+                await slot.crawler.close()
+                slot.crawler = None
+        self.slots = []
+
+    @asynccontextmanager
+    async def lease(self):
+        """Borrow a started AsyncWebCrawler for one page."""
+        slot = await self.available.get()
+        failed = False
+        try:
+            if slot.crawler is None:
+                await self._launch(slot)
+            yield slot.crawler
+        except Exception:
+            failed = True
+            raise
+        finally:
+            slot.pages += 1
+            self.counters["pages"] += 1
+            self.counters["failures"] += failed
+            self.page_times.append(time.time())
+            try:
+                if failed or slot.pages >= self.max_pages:
+                    await self._recycle(slot)
+            finally:
+                self.available.put_nowait(slot)
+
+    def pages_per_minute(self) -> float:
+        now = time.time()
+        while self.page_times and self.page_times[0] < now - 60:
+            self.page_times.popleft()
+        if self.started_at is None:
+            return 0.0
+        window = min(60.0, max(now - self.started_at, 1e-9))
+        return len(self.page_times) * 60.0 / window
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "in_use": self.size - (self.available.qsize() if self.available else 0),
+            "max_pages_per_browser": self.max_pages,
+            "pages_per_minute": round(self.pages_per_minute(), 2),
+            **self.counters,
+        }
@@ -1,7 +1,9 @@
 import asyncio
 from crawl4ai import AsyncWebCrawler, CrawlerRunConfig, BrowserConfig
-from PIL import Image
-import io
+from image_preprocess import decode_screenshot, tile_screenshot
+from text_extraction import extract_page_text
+from server_utils import run_blocking
+from crawl_scheduler import retry_after_seconds
 
 
 
@@ -13,40 +15,70 @@ run_config = CrawlerRunConfig(
     screenshot=True
 ) 
 
+# Errors meaning the browser itself is gone, not just that this page failed
+BROWSER_CRASH_MARKERS = (
+    "browser has been closed",
+    "target closed",
+    "target page, context or browser has been closed",
+    "connection closed",
+    "browser.newcontext",
+)
+
+def is_browser_crash(e: Exception) -> bool:
+    message = str(e).lower()
+    return any(marker in message for marker in BROWSER_CRASH_MARKERS)
+
 async def crawl_and_return(url: str, crawler):
     """
-    Crawls a page and returns its content and a screenshot
-    as a list of PIL images using crawl4ai.
+    Crawls a page and returns its content and its screenshot as a list
+    of viewport-sized PIL tiles (above the fold first) using crawl4ai.
+    `crawler` must already be started; it is shared across calls.
     """
-    # Initialize the AsyncWebCrawler
-    
     try:
         # Crawl the URL
-        await crawler.start()
         result = await crawler.arun(url, config=run_config)
-        html_content = result.html
+        # Visible text only: script, style, markup and boilerplate are stripped
+        text, token_counts = await run_blocking(extract_page_text, url, result.html)
+        # Lets the crawl scheduler back off hosts that answer 429/503
+        response = {"status_code": result.status_code, "retry_after": retry_after_seconds(result.response_headers)}
         screenshot = result.screenshot
-        print(html_content)
         if not screenshot:
             print("[crawl error] screenshot could not be taken")
             return {
                 "url": url,
                 "text": "",
-                "images": []
+                "images": [],
+                **response
             }
-        screenshot_bytes = io.BytesIO(screenshot)
-        pil_image = Image.open(screenshot_bytes)
+        # Decoded once here; BLIP, CLIP and Gemini all work from the tiles
+        tiles = await run_blocking(lambda: tile_screenshot(decode_screenshot(screenshot)))
         return {
             "url": url,
-            "text": html_content,
-            "images": [pil_image]
+            "text": text,
+            "text_tokens": token_counts,
+            "images": tiles,
+            **response
         }
     except Exception as e:
+        if is_browser_crash(e):
+            raise  # let the browser pool recycle this browser
         print(f"[crawl error] {url} | {e}")
         return {
             "url": url,
             "text": "",
             "images": []
         }
-    finally:
-        await crawler.close()
+
+
+async def crawl_with_pool(url: str, pool):
+    """crawl_and_return on a browser leased from a BrowserPool"""
+    try:
+        async with pool.lease() as crawler:
+            return await crawl_and_return(url, crawler)
+    except Exception as e:
+        print(f"[crawl error] {url} | browser crashed, recycled | {e}")
+        return {
+            "url": url,
+            "text": "",
+            "images": []
+        }
@@ -0,0 +1,63 @@
+"""
+Durable progress checkpoint for bulk crawls (crawler_loader).
+
+One row per domain that reached a final outcome:
+    done      crawled, embedded and upserted
+    indexed   already in the index before this crawl, skipped
+    failed    crawl or embedding failed (retried with --retry_failed)
+
+Rows are written as soon as each domain finishes, so a crash only loses the
+domains that were in flight.
+"""
+
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS progress (
+    domain TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 1,
+    error TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS progress_status ON progress(status);
+"""
+
+
+class CrawlCheckpoint:
+    def __init__(self, path: str = "crawler_checkpoint.sqlite3"):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def mark(self, domain: str, status: str, error: str | None = None):
+        self.mark_many([domain], status, error)
+
+    def mark_many(self, domains: list[str], status: str, error: str | None = None):
+        now = time.time()
+        with self.lock:
+            self.db.executemany(
+                "INSERT INTO progress (domain, status, error, updated_at) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT(domain) DO UPDATE SET status = excluded.status, error = excluded.error,"
+                " attempts = attempts + 1, updated_at = excluded.updated_at",
+                [(domain, status, error, now) for domain in domains],
+            )
+
+    def remaining(self, domains: list[str], retry_failed: bool = False) -> list[str]:
+        """`domains` without the ones already finished, in their original order"""
+        skip = ("done", "indexed") if retry_failed else ("done", "indexed", "failed")
+        with self.lock:
+            finished = {
+                row[0] for row in self.db.execute(
+                    f"SELECT domain FROM progress WHERE status IN ({', '.join('?' for _ in skip)})", skip
+                )
+            }
+        return [domain for domain in domains if domain not in finished]
+
+    def counts(self) -> dict:
+        with self.lock:
+            return dict(self.db.execute("SELECT status, COUNT(*) FROM progress GROUP BY status").fetchall())
@@ -0,0 +1,362 @@
+"""
+Per-host politeness for crawling.
+
+Sites are grouped by registrable domain, so www.google.com and
+support.google.com count as one host. Each host gets at most `per_host` pages
+in flight and a minimum `delay` between page starts. The delay is raised to
+the robots.txt Crawl-delay, and doubled (or set to Retry-After) whenever the
+site answers 429/503.
+
+Bulk crawls queue URLs with add() and pull them with next(). next() hands out
+URLs across all hosts whose slot and delay allow it. A large cluster
+(*.tumblr.com, *.blogspot.com) can't hold every worker while other hosts sit
+idle. Among ready hosts, the one with the most queued pages goes first: the
+big clusters set the length of a crawl, so they get every turn their delay
+allows, and single-page hosts fill the workers in between. Single crawls wait
+for their host with `async with scheduler.slot(url)`.
+
+DNS answers and robots.txt are cached per host. Unresolvable domains and
+disallowed sites are skipped (check()) before a browser page is spent on them.
+"""
+
+import asyncio
+import heapq
+import itertools
+import os
+import socket
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+import aiohttp
+
+from url_utils import normalize_url, registrable_domain
+
+CRAWL_PER_HOST_CONCURRENCY = int(os.getenv("CRAWL_PER_HOST_CONCURRENCY", "2"))
+CRAWL_PER_HOST_DELAY = float(os.getenv("CRAWL_PER_HOST_DELAY", "1.0"))
+CRAWL_MAX_HOST_DELAY = float(os.getenv("CRAWL_MAX_HOST_DELAY", "60"))
+CRAWL_DNS_TTL = float(os.getenv("CRAWL_DNS_TTL", "300"))
+CRAWL_ROBOTS_TTL = float(os.getenv("CRAWL_ROBOTS_TTL", "3600"))
+CRAWL_RESPECT_ROBOTS = os.getenv("CRAWL_RESPECT_ROBOTS", "1") != "0"
+CRAWL_USER_AGENT = os.getenv("CRAWL_USER_AGENT", "*")
+
+# Responses that mean "slow down"
+THROTTLE_STATUSES = {429, 503}
+# robots.txt files are read up to this size (RFC 9309 asks for at least 500 KiB)
+ROBOTS_MAX_BYTES = 512_000
+
+
+class CrawlSkipped(Exception):
+    """The URL should not be crawled: its host doesn't resolve or robots.txt disallows it"""
+
+
+def retry_after_seconds(headers) -> float | None:
+    """Retry-After in seconds, if the header is present and numeric"""
+    value = (headers or {}).get("retry-after") or (headers or {}).get("Retry-After")
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def interleave_by_host(urls: list[str]) -> list[str]:
+    """Round-robin `urls` across registrable domains, keeping each host's own order"""
+    by_host = {}
+    for url in urls:
+        by_host.setdefault(registrable_domain(url), deque()).append(url)
+    queues = deque(by_host.values())
+    interleaved = []
+    while queues:
+        queue = queues.popleft()
+        interleaved.append(queue.popleft())
+        if queue:
+            queues.append(queue)
+    return interleaved
+
+
+class DnsCache:
+    """getaddrinfo answers per hostname; failures are cached for a shorter time"""
+
+    def __init__(self, ttl: float = CRAWL_DNS_TTL, failure_ttl: float = 60):
+        self.ttl = ttl
+        self.failure_ttl = failure_ttl
+        self.entries = {}  # hostname -> (expires, addresses or CrawlSkipped)
+        self.counters = {"hits": 0, "lookups": 0, "failures": 0}
+
+    async def resolve(self, hostname: str) -> list[str]:
+        entry = self.entries.get(hostname)
+        if entry is not None and entry[0] > time.monotonic():
+            self.counters["hits"] += 1
+            result = entry[1]
+        else:
+            result = await self._lookup(hostname)
+        if isinstance(result, CrawlSkipped):
+            raise result
+        return result
+
+    async def _lookup(self, hostname: str):
+        self.counters["lookups"] += 1
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(hostname, 443, type=socket.SOCK_STREAM)
+            result, ttl = sorted({info[4][0] for info in infos}), self.ttl
+        except OSError as e:
+            self.counters["failures"] += 1
+            result, ttl = CrawlSkipped(f"DNS lookup failed for {hostname}: {e}"), self.failure_ttl
+        self.entries[hostname] = (time.monotonic() + ttl, result)
+        return result
+
+
+class RobotsCache:
+    """
+    Parsed robots.txt per origin. A missing (4xx) or unreachable file allows
+    everything; a server error (5xx) disallows everything until it is retried
+    after `error_ttl` seconds (RFC 9309).
+    """
+
+    def __init__(self, user_agent: str = CRAWL_USER_AGENT, ttl: float = CRAWL_ROBOTS_TTL, timeout: float = 10,
+                 error_ttl: float = 300):
+        self.user_agent = user_agent
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self.timeout = timeout
+        self.entries = {}  # origin -> (expires, RobotFileParser)
+        self.session = None
+        self.counters = {"hits": 0, "fetches": 0, "unreachable": 0, "server_errors": 0, "disallowed": 0}
+
+    async def allowed(self, url: str) -> tuple[bool, float | None]:
+        """(whether url may be crawled, the Crawl-delay for our user agent)"""
+        url = normalize_url(url)  # can_fetch() allows anything it can't find a path in, e.g. a bare domain
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        entry = self.entries.get(origin)
+        if entry is not None and entry[0] > time.monotonic():
+            self.counters["hits"] += 1
+            parser = entry[1]
+        else:
+            parser, ttl = await self._fetch(origin)
+            self.entries[origin] = (time.monotonic() + ttl, parser)
+        allowed = parser.can_fetch(self.user_agent, url)
+        if not allowed:
+            self.counters["disallowed"] += 1
+        delay = parser.crawl_delay(self.user_agent)
+        return allowed, float(delay) if delay is not None else None
+
+    async def _fetch(self, origin: str) -> tuple[RobotFileParser, float]:
+        """The origin's parsed robots.txt and how long to keep it"""
+        self.counters["fetches"] += 1
+        parser = RobotFileParser(origin + "/robots.txt")
+        ttl = self.ttl
+        try:
+            if self.session is None:
+                self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+            async with self.session.get(origin + "/robots.txt") as response:
+                if response.status >= 500:
+                    self.counters["server_errors"] += 1
+                    parser.disallow_all = True
+                    ttl = self.error_ttl
+                elif response.status >= 400:
+                    parser.allow_all = True
+                else:
+                    body = await response.content.read(ROBOTS_MAX_BYTES)
+                    parser.parse(body.decode("utf-8", errors="replace").splitlines())
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            self.counters["unreachable"] += 1
+            parser.allow_all = True
+        parser.modified()  # can_fetch() treats a parser that was never read as "disallow all"
+        return parser, ttl
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+
+class HostState:
+    def __init__(self, delay: float):
+        self.pending = deque()
+        self.active = 0
+        self.delay = delay
+        self.next_start = 0.0
+        self.scheduled = False  # in the ready queue or the sleeping heap
+        self.priority = None  # key of its current entry in the ready heap; older entries are stale
+
+
+class HostScheduler:
+    def __init__(self, per_host: int = CRAWL_PER_HOST_CONCURRENCY, delay: float = CRAWL_PER_HOST_DELAY,
+                 max_delay: float = CRAWL_MAX_HOST_DELAY, respect_robots: bool = CRAWL_RESPECT_ROBOTS):
+        self.per_host = per_host
+        self.delay = delay
+        self.max_delay = max_delay
+        self.dns = DnsCache()
+        self.robots = RobotsCache() if respect_robots else None
+
+        self.hosts = {}  # registrable domain -> HostState
+        self.ready = []  # heap of (-queued pages, seq, host) for hosts that can start a page now
+        self.sleeping = []  # heap of (next_start, seq, host) for hosts waiting out their delay
+        self.seq = itertools.count()
+        self.changed = asyncio.Event()
+        self.queued = 0
+        self.page_times = deque()  # page completion times over the last minute
+        self.counters = {"pages": 0, "throttled": 0, "skipped": 0}
+        self.skipped_urls = set()  # check() skipped these; done() doesn't count them as pages
+
+    def _host(self, key: str) -> HostState:
+        host = self.hosts.get(key)
+        if host is None:
+            host = self.hosts[key] = HostState(self.delay)
+        return host
+
+    def _push_ready(self, key: str, host: HostState):
+        host.priority = -len(host.pending)
+        heapq.heappush(self.ready, (host.priority, next(self.seq), key))
+
+    def _schedule(self, key: str, host: HostState):
+        if host.scheduled or not host.pending or host.active >= self.per_host:
+            return
+        host.scheduled = True
+        if host.next_start <= time.monotonic():
+            self._push_ready(key, host)
+        else:
+            heapq.heappush(self.sleeping, (host.next_start, next(self.seq), key))
+        self.changed.set()
+
+    def _claim(self, host: HostState):
+        host.active += 1
+        host.next_start = time.monotonic() + host.delay
+
+    def add(self, url: str):
+        key = registrable_domain(url)
+        host = self._host(key)
+        host.pending.append(url)
+        self.queued += 1
+        if host.priority is not None:
+            self._push_ready(key, host)  # move it up the ready heap to match its new size
+        else:
+            self._schedule(key, host)
+
+    async def next(self) -> str | None:
+        """The next URL whose host is free, busiest host first; None once nothing is queued"""
+        while True:
+            now = time.monotonic()
+            while self.sleeping and self.sleeping[0][0] <= now:
+                key = heapq.heappop(self.sleeping)[2]
+                self._push_ready(key, self.hosts[key])
+            while self.ready:
+                priority, _, key = heapq.heappop(self.ready)
+                host = self.hosts.get(key)
+                if host is None or priority != host.priority:
+                    continue  # superseded by a later entry for the same host
+                host.priority = None
+                host.scheduled = False
+                if not host.pending or host.active >= self.per_host:
+                    continue  # rescheduled by done()
+                if host.next_start > now:
+                    self._schedule(key, host)  # a slot() caller started a page here meanwhile
+                    continue
+                url = host.pending.popleft()
+                self.queued -= 1
+                self._claim(host)
+                self._schedule(key, host)
+                return url
+            if not self.queued:
+                return None
+            self.changed.clear()
+            timeout = self.sleeping[0][0] - now if self.sleeping else None
+            try:
+                await asyncio.wait_for(self.changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    @asynccontextmanager
+    async def slot(self, url: str):
+        """Wait until url's host has a free slot and its delay has passed; for crawls outside next()"""
+        key = registrable_domain(url)
+        while True:
+            host = self._host(key)
+            now = time.monotonic()
+            if host.active < self.per_host and host.next_start <= now:
+                break
+            self.changed.clear()
+            timeout = host.next_start - now if host.active < self.per_host else None
+            try:
+                await asyncio.wait_for(self.changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        self._claim(host)
+        try:
+            yield
+        finally:
+            self.done(url)
+
+    def done(self, url: str):
+        """Release the slot url's page took, from next() or slot()"""
+        key = registrable_domain(url)
+        host = self.hosts.get(key)
+        if host is None:
+            return
+        host.active -= 1
+        now = time.monotonic()
+        if url in self.skipped_urls:
+            self.skipped_urls.discard(url)
+        else:
+            self.counters["pages"] += 1
+            self.page_times.append(now)
+        self._schedule(key, host)
+        # Forget idle hosts whose delay has passed; nothing about them is needed any more
+        if not host.pending and not host.active and host.next_start <= now and host.delay == self.delay:
+            del self.hosts[key]
+        self.changed.set()
+
+    def throttle(self, url: str, retry_after: float | None = None):
+        """Back off url's host after a 429/503: double its delay, or wait Retry-After if longer"""
+        key = registrable_domain(url)
+        host = self._host(key)
+        host.delay = min(max(host.delay * 2, retry_after or 0, self.delay), self.max_delay)
+        host.next_start = max(host.next_start, time.monotonic() + host.delay)
+        self.counters["throttled"] += 1
+        print(f"[Scheduler] {key} is throttling us; delay now {host.delay:.1f}s")
+
+    async def check(self, url: str):
+        """Raise CrawlSkipped if url's host doesn't resolve or robots.txt disallows it"""
+        try:
+            await self.dns.resolve(urlsplit(normalize_url(url)).hostname or "")
+            if self.robots is None:
+                return
+            allowed, crawl_delay = await self.robots.allowed(url)
+        except CrawlSkipped:
+            self._skip(url)
+            raise
+        if not allowed:
+            self._skip(url)
+            raise CrawlSkipped(f"robots.txt disallows {url}")
+        if crawl_delay:
+            host = self._host(registrable_domain(url))
+            host.delay = min(max(host.delay, crawl_delay), self.max_delay)
+            host.next_start = max(host.next_start, time.monotonic() + host.delay)
+
+    def _skip(self, url: str):
+        self.counters["skipped"] += 1
+        self.skipped_urls.add(url)
+
+    async def close(self):
+        if self.robots is not None:
+            await self.robots.close()
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        while self.page_times and now - self.page_times[0] > 60:
+            self.page_times.popleft()
+        return {
+            **self.counters,
+            "queued": self.queued,
+            "hosts": len(self.hosts),
+            "active": sum(host.active for host in self.hosts.values()),
+            "ready_hosts": sum(host.priority is not None for host in self.hosts.values()),
+            "waiting_hosts": len(self.sleeping),
+            "slowed_hosts": sum(host.delay > self.delay for host in self.hosts.values()),
+            "pages_per_minute": len(self.page_times),
+            "dns": self.dns.counters,
+            "robots": self.robots.counters if self.robots is not None else None,
+        }
@@ -1,58 +1,211 @@
+"""
+Bulk crawl of domain_set.txt into the Pinecone index.
+
+Domains already in the index are filtered out first with batched index.fetch.
+The rest are crawled and embedded by --concurrency workers sharing a browser
+pool and the model worker pool. Workers take domains from a per-host
+scheduler, which interleaves registrable domains and keeps each one to
+--per_host pages in flight and --host_delay seconds between starts. Each
+finished domain is recorded in a SQLite checkpoint, so an interrupted run
+resumes where it stopped:
+
+    python backend/crawler_loader.py --concurrency 8
+    python backend/crawler_loader.py --retry_failed   # also retry domains that failed before
+"""
+
+import argparse
 import asyncio
-from crawl4ai import AsyncWebCrawler
-from img_processing import get_image_embeddings_for_urls
-from text_processing import get_text_embeddings
-import numpy as np
-from pinecone import Pinecone
 import os
+import time
+
+import numpy as np
 from dotenv import load_dotenv
+from pinecone import Pinecone
+
+from browser_pool import BrowserPool
+from crawl_checkpoint import CrawlCheckpoint
+from crawl_scheduler import (CRAWL_PER_HOST_CONCURRENCY, CRAWL_PER_HOST_DELAY, THROTTLE_STATUSES, HostScheduler,
+                             retry_after_seconds)
+from img_processing import get_image_embeddings_for_urls
+from model_workers import ModelWorkerPool
+from rate_limiter import build_limiters
+from server_utils import run_blocking
+from text_extraction import extract_page_text
+from upsert_writer import UpsertWriter
 
 load_dotenv()
 
 pc = Pinecone(api_key=os.getenv("PINECONE_KEY"))
 index = pc.Index(host=os.getenv("PINECONE_INDEX_HOST"))
 
-async def main():
+rate_limiters = build_limiters()
+
+# Embed all of a page's text in 512-token windows (up to TEXT_MAX_WINDOWS), not just its first 512 tokens
+CRAWL_TEXT_LONG_DOCUMENT = os.getenv("CRAWL_TEXT_LONG_DOCUMENT", "1") != "0"
+
+
+def read_domains(path: str) -> list[str]:
+    with open(path, 'r') as file:
+        # Remove any extra whitespace, blank lines and repeats, keeping file order
+        return list(dict.fromkeys(line.strip() for line in file if line.strip()))
 
-    # website_url = 'https://crawl4ai.com'
 
-    website_url_csv = './backend/domain_set.txt'
+async def filter_indexed(domains: list[str], checkpoint: CrawlCheckpoint, batch_size: int) -> list[str]:
+    """Mark domains already in the index as "indexed" and return the rest"""
+    remaining = []
+    for start in range(0, len(domains), batch_size):
+        batch = domains[start:start + batch_size]
+        await rate_limiters["pinecone"].acquire()
+        response = await run_blocking(index.fetch, ids=batch, namespace="")
+        present = set(response.vectors)
+        if present:
+            checkpoint.mark_many(sorted(present), "indexed")
+        remaining.extend(domain for domain in batch if domain not in present)
+        if (start // batch_size) % 50 == 49:
+            print(f"[Loader] Checked {start + len(batch)}/{len(domains)} against the index")
+    return remaining
 
-    with open(website_url_csv, 'r') as file:
-        website_urls = file.readlines()
 
-    for website_url in website_urls:
-        website_url = website_url.strip()  # Remove any extra whitespace
+async def embed_domain(website_url: str, pool: BrowserPool, workers: ModelWorkerPool, scheduler: HostScheduler):
+    # Skip unresolvable domains and robots.txt disallows before taking a browser
+    await scheduler.check(website_url)
+    async with pool.lease() as crawler:
+        # Run the crawler on a URL
+        result = await crawler.arun(url=website_url)
+    if result.status_code in THROTTLE_STATUSES:
+        scheduler.throttle(website_url, retry_after_seconds(result.response_headers))
+        raise RuntimeError(f"throttled: HTTP {result.status_code}")
+    if not result.success:
+        raise RuntimeError(f"crawl failed: {result.error_message}")
 
-        # Create an instance of AsyncWebCrawler
-        async with AsyncWebCrawler() as crawler:
-            # Run the crawler on a URL
-            result = await crawler.arun(url=website_url)
+    # Visible page text, without script/style/markup and boilerplate
+    text, _ = await run_blocking(extract_page_text, website_url, result.html)
+    image_urls = [i['src'] for i in (result.media or {}).get('images', [])]
 
-        # Print the extracted content
-        text = result.html
+    img_embed, text_embeds = await asyncio.gather(
+        get_image_embeddings_for_urls(image_urls, workers),
+        workers.text_embeddings([text], long_document=CRAWL_TEXT_LONG_DOCUMENT),
+    )
+    if img_embed:
+        return np.mean([img_embed, text_embeds[0]], axis=0)  # Average the embeddings
+    return text_embeds[0]
+
+
+class Progress:
+    def __init__(self, total: int):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.start = time.monotonic()
+
+    def report(self) -> str:
+        finished = self.done + self.failed
+        hours = (time.monotonic() - self.start) / 3600
+        per_hour = finished / hours if hours else 0.0
+        eta = (self.total - finished) / per_hour if per_hour else float("inf")
+        eta_text = f"{int(eta)}h{int(eta % 1 * 60):02d}m" if eta != float("inf") else "?"
+        return (f"[Loader] {finished}/{self.total} ({self.done} done, {self.failed} failed), "
+                f"{per_hour:.0f} domains/h, ETA {eta_text}")
+
+
+async def report_loop(progress: Progress, pool: BrowserPool, scheduler: HostScheduler, interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        stats = scheduler.stats()
+        print(f"{progress.report()}, {pool.stats()['pages_per_minute']} pages/min, "
+              f"{stats['hosts']} hosts ({stats['waiting_hosts']} waiting, {stats['slowed_hosts']} slowed), "
+              f"{stats['skipped']} skipped")
+
+
+def record(website_url: str, checkpoint: CrawlCheckpoint, progress: Progress, error: BaseException | None):
+    if error is None:
+        checkpoint.mark(website_url, "done")
+        progress.done += 1
+    else:
+        print(f"[Loader] {website_url} failed: {error!r}")
+        checkpoint.mark(website_url, "failed", repr(error)[:500])
+        progress.failed += 1
+
+
+def write_error(written: asyncio.Future) -> BaseException | None:
+    """The upsert's error; a cancelled write (e.g. on shutdown) counts as a failure too"""
+    if written.cancelled():
+        return asyncio.CancelledError("upsert cancelled before it was written")
+    return written.exception()
+
+
+async def crawl_worker(scheduler: HostScheduler, pool, workers, writer: UpsertWriter,
+                       checkpoint: CrawlCheckpoint, progress: Progress, timeout: float):
+    while (website_url := await scheduler.next()) is not None:
+        try:
+            final_embedding = await asyncio.wait_for(embed_domain(website_url, pool, workers, scheduler), timeout)
+            # Don't wait for the batch to be written; the domain is checkpointed once it is
+            written = writer.add({"id": website_url, "values": [float(v) for v in final_embedding]})
+            written.add_done_callback(
+                lambda f, url=website_url: record(url, checkpoint, progress, write_error(f))
+            )
+        except Exception as e:
+            record(website_url, checkpoint, progress, e)
+        finally:
+            scheduler.done(website_url)
+
+
+async def main():
+    ap = argparse.ArgumentParser(description="Crawl and embed every domain in domain_set.txt.")
+    ap.add_argument("--domains", default="./backend/domain_set.txt")
+    ap.add_argument("--checkpoint", default=os.getenv("CRAWL_CHECKPOINT_PATH", "crawler_checkpoint.sqlite3"))
+    ap.add_argument("--concurrency", type=int, default=8, help="Domains in flight")
+    ap.add_argument("--per_host", type=int, default=CRAWL_PER_HOST_CONCURRENCY, help="Pages in flight per registrable domain")
+    ap.add_argument("--host_delay", type=float, default=CRAWL_PER_HOST_DELAY, help="Seconds between page starts per registrable domain")
+    ap.add_argument("--ignore_robots", action="store_true")
+    ap.add_argument("--browsers", type=int, default=int(os.getenv("BROWSER_POOL_SIZE", "4")))
+    ap.add_argument("--fetch_batch", type=int, default=100, help="Ids per index.fetch when filtering")
+    ap.add_argument("--timeout", type=float, default=180, help="Seconds per domain")
+    ap.add_argument("--report_every", type=float, default=30, help="Seconds between progress lines")
+    ap.add_argument("--retry_failed", action="store_true")
+    args = ap.parse_args()
 
-        # print(result.html)
+    checkpoint = CrawlCheckpoint(args.checkpoint)
+    domains = read_domains(args.domains)
+    todo = checkpoint.remaining(domains, retry_failed=args.retry_failed)
+    print(f"[Loader] {len(domains)} domains, {len(domains) - len(todo)} already finished ({checkpoint.counts()})")
+    todo = await filter_indexed(todo, checkpoint, args.fetch_batch)
+    print(f"[Loader] {len(todo)} domains to crawl")
+    if not todo:
+        return
 
-        image_urls = [i['src'] for i in result.media['images']]
+    # Reuse warm browsers across domains instead of launching one per domain
+    pool = BrowserPool(size=args.browsers, max_pages=int(os.getenv("BROWSER_MAX_PAGES", "100")))
+    await pool.start()
 
-        print(image_urls)
+    # CLIP/BLIP/DistilBERT run in worker processes while other pages crawl
+    workers = ModelWorkerPool()
 
-        img_embed = await get_image_embeddings_for_urls(image_urls)
-        text_embed = get_text_embeddings(text)
+    # Vectors from all workers go out in batched upserts
+    writer = UpsertWriter(index, rate_limiter=rate_limiters["pinecone"])
 
-        if img_embed:
-            final_embedding = np.mean([img_embed, text_embed], axis=0)  # Average the embeddings
-        else:
-            final_embedding = text_embed
-        
-        index.upsert(
-            vectors=[{
-                "id": website_url,
-                "values": list(final_embedding),
-            }],
-            namespace=""
-        )
+    # Spread domains across hosts instead of crawling clusters like *.tumblr.com back to back
+    scheduler = HostScheduler(per_host=args.per_host, delay=args.host_delay, respect_robots=not args.ignore_robots)
+    for website_url in todo:
+        scheduler.add(website_url)
+    progress = Progress(len(todo))
+    tasks = [
+        asyncio.create_task(crawl_worker(scheduler, pool, workers, writer, checkpoint, progress, args.timeout))
+        for _ in range(args.concurrency)
+    ]
+    reporter = asyncio.create_task(report_loop(progress, pool, scheduler, args.report_every))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in [*tasks, reporter]:
+            task.cancel()
+        await asyncio.gather(*tasks, reporter, return_exceptions=True)
+        await writer.close()
+        print(progress.report())
+        await pool.close()
+        await scheduler.close()
+        workers.close()
 
-# Run the async main function
-asyncio.run(main())
+# Run the async main function (guarded: spawned model workers re-import this module)
+if __name__ == "__main__":
+    asyncio.run(main())
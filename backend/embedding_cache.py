@@ -0,0 +1,128 @@
+"""
+Two-tier cache for query embeddings: a bounded in-memory LRU in front of a
+SQLite file that survives restarts and is shared by every process on the box.
+
+Entries are keyed by (model, task_type, whitespace-normalized text); case is
+kept, since it can change the embedding. The SQLite tier holds at most
+max_rows entries and drops the least recently used ones beyond that.
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.split())
+
+
+# Bumped when normalize_text changes, so rows keyed the old way are never served
+KEY_VERSION = "2"
+
+
+def cache_key(model: str, task_type: str, text: str) -> str:
+    raw = f"{KEY_VERSION}\x00{model}\x00{task_type}\x00{normalize_text(text)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, path: str | None = "embedding_cache.sqlite3", max_items: int = 4096,
+                 max_rows: int = 100000):
+        self.max_items = max_items
+        self.max_rows = max_rows
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self.evicted = 0
+
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key TEXT PRIMARY KEY, model TEXT, task_type TEXT, text TEXT, vector BLOB,"
+                " last_used REAL NOT NULL DEFAULT 0)"
+            )
+            columns = [row[1] for row in self.db.execute("PRAGMA table_info(embeddings)")]
+            if "last_used" not in columns:
+                self.db.execute("ALTER TABLE embeddings ADD COLUMN last_used REAL NOT NULL DEFAULT 0")
+            self.db.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)")
+            self.disk_rows = self.db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def _remember(self, key: str, vector: list[float]):
+        self.memory[key] = vector
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_items:
+            self.memory.popitem(last=False)
+
+    def get(self, model: str, task_type: str, text: str) -> list[float] | None:
+        key = cache_key(model, task_type, text)
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return self.memory[key]
+
+            row = None
+            if self.db is not None:
+                row = self.db.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.counters["misses"] += 1
+                return None
+
+            self.db.execute("UPDATE embeddings SET last_used = ? WHERE key = ?", (time.time(), key))
+            vector = np.frombuffer(row[0], dtype=np.float32).tolist()
+            self._remember(key, vector)
+            self.counters["disk_hits"] += 1
+            return vector
+
+    def put(self, model: str, task_type: str, text: str, vector: list[float]):
+        key = cache_key(model, task_type, text)
+        with self.lock:
+            self._remember(key, list(vector))
+            if self.db is not None:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, model, task_type, normalize_text(text),
+                     np.asarray(vector, dtype=np.float32).tobytes(), time.time()),
+                )
+                self.disk_rows += 1
+                if self.max_rows and self.disk_rows > self.max_rows:
+                    self._evict_disk()
+
+    def _evict_disk(self):
+        """Drop least recently used rows down to 90% of max_rows, so eviction runs in batches"""
+        # Other processes share the file, so count again rather than trusting disk_rows
+        rows = self.db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = rows - int(self.max_rows * 0.9)
+        if excess > 0 and rows > self.max_rows:
+            self.db.execute(
+                "DELETE FROM embeddings WHERE key IN"
+                " (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+            self.evicted += excess
+            rows -= excess
+        self.disk_rows = rows
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = sum(self.counters.values())
+            hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+            disk_items = None
+            if self.db is not None:
+                disk_items = self.db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            return {
+                **self.counters,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_items": len(self.memory),
+                "memory_capacity": self.max_items,
+                "disk_items": disk_items,
+                "disk_capacity": self.max_rows if self.db is not None else None,
+                "disk_evicted": self.evicted,
+            }
@@ -0,0 +1,53 @@
+"""
+Export the Pinecone site index to a local snapshot for vector_index.LocalIndex.
+
+Usage:
+    python export_index.py --out index_snapshot --dtype float16
+"""
+
+import argparse
+import os
+
+from dotenv import load_dotenv
+from pinecone import Pinecone
+
+from vector_index import write_snapshot
+
+load_dotenv()
+
+FETCH_BATCH = 100
+
+
+def export_snapshot(index, out_dir: str, dtype: str = "float32", namespace: str = ""):
+    ids, vectors = [], []
+    for id_batch in index.list(namespace=namespace):
+        for start in range(0, len(id_batch), FETCH_BATCH):
+            batch = id_batch[start:start + FETCH_BATCH]
+            fetched = index.fetch(ids=batch, namespace=namespace)
+            for vector_id, vector in fetched.vectors.items():
+                ids.append(vector_id)
+                vectors.append(vector.values)
+        print(f"Fetched {len(ids)} vectors...")
+
+    if not ids:
+        raise SystemExit("Index is empty, nothing to export.")
+
+    path = write_snapshot(out_dir, ids, vectors, dtype=dtype)
+    print(f"✓ Wrote {len(ids)} vectors (dim={len(vectors[0])}, dtype={dtype}) to {path}")
+    return path
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Snapshot the Pinecone index for in-process search.")
+    ap.add_argument("--out", default="index_snapshot", help="Snapshot directory")
+    ap.add_argument("--dtype", default="float32", choices=["float32", "float16"])
+    ap.add_argument("--namespace", default="")
+    args = ap.parse_args()
+
+    pc = Pinecone(api_key=os.getenv("PINECONE_KEY"))
+    index = pc.Index(host=os.getenv("PINECONE_INDEX_HOST"))
+    export_snapshot(index, args.out, dtype=args.dtype, namespace=args.namespace)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,10 @@ from PIL.Image import Image
 import base64
 import os
 from dotenv import load_dotenv
+from embedding_cache import EmbeddingCache
+from server_utils import run_blocking
+from rate_limiter import RateLimitExceeded
+from stage_cache import stage_cache, content_hash
 
 load_dotenv()
 
@@ -13,18 +17,48 @@ load_dotenv()
 genai.configure(api_key=os.getenv("GEMINI_KEY"))
 model_flash = genai.GenerativeModel('gemini-2.0-flash')
 
-async def generate_embedding(text : str):
-        return genai.embed_content(
-            model="gemini-embedding-exp-03-07",
+EMBEDDING_MODEL = "gemini-embedding-exp-03-07"
+
+# Shared by the API endpoints and any precompute scripts importing this module
+embedding_cache = EmbeddingCache(
+    path=os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite3"),
+    max_items=int(os.getenv("EMBEDDING_CACHE_SIZE", "4096")),
+    max_rows=int(os.getenv("EMBEDDING_CACHE_MAX_ROWS", "100000")),
+)
+
+async def generate_embedding(text : str, task_type: str = "retrieval_document", rate_limiter=None, max_wait: float | None = None):
+        """
+        Embeds text with Gemini, serving repeats from embedding_cache.
+        `rate_limiter` is only waited on for cache misses; with `max_wait` set,
+        a miss that would wait longer raises RateLimitExceeded instead.
+        """
+        cached = embedding_cache.get(EMBEDDING_MODEL, task_type, text)
+        if cached is not None:
+            return {"embedding": cached}
+
+        if rate_limiter is not None:
+            if max_wait is not None:
+                wait = rate_limiter.would_wait()
+                if wait > max_wait:
+                    raise RateLimitExceeded(rate_limiter.name, wait)
+            await rate_limiter.acquire()
+
+        result = await run_blocking(
+            genai.embed_content,
+            model=EMBEDDING_MODEL,
             content=text,
-            task_type="retrieval_document"
+            task_type=task_type
         )
+        embedding_cache.put(EMBEDDING_MODEL, task_type, text, result["embedding"])
+        return result
 
 
-async def img_and_txt_to_description(web_text: str, images: List[Image] ) -> str:
+async def img_and_txt_to_description(web_text: str, images: List[Image], rate_limiter=None, embed_rate_limiter=None) -> str:
     """
     Analyzes a list of image byte dictionaries and website text using Gemini Pro 1.5.
     Each image part must contain 'data' (bytes) and 'mime_type' (e.g., 'image/png').
+    `rate_limiter` is only waited on when the description isn't cached;
+    `embed_rate_limiter` is passed on to generate_embedding.
     """
     prompt = '''Analyze the website data provided by this text and images. 
     Describe the overall vibe and ambiance it conveys using descriptive words related to mood and feeling (e.g., calm, energetic, sophisticated, playful, serious, etc.). 
@@ -32,10 +66,19 @@ async def img_and_txt_to_description(web_text: str, images: List[Image] ) -> str
     Explain how these design choices reinforce the overall mood you identified. 
     Please provide your analysis in no more than 2048 tokens.'''
 
+    # Same page text + screenshots + prompt -> reuse the earlier description
+    input_hash = content_hash(web_text, *images, prompt)
+    version = "gemini-2.0-flash|v1"
     contents = [web_text, *images, prompt]
     try:
-        response = model_flash.generate_content(contents=contents, stream=False)
-        embedding = await generate_embedding(response.text)
-        return {"error": None, "embedding": embedding, "text": response.text}
+        text = stage_cache.get("description", version, input_hash)
+        if text is None:
+            if rate_limiter is not None:
+                await rate_limiter.acquire()
+            response = await run_blocking(model_flash.generate_content, contents=contents, stream=False)
+            text = response.text
+            stage_cache.put("description", version, input_hash, text)
+        embedding = await generate_embedding(text, rate_limiter=embed_rate_limiter)
+        return {"error": None, "embedding": embedding, "text": text}
     except Exception as e:
         return {"error": e, "embedding": None, "text": None}
\ No newline at end of file
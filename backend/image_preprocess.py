@@ -0,0 +1,69 @@
+"""
+Image preprocessing shared by BLIP and CLIP.
+
+A full-page screenshot is decoded once and cut into viewport-sized tiles,
+top of the page (above the fold) first. The models never see the full page.
+Each tile is then resized once per model with PIL, straight from uint8 pixels.
+The HF processors only rescale and normalize the small results, instead of
+each turning the whole page into a float array.
+"""
+
+import base64
+import binascii
+import io
+import os
+
+from PIL import Image
+
+# Viewport the crawler renders at ("<width>x<height>"); tiles keep its aspect ratio
+SCREENSHOT_VIEWPORT = tuple(int(v) for v in os.getenv("SCREENSHOT_VIEWPORT", "1080x600").split("x"))
+SCREENSHOT_MAX_TILES = int(os.getenv("SCREENSHOT_MAX_TILES", "3"))
+
+
+def decode_screenshot(data) -> Image.Image:
+    """Decode a crawl4ai screenshot (base64 string or raw bytes) to RGB, once"""
+    if isinstance(data, str):
+        data = base64.b64decode(data)
+    else:
+        try:
+            data = base64.b64decode(data, validate=True)
+        except (binascii.Error, ValueError):
+            pass  # already raw image bytes
+    return Image.open(io.BytesIO(data)).convert("RGB")
+
+
+def tile_screenshot(img: Image.Image, viewport: tuple[int, int] = SCREENSHOT_VIEWPORT,
+                    max_tiles: int = SCREENSHOT_MAX_TILES) -> list[Image.Image]:
+    """Viewport-shaped tiles from the top of the page down, at most `max_tiles`"""
+    width, height = img.size
+    tile_height = max(1, round(width * viewport[1] / viewport[0]))
+    tiles = []
+    for top in range(0, height, tile_height):
+        if len(tiles) == max_tiles:
+            break
+        # Skip a thin strip left at the bottom of the page, unless it is all there is
+        if tiles and height - top < tile_height // 4:
+            break
+        tiles.append(img.crop((0, top, width, min(top + tile_height, height))))
+    return tiles
+
+
+def resize_exact(img: Image.Image, width: int, height: int) -> Image.Image:
+    """BLIP-style: stretch to width x height"""
+    return img.convert("RGB").resize((width, height), Image.BICUBIC)
+
+
+def resize_shortest_and_crop(img: Image.Image, shortest_edge: int, crop: int) -> Image.Image:
+    """CLIP-style: scale the shortest side to `shortest_edge`, then center-crop to crop x crop"""
+    img = img.convert("RGB")
+    width, height = img.size
+
+    # Same output size (truncated long side) as the HF CLIP image processor
+    if width <= height:
+        size = (shortest_edge, int(shortest_edge * height / width))
+    else:
+        size = (int(shortest_edge * width / height), shortest_edge)
+    img = img.resize(size, Image.BICUBIC)
+    left = (img.width - crop) // 2
+    top = (img.height - crop) // 2
+    return img.crop((left, top, left + crop, top + crop))
@@ -1,43 +1,197 @@
-from transformers import BlipProcessor, BlipForConditionalGeneration, CLIPProcessor, CLIPModel 
-import torch
 from fastapi import FastAPI, File, UploadFile, Form
 from PIL import Image, UnidentifiedImageError
+import asyncio
 import io
+import os
 import numpy as np
 import httpx
 import aiohttp
+from server_utils import run_blocking
+from model_registry import registry, torch_device
+from stage_cache import stage_cache, content_hash
+import onnx_backend
+from image_preprocess import decode_screenshot, tile_screenshot, resize_exact, resize_shortest_and_crop
 
-# Load the BLIP model and processor
-blip_processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-large")  
-blip_model = BlipForConditionalGeneration.from_pretrained("Salesforce/blip-image-captioning-large").to("cuda" if torch.cuda.is_available() else "cpu")
+# Models load on first use (or via registry.warmup), not at import time
+def load_blip():
+    from transformers import BlipProcessor, BlipForConditionalGeneration
+    blip_processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-large")  
+    blip_model = BlipForConditionalGeneration.from_pretrained("Salesforce/blip-image-captioning-large").to(torch_device())
+    return blip_processor, blip_model
 
-# Load the CLIP model and processor
-clip_processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
-clip_model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32").to("cuda" if torch.cuda.is_available() else "cpu")
+def load_clip():
+    from transformers import CLIPProcessor, CLIPModel
+    clip_processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
+    clip_model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32").to(torch_device())
+    return clip_processor, clip_model
 
+registry.register("blip", load_blip)
+registry.register("clip", load_clip)
 
-async def get_image_embeddings(files: list[UploadFile] = File(...)):
-    all_combined_embeddings = []
+
+IMG_BATCH_SIZE = int(os.getenv("IMG_BATCH_SIZE", "8"))
+
+# Page image fetching limits
+IMG_MAX_IMAGES = int(os.getenv("IMG_MAX_IMAGES", "32"))
+IMG_MAX_BYTES = int(os.getenv("IMG_MAX_BYTES", str(8 * 1024 * 1024)))
+IMG_FETCH_CONCURRENCY = int(os.getenv("IMG_FETCH_CONCURRENCY", "16"))
+IMG_FETCH_PER_HOST = int(os.getenv("IMG_FETCH_PER_HOST", "4"))
+IMG_FETCH_TIMEOUT = float(os.getenv("IMG_FETCH_TIMEOUT", "15"))
+# Longest side images are decoded to; BLIP and CLIP resize to 384/224 anyway
+IMG_DECODE_SIZE = int(os.getenv("IMG_DECODE_SIZE", "512"))
+
+CAPTION_PROMPTS = [
+    "a website with an atmosphere that feels",
+    "a webpage design creating a mood of",
+    "a site with a visual ambiance conveying",
+    "a digital interface evoking emotions of",
+    "a web design with color tones suggesting",
+    "a website experience that makes visitors feel",
+    "a web interface with visual elements creating a sense of",
+    "a website aesthetic that establishes a mood of"
+]
+
+
+# Stage cache versions: bump when a model, prompt or preprocessing change alters outputs
+BLIP_VERSION = f"Salesforce/blip-image-captioning-large|{CAPTION_PROMPTS[0]}|v1"
+CLIP_VERSION = "openai/clip-vit-base-patch32|v1"
+if onnx_backend.use_onnx():
+    CLIP_VERSION += f"|{onnx_backend.INFERENCE_BACKEND}"
+
+
+def batches(items: list, batch_size: int):
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size]
+
+
+def blip_pixel_values(blip_processor, images: list[Image.Image], return_tensors: str = "pt"):
+    """Resize with PIL straight to BLIP's input size; the processor only rescales and normalizes"""
+    size = blip_processor.image_processor.size
+    resized = [resize_exact(img, size["width"], size["height"]) for img in images]
+    return blip_processor.image_processor(resized, do_resize=False, return_tensors=return_tensors)["pixel_values"]
+
+
+def clip_pixel_values(clip_processor, images: list[Image.Image], return_tensors: str = "pt"):
+    """Resize and center-crop with PIL straight to CLIP's input size; the processor only rescales and normalizes"""
+    image_processor = clip_processor.image_processor
+    resized = [
+        resize_shortest_and_crop(img, image_processor.size["shortest_edge"], image_processor.crop_size["height"])
+        for img in images
+    ]
+    return image_processor(resized, do_resize=False, do_center_crop=False, return_tensors=return_tensors)["pixel_values"]
+
+
+def generate_descriptions(images: list[Image.Image], batch_size: int = IMG_BATCH_SIZE) -> list[str]:
+    """BLIP captions for a list of images, generated in padded batches"""
+    # default for now change when we can analyze prompts better
+    import torch
+    blip_processor, blip_model = registry.get("blip")
+    prompt = CAPTION_PROMPTS[0]
+    descriptions = []
+    for batch in batches(images, batch_size):
+        inputs = blip_processor.tokenizer([prompt] * len(batch), return_tensors="pt", padding=True)
+        inputs["pixel_values"] = blip_pixel_values(blip_processor, batch)
+        inputs = inputs.to(blip_model.device)
+        with torch.no_grad():
+            output = blip_model.generate(**inputs, min_length=30, max_length=70, num_beams=1, temperature=0.8, do_sample=True)
+        descriptions.extend(blip_processor.batch_decode(output, skip_special_tokens=True))
+    return descriptions
+
+
+def clip_image_features(images: list[Image.Image], batch_size: int = IMG_BATCH_SIZE) -> list[list[float]]:
+    if onnx_backend.use_onnx():
+        clip_processor, image_session, _ = registry.get("clip_onnx")
+        embeddings = []
+        for batch in batches(images, batch_size):
+            pixel_values = clip_pixel_values(clip_processor, batch, return_tensors="np")
+            embeddings.extend(image_session.run(None, {"pixel_values": pixel_values})[0].tolist())
+        return embeddings
+
+    import torch
+    clip_processor, clip_model = registry.get("clip")
+    embeddings = []
+    for batch in batches(images, batch_size):
+        pixel_values = clip_pixel_values(clip_processor, batch).to(clip_model.device)
+        with torch.no_grad():
+            features = clip_model.get_image_features(pixel_values=pixel_values)
+        embeddings.extend(features.cpu().numpy().tolist())
+    return embeddings
+
+
+def clip_text_features(texts: list[str], batch_size: int = IMG_BATCH_SIZE) -> list[list[float]]:
+    if onnx_backend.use_onnx():
+        clip_processor, _, text_session = registry.get("clip_onnx")
+        embeddings = []
+        for batch in batches(texts, batch_size):
+            inputs = clip_processor(text=batch, return_tensors="np", padding=True, truncation=True)
+            feeds = {name: inputs[name].astype(np.int64) for name in ("input_ids", "attention_mask")}
+            embeddings.extend(text_session.run(None, feeds)[0].tolist())
+        return embeddings
+
+    import torch
+    clip_processor, clip_model = registry.get("clip")
+    embeddings = []
+    for batch in batches(texts, batch_size):
+        inputs = clip_processor(text=batch, return_tensors="pt", padding=True, truncation=True).to(clip_model.device)
+        with torch.no_grad():
+            features = clip_model.get_text_features(input_ids=inputs["input_ids"], attention_mask=inputs["attention_mask"])
+        embeddings.extend(features.cpu().numpy().tolist())
+    return embeddings
+
+
+def make_clip_embeddings(images: list[Image.Image], descriptions: list[str], batch_size: int = IMG_BATCH_SIZE):
+    """CLIP image features and caption text features, one pair of vectors per image"""
+    return clip_image_features(images, batch_size), clip_text_features(descriptions, batch_size)
+
+
+def embed_images(images: list[Image.Image], batch_size: int = IMG_BATCH_SIZE) -> list[list[float]]:
+    """
+    Per-image "mood/vibe" vectors: caption each image with BLIP, then average
+    the CLIP image embedding with the CLIP embedding of its caption.
+    Captions and vectors are reused from stage_cache for images seen before.
+    """
+    if not images:
+        return []
+    image_hashes = [content_hash(img) for img in images]
+
+    descriptions = stage_cache.cached(
+        "caption", BLIP_VERSION, image_hashes, images,
+        lambda batch: generate_descriptions(batch, batch_size=batch_size)
+    )
+    image_embeddings = stage_cache.cached(
+        "clip_image", CLIP_VERSION, image_hashes, images,
+        lambda batch: clip_image_features(batch, batch_size=batch_size)
+    )
+    text_embeddings = stage_cache.cached(
+        "clip_text", CLIP_VERSION, [content_hash(d) for d in descriptions], descriptions,
+        lambda batch: clip_text_features(batch, batch_size=batch_size)
+    )
+    return np.mean([image_embeddings, text_embeddings], axis=0).tolist()
+
+
+def screenshot_tiles(screenshot) -> list[Image.Image]:
+    """Decode a crawl4ai screenshot once and cut it into viewport tiles, above the fold first"""
+    if isinstance(screenshot, Image.Image):
+        return tile_screenshot(screenshot.convert("RGB"))
+    return tile_screenshot(decode_screenshot(screenshot))
+
+
+async def embed_images_async(images: list[Image.Image], workers=None) -> list[list[float]]:
+    """embed_images off the event loop: in a ModelWorkerPool when given, else on the blocking thread pool"""
+    if workers is not None:
+        return await workers.embed_images(images)
+    return await run_blocking(embed_images, images)
+
+async def get_image_embeddings(files: list[UploadFile] = File(...), workers=None):
+    images = []
     
-    # Process each uploaded image
+    # Read each uploaded image
     for file in files:
         print("proc file")
-        # Read the image data from the uploaded file
         img_data = await file.read()
-        img = Image.open(io.BytesIO(img_data))
+        images.append(Image.open(io.BytesIO(img_data)).convert("RGB"))
 
-        # Generate the description based on the uploaded image
-        description = generate_description(img)
-        
-        # Get individual image and text embeddings
-        image_embeddings, text_embeddings = make_clip_embedding(img, description=description)
-
-        # Combine the image and text embeddings (e.g., by averaging or concatenating)
-        # Option 1: Average the image and text embeddings
-        combined_embedding = np.mean([image_embeddings, text_embeddings], axis=0)
-
-        # Append the combined embedding to the list
-        all_combined_embeddings.append(combined_embedding)
+    all_combined_embeddings = await embed_images_async(images, workers)
     
     # Aggregate all combined embeddings (mean across all images)
     combined_final_embedding = np.mean(all_combined_embeddings, axis=0).tolist()
@@ -46,106 +200,105 @@ async def get_image_embeddings(files: list[UploadFile] = File(...)):
     
     return combined_final_embedding
 
-async def get_image_embeddings_for_urls(urls: list[str]):
-    all_combined_embeddings = []
+async def get_image_embeddings_for_urls(urls: list[str], workers=None):
+    # Download all images concurrently, then embed them together in batches
+    images = await fetch_images(urls)
+
+    if not images:
+        return None
+
+    all_combined_embeddings = await embed_images_async(images, workers)
     
-    # Process each uploaded image
+    # Aggregate all combined embeddings (mean across all images)
+    combined_final_embedding = np.mean(all_combined_embeddings, axis=0).tolist()
 
-    async with aiohttp.ClientSession() as session:
+    # Return the final aggregated vector that captures the "mood/vibe"
+    
+    return combined_final_embedding
 
-        for url in urls:
-            try:
-                response = await session.get(url)
+def decode_image(img_data: bytes, max_side: int = IMG_DECODE_SIZE) -> Image.Image:
+    """
+    Decode at reduced size: JPEG draft mode scales during decoding and
+    reduce() shrinks other formats by an integer factor before the final resize.
+    """
+    img = Image.open(io.BytesIO(img_data))
+    img.draft("RGB", (max_side, max_side))
+    # reduce() rejects palette, 1-bit and 16-bit modes, so convert those first
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    factor = max(img.size) // max_side
+    if factor >= 2:
+        img = img.reduce(factor)
+    img = img.convert("RGB")
+    img.thumbnail((max_side, max_side))
+    return img
 
+async def fetch_image(session: aiohttp.ClientSession, semaphore: asyncio.Semaphore, url: str):
+    """Stream one image, giving up once it passes IMG_MAX_BYTES"""
+    async with semaphore:
+        try:
+            async with session.get(url) as response:
                 if response.status != 200:
                     print(f"Failed to fetch {url}: status {response.status}")
-                    continue
+                    return None
 
                 content_type = response.headers.get('Content-Type', '')
                 if 'svg' in content_type or url.endswith('.svg'):
                     print(f"Skipping SVG image: {url}")
-                    continue
-
-                img_data = await response.read()
-
-                try:
-                    img = Image.open(io.BytesIO(img_data)).convert("RGB")
-                except UnidentifiedImageError:
-                    print(f"Cannot identify image file: {url}")
-                    continue
-
-                # Generate the description based on the uploaded image
-                description = generate_description(img)
-                
-                # Get individual image and text embeddings
-                image_embeddings, text_embeddings = make_clip_embedding(img, description=description)
-
-                # Combine the image and text embeddings (e.g., by averaging or concatenating)
-                # Option 1: Average the image and text embeddings
-                combined_embedding = np.mean([image_embeddings, text_embeddings], axis=0)
-
-                # Append the combined embedding to the list
-                all_combined_embeddings.append(combined_embedding)
-            
-            except Exception as e:
-                print(f"Error processing image {url}: {e}")
-                continue
-
-    if not all_combined_embeddings:
-        return None
-    
-    # Aggregate all combined embeddings (mean across all images)
-    combined_final_embedding = np.mean(all_combined_embeddings, axis=0).tolist()
+                    return None
 
-    # Return the final aggregated vector that captures the "mood/vibe"
-    
-    return combined_final_embedding
+                if (response.content_length or 0) > IMG_MAX_BYTES:
+                    print(f"Skipping oversized image: {url} ({response.content_length} bytes)")
+                    return None
 
-def generate_description(img: Image.Image):
-    # Try different prompts to get more detailed descriptions
-    prompts = [
-    "a website with an atmosphere that feels",
-    "a webpage design creating a mood of",
-    "a site with a visual ambiance conveying",
-    "a digital interface evoking emotions of",
-    "a web design with color tones suggesting",
-    "a website experience that makes visitors feel",
-    "a web interface with visual elements creating a sense of",
-    "a website aesthetic that establishes a mood of"
-]
-    
-    descriptions = []
-    for prompt in prompts[:1]:
-        inputs = blip_processor(img, text=prompt, return_tensors="pt").to("cuda" if torch.cuda.is_available() else "cpu")
-        output = blip_model.generate(**inputs, min_length=30, max_length=70, num_beams=1, temperature=0.8, do_sample=True)
-        description = blip_processor.decode(output[0], skip_special_tokens=True)
-        descriptions.append(description)
-    
-    # default for now change when we can analyze prompts better
-    return descriptions[0]
+                img_data = bytearray()
+                async for chunk in response.content.iter_chunked(64 * 1024):
+                    img_data.extend(chunk)
+                    if len(img_data) > IMG_MAX_BYTES:
+                        print(f"Skipping oversized image: {url} (>{IMG_MAX_BYTES} bytes)")
+                        return None
+        except Exception as e:
+            print(f"Error fetching image {url}: {e}")
+            return None
 
-def make_clip_embedding(img: Image.Image, description: str):
-    # Preprocess the image and text for the CLIP model
-    inputs = clip_processor(text=[description], images=img, return_tensors="pt", padding=True)
+    try:
+        return await run_blocking(decode_image, bytes(img_data))
+    except UnidentifiedImageError:
+        print(f"Cannot identify image file: {url}")
+    except Exception as e:
+        print(f"Error decoding image {url}: {e}")
+    return None
 
-    with torch.no_grad():
-        # Extract image embeddings
-        image_embeddings = clip_model.get_image_features(pixel_values=inputs["pixel_values"])
-        
-        # Extract text embeddings
-        text_embeddings = clip_model.get_text_features(input_ids=inputs["input_ids"], attention_mask=inputs["attention_mask"])
+async def fetch_images(urls: list[str], max_images: int = IMG_MAX_IMAGES) -> list[Image.Image]:
+    """
+    Fetch up to `max_images` distinct image URLs concurrently (IMG_FETCH_CONCURRENCY
+    in flight, IMG_FETCH_PER_HOST per host), returning the ones that decoded.
+    """
+    urls = list(dict.fromkeys(urls))[:max_images]
+    if not urls:
+        return []
 
-    # Convert embeddings to NumPy arrays
-    image_embeddings = image_embeddings.cpu().detach().numpy().flatten().tolist()
-    text_embeddings = text_embeddings.cpu().detach().numpy().flatten().tolist()
+    semaphore = asyncio.Semaphore(IMG_FETCH_CONCURRENCY)
+    connector = aiohttp.TCPConnector(limit=IMG_FETCH_CONCURRENCY, limit_per_host=IMG_FETCH_PER_HOST)
+    timeout = aiohttp.ClientTimeout(total=IMG_FETCH_TIMEOUT)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        images = await asyncio.gather(*(fetch_image(session, semaphore, url) for url in urls))
+    return [img for img in images if img is not None]
 
-    # Optionally, print the embeddings
-    
-    # Return the embeddings as NumPy arrays
-    return image_embeddings, text_embeddings
+def generate_description(img: Image.Image):
+    return generate_descriptions([img])[0]
+
+def make_clip_embedding(img: Image.Image, description: str):
+    image_embeddings, text_embeddings = make_clip_embeddings([img], [description])
+    return image_embeddings[0], text_embeddings[0]
 
 # For site content
 def clip_text_embedding(text: str):
+    if onnx_backend.use_onnx():
+        return clip_text_features([text])[0]
+
+    import torch
+    clip_processor, clip_model = registry.get("clip")
     # Tokenize the text for CLIP
     inputs = clip_processor(text=[text], return_tensors="pt", padding=True).to(clip_model.device)
 
@@ -157,4 +310,3 @@ def clip_text_embedding(text: str):
         )
 
     return text_features[0].cpu().numpy().flatten().tolist()
-
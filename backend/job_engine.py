@@ -0,0 +1,365 @@
+"""
+Asyncio job engine for /embed-website.
+
+Jobs run as tasks on the API's own event loop with a configurable number of
+concurrent workers. Each job moves through named stages (crawling, embedding,
+upserting), and every stage has its own timeout. Running or queued jobs can be
+cancelled. Finished jobs are evicted from the status store after a TTL.
+Every status change is also published to subscribers (see subscribe()), which
+is what the /job-events stream is built on.
+"""
+
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+
+from server_utils import run_blocking
+from url_utils import normalize_url
+
+FINISHED_STATES = {"completed", "error", "cancelled"}
+# Fields that describe one particular status; a status change drops them unless it sets them again
+STATE_FIELDS = ("message", "error", "description")
+
+DEFAULT_STAGE_TIMEOUTS = {
+    "crawling": 90.0,
+    "embedding": 120.0,
+    "upserting": 30.0,
+}
+
+
+def stage_timeouts_from_env() -> dict:
+    """DEFAULT_STAGE_TIMEOUTS, overridable with JOB_TIMEOUT_<STAGE> (seconds)."""
+    return {
+        stage: float(os.getenv(f"JOB_TIMEOUT_{stage.upper()}", default))
+        for stage, default in DEFAULT_STAGE_TIMEOUTS.items()
+    }
+
+
+class StageTimeout(Exception):
+    pass
+
+
+class JobStatusStore:
+    """
+    In-memory job status, bounded by max_jobs and a TTL on finished jobs.
+    Unfinished jobs are also indexed by normalized URL so duplicates can be detected.
+    Not thread-safe: it is only changed from the event loop.
+    """
+
+    blocking = False  # calls are cheap enough to make on the event loop
+
+    def __init__(self, ttl: float = 3600, max_jobs: int = 10000):
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+        self.jobs = OrderedDict()
+        self.inflight_urls = {}  # normalized url -> job_id
+        self.batches = {}  # batch_id -> {"summary", "created_at", "jobs": [(job_id, url)]}
+
+    def create(self, job_id: str, url: str) -> str:
+        """
+        Record a queued job and return its id. If another unfinished job already
+        covers the same URL, nothing is created and that job's id is returned.
+        """
+        key = normalize_url(url)
+        existing = self.inflight_urls.get(key)
+        if existing is not None and existing != job_id:
+            return existing
+
+        self.jobs[job_id] = {"status": "queued", "url": url, "updated_at": time.time()}
+        self.jobs.move_to_end(job_id)
+        self.inflight_urls[key] = job_id
+        if len(self.jobs) > self.max_jobs:
+            self.evict()
+        return job_id
+
+    def create_batch(self, batch_id: str, items: list[tuple[str, str]], summary: dict) -> list[str]:
+        """create() for every (job_id, url), recorded under batch_id"""
+        assigned = [self.create(job_id, url) for job_id, url in items]
+        self.batches[batch_id] = {
+            "summary": summary,
+            "created_at": time.time(),
+            "jobs": [(job_id, url) for job_id, (_, url) in zip(assigned, items)],
+        }
+        return assigned
+
+    def get_batch(self, batch_id: str) -> dict | None:
+        return self.batches.get(batch_id)
+
+    def inflight(self, url: str) -> str | None:
+        return self.inflight_urls.get(normalize_url(url))
+
+    def pending(self) -> list[tuple[str, str]]:
+        """Unfinished jobs to resume at startup; nothing survives a restart in memory."""
+        return []
+
+    def update(self, job_id: str, **fields):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return
+        if fields.get("status", job["status"]) != job["status"]:
+            for key in STATE_FIELDS:
+                job.pop(key, None)
+        job.update(fields)
+        job["updated_at"] = time.time()
+        if job["status"] in FINISHED_STATES:
+            key = normalize_url(job["url"])
+            if self.inflight_urls.get(key) == job_id:
+                del self.inflight_urls[key]
+
+    def get(self, job_id: str) -> dict | None:
+        return self.jobs.get(job_id)
+
+    def get_many(self, job_ids: list[str]) -> dict:
+        """job_id -> status for the ids that exist"""
+        # .get(): main.py reads statuses from a worker thread while the loop may evict
+        return {job_id: job for job_id in job_ids if (job := self.jobs.get(job_id)) is not None}
+
+    def evict(self):
+        """Drop finished jobs past their TTL, then the oldest finished jobs if still over max_jobs."""
+        now = time.time()
+        finished = [
+            job_id for job_id, job in self.jobs.items()
+            if job["status"] in FINISHED_STATES
+        ]
+        for job_id in finished:
+            if now - self.jobs[job_id]["updated_at"] > self.ttl:
+                del self.jobs[job_id]
+
+        overflow = len(self.jobs) - self.max_jobs
+        for job_id in finished:
+            if overflow <= 0:
+                break
+            if job_id in self.jobs:
+                del self.jobs[job_id]
+                overflow -= 1
+
+        # Batches outlive their jobs by one TTL at most
+        for batch_id, batch in list(self.batches.items()):
+            if now - batch["created_at"] > self.ttl and not any(job_id in self.jobs for job_id, _ in batch["jobs"]):
+                del self.batches[batch_id]
+
+
+class Subscription:
+    """
+    Status events for one listener: all jobs, or only `job_ids`. Events that
+    don't fit in the queue are dropped and `lagged` is set, so the listener
+    knows to re-read the statuses it tracks.
+    """
+
+    def __init__(self, job_ids: set | None = None, maxsize: int = 1000):
+        self.job_ids = job_ids
+        self.queue = asyncio.Queue(maxsize)
+        self.lagged = False
+
+    def wants(self, job_id: str) -> bool:
+        return self.job_ids is None or job_id in self.job_ids
+
+    def put(self, event: dict):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.lagged = True
+
+    async def get(self, timeout: float | None = None) -> dict | None:
+        """The next event, or None after `timeout` seconds without one"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class Job:
+    def __init__(self, engine: "JobEngine", job_id: str, url: str):
+        self.engine = engine
+        self.job_id = job_id
+        self.url = url
+        self.requeued = False
+
+    async def stage(self, name: str, awaitable, timeout: float | None = None):
+        """Record `name` as the job's status and await `awaitable` under that stage's timeout."""
+        self.engine.update(self.job_id, status=name)
+        if timeout is None:
+            timeout = self.engine.stage_timeouts.get(name)
+        try:
+            return await asyncio.wait_for(awaitable, timeout)
+        except asyncio.TimeoutError:
+            raise StageTimeout(f"{name} timed out after {timeout}s")
+
+    def requeue(self):
+        """Queue the job again once the handler returns (unless it was cancelled meanwhile)"""
+        self.requeued = True
+
+
+class JobEngine:
+    def __init__(self, handler, concurrency: int = 3, stage_timeouts: dict | None = None,
+                 store=None, evict_interval: float = 60):
+        """
+        `handler(job)` is a coroutine returning a dict merged into the job status;
+        it should use `job.stage(...)` for each step.
+        """
+        self.handler = handler
+        self.concurrency = concurrency
+        self.stage_timeouts = stage_timeouts or dict(DEFAULT_STAGE_TIMEOUTS)
+        self.store = store or JobStatusStore()
+        self.evict_interval = evict_interval
+
+        self.queue = None
+        self.workers = []
+        self.running = {}  # job_id -> asyncio.Task
+        self.cancel_requested = set()
+        self.subscriptions = set()
+        self.counters = {"completed": 0, "error": 0, "cancelled": 0}
+
+    async def start(self):
+        self.queue = asyncio.Queue()
+        for job_id, url in self.store.pending():
+            self.update(job_id, status="queued")
+            self.queue.put_nowait((job_id, url))
+        if self.queue.qsize():
+            print(f"[Jobs] Resuming {self.queue.qsize()} unfinished jobs")
+        self.workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        self.workers.append(asyncio.create_task(self._evictor()))
+        print(f"[Jobs] Started {self.concurrency} workers")
+
+    async def stop(self):
+        for task in self.workers:
+            task.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    def submit(self, url: str, job_id: str | None = None) -> str:
+        """Queue `url` and return its job id, or the id of an unfinished job for the same URL."""
+        job_id = job_id or str(uuid.uuid4())
+        assigned = self.store.create(job_id, url)
+        if assigned == job_id:
+            self.queue.put_nowait((job_id, url))
+            self._publish(job_id, {"status": "queued", "url": url})
+        return assigned
+
+    async def submit_batch(self, urls: list[str], summary: dict | None = None) -> tuple[str, list[str], int]:
+        """
+        Queue many URLs at once. Every job (and the batch record) is created in
+        one store call. Returns the batch id, each URL's job id (an existing
+        job's id for URLs already queued or running) and how many jobs are new.
+        """
+        batch_id = str(uuid.uuid4())
+        items = [(str(uuid.uuid4()), url) for url in urls]
+        if self.store.blocking:
+            assigned = await run_blocking(self.store.create_batch, batch_id, items, summary or {})
+        else:
+            assigned = self.store.create_batch(batch_id, items, summary or {})
+        queued = 0
+        for (job_id, url), assigned_id in zip(items, assigned):
+            if assigned_id == job_id:
+                self.queue.put_nowait((job_id, url))
+                self._publish(job_id, {"status": "queued", "url": url})
+                queued += 1
+        return batch_id, assigned, queued
+
+    def batch(self, batch_id: str) -> dict | None:
+        return self.store.get_batch(batch_id)
+
+    def cancel(self, job_id: str) -> bool:
+        job = self.store.get(job_id)
+        if job is None or job["status"] in FINISHED_STATES:
+            return False
+        self.cancel_requested.add(job_id)
+        task = self.running.get(job_id)
+        if task is not None:
+            task.cancel()
+        else:
+            # Still queued; the worker skips it when dequeued
+            self._finish(job_id, {"status": "cancelled"})
+        return True
+
+    def status(self, job_id: str) -> dict | None:
+        return self.store.get(job_id)
+
+    def statuses(self, job_ids: list[str]) -> dict:
+        """job_id -> status for the ids still in the store"""
+        return self.store.get_many(job_ids)
+
+    def update(self, job_id: str, **fields):
+        """Update the stored status and tell subscribers"""
+        self.store.update(job_id, **fields)
+        self._publish(job_id, fields)
+
+    def subscribe(self, job_ids=None, maxsize: int = 1000) -> Subscription:
+        """
+        Receive {"job_id", "status", "updated_at", ...} for every later status
+        change of `job_ids` (all jobs if None). Call unsubscribe() when done.
+        """
+        subscription = Subscription(set(job_ids) if job_ids is not None else None, maxsize)
+        self.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self.subscriptions.discard(subscription)
+
+    def _publish(self, job_id: str, fields: dict):
+        if not self.subscriptions:
+            return
+        event = {**fields, "job_id": job_id, "updated_at": time.time()}
+        for subscription in self.subscriptions:
+            if subscription.wants(job_id):
+                subscription.put(event)
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "queued": self.queue.qsize() if self.queue else 0,
+            "running": len(self.running),
+            "subscribers": len(self.subscriptions),
+            **self.counters,
+        }
+
+    def _finish(self, job_id: str, result: dict):
+        self.update(job_id, **result)
+        status = result.get("status")
+        if status in self.counters:
+            self.counters[status] += 1
+
+    async def _run(self, job_id: str, url: str):
+        if job_id in self.cancel_requested:
+            self.cancel_requested.discard(job_id)
+            return
+
+        self.update(job_id, status="processing")
+        job = Job(self, job_id, url)
+        task = asyncio.create_task(self.handler(job))
+        self.running[job_id] = task
+        requeue = False
+        try:
+            result = await task
+            if job.requeued and job_id in self.cancel_requested:
+                result = {"status": "cancelled"}
+            requeue = job.requeued and job_id not in self.cancel_requested
+            self._finish(job_id, result)
+        except asyncio.CancelledError:
+            if job_id not in self.cancel_requested:
+                raise  # the worker itself is shutting down
+            self._finish(job_id, {"status": "cancelled"})
+        except Exception as e:
+            self._finish(job_id, {"status": "error", "message": f"Error: {str(e)}"})
+        finally:
+            self.running.pop(job_id, None)
+            self.cancel_requested.discard(job_id)
+        # Only now, so another worker picking it up can't have its task or a new cancel
+        # request cleared by the finally above
+        if requeue:
+            self.submit(url, job_id=job_id)
+
+    async def _worker(self):
+        while True:
+            job_id, url = await self.queue.get()
+            try:
+                await self._run(job_id, url)
+            finally:
+                self.queue.task_done()
+
+    async def _evictor(self):
+        while True:
+            await asyncio.sleep(self.evict_interval)
+            self.store.evict()
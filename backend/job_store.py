@@ -0,0 +1,198 @@
+"""
+SQLite-backed job store for the JobEngine.
+
+Job state survives restarts: unfinished jobs are handed back to the engine by
+pending() on startup. A partial unique index on the normalized URL of
+unfinished jobs makes duplicate submissions resolve to the existing job_id.
+Bulk submissions are recorded as batches, created in a single transaction.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+
+from job_engine import FINISHED_STATES, STATE_FIELDS
+from url_utils import normalize_url
+
+FINISHED_SQL = "(" + ", ".join(f"'{state}'" for state in sorted(FINISHED_STATES)) + ")"
+# json_remove() paths of the per-state fields a re-queued job must not carry over
+STATE_FIELDS_SQL = ", ".join(f"'$.{field}'" for field in STATE_FIELDS)
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    norm_url TEXT NOT NULL,
+    status TEXT NOT NULL,
+    data TEXT NOT NULL DEFAULT '{{}}',
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS jobs_inflight_url
+    ON jobs(norm_url) WHERE status NOT IN {FINISHED_SQL};
+CREATE INDEX IF NOT EXISTS jobs_status_updated ON jobs(status, updated_at);
+CREATE TABLE IF NOT EXISTS batches (
+    batch_id TEXT PRIMARY KEY,
+    summary TEXT NOT NULL DEFAULT '{{}}',
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS batch_jobs (
+    batch_id TEXT NOT NULL,
+    job_id TEXT NOT NULL,
+    url TEXT NOT NULL,
+    PRIMARY KEY (batch_id, job_id)
+);
+"""
+
+
+class SqliteJobStore:
+    blocking = True  # disk I/O; JobEngine runs the slow calls off the event loop, so every method takes self.lock
+
+    def __init__(self, path: str = "jobs.sqlite3", ttl: float = 3600, max_jobs: int = 10000):
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def _row_to_status(self, row) -> dict:
+        url, status, data, updated_at = row
+        return {**json.loads(data), "status": status, "url": url, "updated_at": updated_at}
+
+    def create(self, job_id: str, url: str) -> str:
+        """
+        Record a queued job and return its id. If another unfinished job already
+        covers the same URL, nothing is created and that job's id is returned.
+        """
+        with self.lock:
+            return self._create(job_id, url, time.time())
+
+    def _create(self, job_id: str, url: str, now: float) -> str:
+        try:
+            self.db.execute(
+                "INSERT INTO jobs (job_id, url, norm_url, status, created_at, updated_at)"
+                " VALUES (?, ?, ?, 'queued', ?, ?)"
+                " ON CONFLICT(job_id) DO UPDATE SET status = 'queued', updated_at = excluded.updated_at,"
+                f" data = json_remove(data, {STATE_FIELDS_SQL})",
+                (job_id, url, normalize_url(url), now, now),
+            )
+            return job_id
+        except sqlite3.IntegrityError:
+            row = self.db.execute(
+                f"SELECT job_id FROM jobs WHERE norm_url = ? AND status NOT IN {FINISHED_SQL}",
+                (normalize_url(url),),
+            ).fetchone()
+            if row is None:
+                raise
+            return row[0]
+
+    def create_batch(self, batch_id: str, items: list[tuple[str, str]], summary: dict) -> list[str]:
+        """create() for every (job_id, url) plus the batch record, all in one transaction"""
+        now = time.time()
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                assigned = [self._create(job_id, url, now) for job_id, url in items]
+                self.db.executemany(
+                    "INSERT OR IGNORE INTO batch_jobs (batch_id, job_id, url) VALUES (?, ?, ?)",
+                    [(batch_id, job_id, url) for job_id, (_, url) in zip(assigned, items)],
+                )
+                self.db.execute(
+                    "INSERT INTO batches (batch_id, summary, created_at) VALUES (?, ?, ?)",
+                    (batch_id, json.dumps(summary), now),
+                )
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+        return assigned
+
+    def get_batch(self, batch_id: str) -> dict | None:
+        with self.lock:
+            row = self.db.execute("SELECT summary, created_at FROM batches WHERE batch_id = ?", (batch_id,)).fetchone()
+            if row is None:
+                return None
+            jobs = self.db.execute("SELECT job_id, url FROM batch_jobs WHERE batch_id = ?", (batch_id,)).fetchall()
+        return {"summary": json.loads(row[0]), "created_at": row[1], "jobs": jobs}
+
+    def inflight(self, url: str) -> str | None:
+        with self.lock:
+            row = self.db.execute(
+                f"SELECT job_id FROM jobs WHERE norm_url = ? AND status NOT IN {FINISHED_SQL}",
+                (normalize_url(url),),
+            ).fetchone()
+        return row[0] if row else None
+
+    def pending(self) -> list[tuple[str, str]]:
+        """Unfinished jobs, oldest first, to resume after a restart."""
+        with self.lock:
+            rows = self.db.execute(
+                f"SELECT job_id, url FROM jobs WHERE status NOT IN {FINISHED_SQL} ORDER BY created_at"
+            ).fetchall()
+        return [(job_id, url) for job_id, url in rows]
+
+    def update(self, job_id: str, **fields):
+        with self.lock:
+            row = self.db.execute("SELECT status, data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                return
+            status, data = row
+            data = json.loads(data)
+            new_status = fields.pop("status", status)
+            if new_status != status:
+                for key in STATE_FIELDS:
+                    data.pop(key, None)
+            status = new_status
+            data.update(fields)
+            self.db.execute(
+                "UPDATE jobs SET status = ?, data = ?, updated_at = ? WHERE job_id = ?",
+                (status, json.dumps(data, default=str), time.time(), job_id),
+            )
+
+    def get(self, job_id: str) -> dict | None:
+        with self.lock:
+            row = self.db.execute(
+                "SELECT url, status, data, updated_at FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return self._row_to_status(row) if row else None
+
+    def get_many(self, job_ids: list[str]) -> dict:
+        """job_id -> status for the ids that exist"""
+        statuses = {}
+        with self.lock:
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(job_ids), 500):
+                chunk = job_ids[start:start + 500]
+                rows = self.db.execute(
+                    "SELECT job_id, url, status, data, updated_at FROM jobs"
+                    f" WHERE job_id IN ({', '.join('?' for _ in chunk)})",
+                    chunk,
+                ).fetchall()
+                statuses.update((row[0], self._row_to_status(row[1:])) for row in rows)
+        return statuses
+
+    def evict(self):
+        """Drop finished jobs past their TTL, then the oldest finished jobs if still over max_jobs."""
+        with self.lock:
+            self.db.execute(
+                f"DELETE FROM jobs WHERE status IN {FINISHED_SQL} AND updated_at < ?",
+                (time.time() - self.ttl,),
+            )
+            total = self.db.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+            overflow = total - self.max_jobs
+            if overflow > 0:
+                self.db.execute(
+                    f"DELETE FROM jobs WHERE job_id IN (SELECT job_id FROM jobs WHERE status IN {FINISHED_SQL}"
+                    " ORDER BY updated_at LIMIT ?)",
+                    (overflow,),
+                )
+            # Batches outlive their jobs by one TTL at most
+            self.db.execute(
+                "DELETE FROM batches WHERE created_at < ? AND NOT EXISTS"
+                " (SELECT 1 FROM batch_jobs b JOIN jobs j ON j.job_id = b.job_id WHERE b.batch_id = batches.batch_id)",
+                (time.time() - self.ttl,),
+            )
+            self.db.execute("DELETE FROM batch_jobs WHERE batch_id NOT IN (SELECT batch_id FROM batches)")
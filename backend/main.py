@@ -2,27 +2,39 @@
 # main.py with simplified background queue and rate limiting
 
 from PIL import Image 
-from fastapi import FastAPI, File, UploadFile, Form, Query
-from fastapi.responses import JSONResponse
-from crawl_and_embed import crawl_and_return 
-from gemini_proc import img_and_txt_to_description, generate_embedding
+from fastapi import FastAPI, File, UploadFile, Form, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from crawl_and_embed import crawl_with_pool
+from crawl_scheduler import THROTTLE_STATUSES, CrawlSkipped, HostScheduler, interleave_by_host
+from browser_pool import BrowserPool
+from gemini_proc import img_and_txt_to_description, generate_embedding, embedding_cache
 from pinecone import Pinecone 
 from dotenv import load_dotenv
+import gzip
 import io
+import json
 import os
-import uuid
 import numpy as np
-import pandas as pd
 import asyncio
 import time
 from datetime import datetime
-import queue
-import threading
-from crawl4ai import AsyncWebCrawler, CrawlerRunConfig, BrowserConfig
+from crawl4ai import CrawlerRunConfig, BrowserConfig
 from typing import Optional, List
 from collections import defaultdict
 from supabase import create_client, Client
 from text_processing import get_text_embeddings
+from vector_index import load_local_index, normalize_scores
+from server_utils import run_blocking
+from rankings_store import RankingsStore, PrecompressedStore
+from job_engine import FINISHED_STATES, Job, JobEngine, JobStatusStore, stage_timeouts_from_env
+from job_store import SqliteJobStore
+from rate_limiter import RateLimitExceeded, build_limiters
+from model_registry import registry
+from model_workers import ModelWorkerPool
+import text_extraction
+from upsert_writer import UpsertWriter
+from url_utils import clean_urls, urls_from_csv
+from stage_cache import stage_cache
 import asyncio  # make sure imported
 import csv
 import random
@@ -44,8 +56,25 @@ app = FastAPI()
 pc = Pinecone(api_key=os.getenv("PINECONE_KEY"))
 index = pc.Index(host=os.getenv("PINECONE_INDEX_HOST"))
 
-# Create a job queue
-job_queue = queue.Queue()
+# Optional in-process copy of the index (VECTOR_INDEX_MODE=exact|hnsw)
+local_index = load_local_index()
+
+def query_index(vector, top_k: int):
+    """Nearest sites for a query vector, served locally when a snapshot is loaded"""
+    if local_index is not None:
+        return local_index.query(vector, top_k=top_k)
+    return index.query(
+        vector=vector,
+        top_k=top_k,
+        include_values=False,
+        include_metadata=True
+    )
+
+async def search_index(vector, top_k: int):
+    """query_index off the event loop, within the Pinecone budget when not served locally"""
+    if local_index is None:
+        await rate_limiters["pinecone"].acquire()
+    return await run_blocking(query_index, vector, top_k=top_k)
 
 app.add_middleware(
     CORSMiddleware,
@@ -62,96 +91,58 @@ app.add_middleware(
 )
 
 
-# Job status tracking
-job_status = {}
-
 browser_config = BrowserConfig(
     verbose=True
 )
 
-crawler = AsyncWebCrawler(config=browser_config)
+# Warm browsers shared by all crawl jobs
+browser_pool = BrowserPool(
+    size=int(os.getenv("BROWSER_POOL_SIZE", "2")),
+    max_pages=int(os.getenv("BROWSER_MAX_PAGES", "100")),
+    browser_config=browser_config
+)
+
+# Model inference (CLIP, BLIP, DistilBERT) runs in worker processes, off the event loop
+model_workers = ModelWorkerPool()
 
-# Rate limiting configuration
-class RateLimiter:
-    def __init__(self, calls_per_minute=30):
-        self.calls_per_minute = calls_per_minute
-        self.call_times = []
-        self.lock = threading.Lock()
-    
-    async def wait_if_needed(self):
-        """Wait if we're exceeding the rate limit"""
-        with self.lock:
-            now = time.time()
-            # Remove timestamps older than 1 minute
-            self.call_times = [t for t in self.call_times if t > now - 60]
-            
-            # If we've hit the limit, wait until we can make another call
-            if len(self.call_times) >= self.calls_per_minute:
-                wait_time = 60 - (now - self.call_times[0])
-                if wait_time > 0:
-                    self.lock.release()
-                    await asyncio.sleep(wait_time + 0.1)
-                    self.lock.acquire()
-            
-            # Record this call
-            self.call_times.append(time.time())
-
-# Initialize rate limiter
-gemini_rate_limiter = RateLimiter(calls_per_minute=30)
-
-# Worker function to process jobs in the background
-def process_queue():
-    while True:
-        try:
-            # Get a job from the queue
-            job_id, url = job_queue.get(block=True)
-            
-            # Update status to processing
-            job_status[job_id] = {
-                "status": "processing",
-                "url": url
-            }
-            
-            # Process the job
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            try:
-                result = loop.run_until_complete(process_website(url, job_id))
-                job_status[job_id].update(result)
-            except Exception as e:
-                job_status[job_id].update({
-                    "status": "error",
-                    "message": f"Error: {str(e)}"
-                })
-            finally:
-                loop.close()
-                job_queue.task_done()
-            
-        except Exception as e:
-            print(f"Worker error: {str(e)}")
-            time.sleep(1)
-
-# Start worker threads
-NUM_WORKERS = 3
-for _ in range(NUM_WORKERS):
-    worker = threading.Thread(target=process_queue, daemon=True)
-    worker.start()
-
-async def process_website(url: str, job_id: str):
+# Token-bucket budgets per provider (gemini_generate, gemini_embed, pinecone, supabase)
+rate_limiters = build_limiters()
+
+# Upserts from all jobs share batched index.upsert calls
+upsert_writer = UpsertWriter(index, rate_limiter=rate_limiters["pinecone"])
+
+# Per-host politeness for job crawls: concurrency and delay per registrable domain, DNS/robots.txt caches
+crawl_scheduler = HostScheduler()
+
+# Embedding requests that would queue longer than this get a 429 instead
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "10"))
+
+def rate_limited_response(e: RateLimitExceeded):
+    return JSONResponse(
+        status_code=429,
+        headers={"Retry-After": str(int(e.wait) + 1)},
+        content={"status": "error", "message": str(e)}
+    )
+
+async def process_website(job: Job):
     """Process a website - crawl, generate description and store embedding"""
+    url = job.url
     try:
 
         # Crawl website
         print(f"[Process] Crawling {url}...")
-        crawl_data = await crawl_and_return(url, crawler)
+        async with crawl_scheduler.slot(url):
+            await crawl_scheduler.check(url)
+            crawl_data = await job.stage("crawling", crawl_with_pool(url, browser_pool))
+        if crawl_data.get("status_code") in THROTTLE_STATUSES:
+            crawl_scheduler.throttle(url, crawl_data.get("retry_after"))
         print(f"[Process] Crawl success. Got text length={len(crawl_data['text'])}, images={len(crawl_data['images'])}")
         
-        # Wait for rate limiter before making Gemini API call
-        await gemini_rate_limiter.wait_if_needed()
-        
-        # Generate description and embedding
+        # Generate description and embedding (Gemini calls wait on their own rate limiters)
         # print(f"[Process] Generating description and embedding for {url}...")
-        # description = await img_and_txt_to_description(crawl_data["text"], crawl_data["images"])
+        # description = await job.stage("embedding", img_and_txt_to_description(
+        #     crawl_data["text"], crawl_data["images"],
+        #     rate_limiter=rate_limiters["gemini_generate"], embed_rate_limiter=rate_limiters["gemini_embed"]))
         
         # Check if embedding was generated successfully
         # if description["error"] is not None or description["embedding"] is None:
@@ -176,24 +167,26 @@ async def process_website(url: str, job_id: str):
         
         # If dimensions match, proceed with upsert
         print(f"[Process] Upserting {url} into Pinecone...")
-        # index.upsert(
-        #     vectors=[{
-        #         "id": url,
-        #         "values": embedding_vector
-        #     }],
-        #     namespace=""
-        # )
+        # await job.stage("upserting", upsert_writer.upsert(url, embedding_vector))
         print(f"[Process] Upsert complete for {url}.")
         
         return {
             "status": "completed",
             "description": None # description["text"]
         }
+    except asyncio.CancelledError:
+        raise
+    except CrawlSkipped as e:
+        print(f"[Process] Skipping {url}: {e}")
+        return {
+            "status": "error",
+            "message": f"Skipped: {e}"
+        }
     except Exception as e:
         # If we get a rate limit error, requeue the job
         if "rate limit" in str(e).lower() or "quota" in str(e).lower():
             # Requeue the job
-            job_queue.put((job_id, url))
+            job.requeue()
             print(f"requeued {url}")
             return {
                 "status": "requeued",
@@ -205,6 +198,48 @@ async def process_website(url: str, job_id: str):
             "message": f"Error: {str(e)}"
         }
 
+def make_job_store():
+    """SQLite store at JOB_STORE_PATH so jobs survive restarts; in-memory if it is set empty"""
+    ttl = float(os.getenv("JOB_STATUS_TTL", "3600"))
+    max_jobs = int(os.getenv("JOB_STATUS_MAX", "10000"))
+    path = os.getenv("JOB_STORE_PATH", "jobs.sqlite3")
+    if path:
+        return SqliteJobStore(path, ttl=ttl, max_jobs=max_jobs)
+    return JobStatusStore(ttl=ttl, max_jobs=max_jobs)
+
+# Background job engine, running on the API's event loop
+job_engine = JobEngine(
+    process_website,
+    concurrency=int(os.getenv("JOB_CONCURRENCY", "3")),
+    stage_timeouts=stage_timeouts_from_env(),
+    store=make_job_store()
+)
+
+@app.on_event("startup")
+async def start_background_workers():
+    await browser_pool.start()
+    await job_engine.start()
+
+    # Models load lazily; MODEL_WARMUP="distilbert,..." preloads them in the background,
+    # in the model worker processes where inference actually runs
+    warmup = [name for name in os.getenv("MODEL_WARMUP", "").split(",") if name]
+    if warmup:
+        asyncio.create_task(model_workers.warmup(warmup))
+
+    # MODEL_IDLE_UNLOAD_SECONDS frees models nobody has used for that long. Worker
+    # processes do this themselves; only in-process inference needs it here
+    idle_seconds = float(os.getenv("MODEL_IDLE_UNLOAD_SECONDS", "0"))
+    if idle_seconds > 0 and not model_workers.workers:
+        asyncio.create_task(registry.unload_idle_loop(idle_seconds))
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    await job_engine.stop()
+    await browser_pool.close()
+    await crawl_scheduler.close()
+    model_workers.close()
+    await upsert_writer.close()
+
 @app.get("/")
 async def root():
     return {"message": "Hello World"}
@@ -234,7 +269,17 @@ def diagnose_missing_fetches(url: str, fetch_response):
 @app.post("/embed-website")
 async def embed_website_api(url: str = Form(...)):
     print("=" * 80)
-    fetch_response = index.fetch(ids=[url])
+    # Same URL already queued or running: hand back that job instead of crawling twice
+    existing_job = job_engine.store.inflight(url)
+    if existing_job is not None:
+        return {
+            "status": job_engine.status(existing_job)["status"],
+            "job_id": existing_job,
+            "url": url
+        }
+
+    await rate_limiters["pinecone"].acquire()
+    fetch_response = await run_blocking(index.fetch, ids=[url])
 
     diagnose_missing_fetches(url, fetch_response)
         
@@ -244,35 +289,248 @@ async def embed_website_api(url: str = Form(...)):
         "url": url
     } 
         
-    # Generate a job ID
-    job_id = str(uuid.uuid4())
+    # Add job to processing queue (returns the existing job_id on a concurrent duplicate)
+    job_id = job_engine.submit(url)
     
-    # Add job to status tracker
-    job_status[job_id] = {
-        "status": "queued",
+    return {
+        "status": job_engine.status(job_id)["status"],
+        "job_id": job_id,
         "url": url
     }
-    
-    # Add job to processing queue
-    job_queue.put((job_id, url))
-    
+
+
+# Largest list / CSV accepted by /embed-websites
+EMBED_BATCH_MAX_URLS = int(os.getenv("EMBED_BATCH_MAX_URLS", "10000"))
+# Ids per index.fetch when checking which submitted sites are already embedded
+FETCH_BATCH_SIZE = 100
+
+async def read_bulk_urls(request: Request) -> list:
+    """URLs from a JSON list, {"urls": [...]}, a raw CSV body, or a multipart CSV upload in field "file"."""
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise ValueError("expected a CSV upload in the 'file' field")
+        return urls_from_csv((await upload.read()).decode("utf-8-sig", errors="replace"))
+    if "csv" in content_type or content_type.startswith("text/"):
+        return urls_from_csv((await request.body()).decode("utf-8-sig", errors="replace"))
+
+    body = await request.json()
+    if isinstance(body, dict):
+        body = body.get("urls")
+    if not isinstance(body, list):
+        raise ValueError('expected a JSON list of URLs or {"urls": [...]}')
+    return body
+
+async def fetch_existing_ids(ids: list[str]) -> set[str]:
+    """Which of `ids` are already in the index, with index.fetch calls of FETCH_BATCH_SIZE run concurrently"""
+    async def fetch(chunk):
+        await rate_limiters["pinecone"].acquire()
+        response = await run_blocking(index.fetch, ids=chunk)
+        return set(response.vectors)
+
+    chunks = [ids[i:i + FETCH_BATCH_SIZE] for i in range(0, len(ids), FETCH_BATCH_SIZE)]
+    found = await asyncio.gather(*(fetch(chunk) for chunk in chunks))
+    return set().union(*found)
+
+@app.post("/embed-websites")
+async def embed_websites_api(request: Request):
+    """
+    Bulk /embed-website: normalizes and dedupes the submitted URLs, skips sites
+    already in the index, and queues the rest as one batch.
+    """
+    try:
+        submitted = await read_bulk_urls(request)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"status": "error", "message": str(e)})
+    if len(submitted) > EMBED_BATCH_MAX_URLS:
+        return JSONResponse(
+            status_code=413,
+            content={"status": "error", "message": f"At most {EMBED_BATCH_MAX_URLS} URLs per request"}
+        )
+
+    urls, invalid, duplicates = clean_urls(submitted)
+    existing = await fetch_existing_ids(urls) if urls else set()
+    new_urls = [url for url in urls if url not in existing]
+
+    summary = {
+        "received": len(submitted),
+        "invalid": len(invalid),
+        "duplicates": duplicates,
+        "existing": len(existing),
+        "submitted": len(new_urls),
+    }
+    # Queue order is crawl order; spread hosts out so workers don't all wait on one site
+    batch_id, _, queued = await job_engine.submit_batch(interleave_by_host(new_urls), summary)
+    summary["queued"] = queued
+    summary["already_queued"] = len(new_urls) - queued
+    print(f"[Jobs] Batch {batch_id}: {summary}")
     return {
         "status": "queued",
-        "job_id": job_id,
-        "url": url
+        "batch_id": batch_id,
+        **summary,
+        "invalid_urls": invalid[:50],
     }
 
 
 @app.get("/job-status/{job_id}")
 async def get_job_status(job_id: str):
-    if job_id in job_status:
-        return job_status[job_id]
+    status = job_engine.status(job_id)
+    if status is not None:
+        return status
     else:
         return JSONResponse(
             status_code=404,
             content={"status": "error", "message": "Job not found"}
         )
 
+# Most job ids accepted by POST /job-status
+JOB_STATUS_MAX_IDS = int(os.getenv("JOB_STATUS_MAX_IDS", "10000"))
+# Seconds between keep-alive comments on /job-events
+JOB_EVENTS_HEARTBEAT = float(os.getenv("JOB_EVENTS_HEARTBEAT", "15"))
+
+def summarize_statuses(job_ids: list[str], statuses: dict) -> dict:
+    """Per-job statuses plus counts by status; ids no longer in the store are listed as missing"""
+    counts = defaultdict(int)
+    for status in statuses.values():
+        counts[status["status"]] += 1
+    missing = [job_id for job_id in job_ids if job_id not in statuses]
+    return {
+        "total": len(job_ids),
+        "finished": sum(counts.get(state, 0) for state in FINISHED_STATES),
+        "counts": dict(counts),
+        "missing": missing,
+        "jobs": statuses,
+    }
+
+async def batch_job_ids(batch_id: str) -> list[str] | None:
+    batch = await run_blocking(job_engine.batch, batch_id)
+    if batch is None:
+        return None
+    # Deduped: a batch can point several URLs at one existing job
+    return list(dict.fromkeys(job_id for job_id, _ in batch["jobs"]))
+
+@app.post("/job-status")
+async def get_job_statuses(request: Request):
+    """Status of many jobs in one call: {"job_ids": [...]} or {"batch_id": "..."}"""
+    try:
+        body = await request.json()
+    except ValueError:
+        body = None
+    if not isinstance(body, dict) or not (body.get("job_ids") or body.get("batch_id")):
+        return JSONResponse(
+            status_code=400,
+            content={"status": "error", "message": 'expected {"job_ids": [...]} or {"batch_id": "..."}'}
+        )
+
+    if body.get("batch_id"):
+        job_ids = await batch_job_ids(body["batch_id"])
+        if job_ids is None:
+            return JSONResponse(status_code=404, content={"status": "error", "message": "Batch not found"})
+    else:
+        job_ids = list(dict.fromkeys(str(job_id) for job_id in body["job_ids"]))
+        if len(job_ids) > JOB_STATUS_MAX_IDS:
+            return JSONResponse(
+                status_code=413,
+                content={"status": "error", "message": f"At most {JOB_STATUS_MAX_IDS} job ids per request"}
+            )
+    statuses = await run_blocking(job_engine.statuses, job_ids)
+    return summarize_statuses(job_ids, statuses)
+
+@app.get("/batch-status/{batch_id}")
+async def get_batch_status(batch_id: str, include_jobs: bool = True):
+    batch = await run_blocking(job_engine.batch, batch_id)
+    if batch is None:
+        return JSONResponse(status_code=404, content={"status": "error", "message": "Batch not found"})
+    job_ids = list(dict.fromkeys(job_id for job_id, _ in batch["jobs"]))
+    result = summarize_statuses(job_ids, await run_blocking(job_engine.statuses, job_ids))
+    if not include_jobs:
+        del result["jobs"]
+    return {"batch_id": batch_id, "summary": batch["summary"], "created_at": batch["created_at"], **result}
+
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@app.get("/job-events")
+async def job_events(request: Request, batch_id: Optional[str] = None,
+                     job_ids: Optional[List[str]] = Query(None)):
+    """
+    Server-sent events for job status changes. Scoped to a batch or to job_ids,
+    the stream opens with a "snapshot" of current statuses, sends a "status"
+    event per change (queued, processing, crawling, embedding, upserting,
+    completed/error/cancelled) and ends with "done" once every job is finished.
+    Without a scope it streams every job until the client disconnects.
+    """
+    if batch_id:
+        tracked = await batch_job_ids(batch_id)
+        if tracked is None:
+            return JSONResponse(status_code=404, content={"status": "error", "message": "Batch not found"})
+    elif job_ids:
+        tracked = list(dict.fromkeys(job_ids))
+    else:
+        tracked = None
+
+    async def stream():
+        # Subscribe here rather than before the response: a client that disconnects before the
+        # first chunk never starts this generator, so its finally would never unsubscribe.
+        # Subscribe before reading the snapshot so no change falls in between
+        subscription = job_engine.subscribe(tracked)
+        try:
+            unfinished = set()
+            if tracked is not None:
+                statuses = await run_blocking(job_engine.statuses, tracked)
+                unfinished = {
+                    job_id for job_id, status in statuses.items() if status["status"] not in FINISHED_STATES
+                }
+                yield sse("snapshot", summarize_statuses(tracked, statuses))
+            while tracked is None or unfinished:
+                event = await subscription.get(JOB_EVENTS_HEARTBEAT)
+                if await request.is_disconnected():
+                    return
+                if subscription.lagged:
+                    # Events were dropped for this slow client; resend the full picture
+                    subscription.lagged = False
+                    if tracked is not None:
+                        statuses = await run_blocking(job_engine.statuses, tracked)
+                        unfinished = {
+                            job_id for job_id, status in statuses.items() if status["status"] not in FINISHED_STATES
+                        }
+                        yield sse("snapshot", summarize_statuses(tracked, statuses))
+                    else:
+                        yield sse("lagged", {})
+                if event is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event.get("status") in FINISHED_STATES:
+                    unfinished.discard(event["job_id"])
+                yield sse("status", event)
+            statuses = await run_blocking(job_engine.statuses, tracked)
+            yield sse("done", {k: v for k, v in summarize_statuses(tracked, statuses).items() if k != "jobs"})
+        finally:
+            job_engine.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/cancel-job/{job_id}")
+async def cancel_job(job_id: str):
+    if job_engine.cancel(job_id):
+        return {"status": "cancelled", "job_id": job_id}
+    return JSONResponse(
+        status_code=404,
+        content={"status": "error", "message": "Job not found or already finished"}
+    )
+
+@app.get("/job-stats")
+async def job_stats():
+    return {**job_engine.stats(), "browser_pool": browser_pool.stats(), "model_workers": model_workers.stats(),
+            "text_extraction": text_extraction.stats(), "upserts": upsert_writer.stats(),
+            "crawl_scheduler": crawl_scheduler.stats()}
+
 # @app.post("/search_vectors")
 # async def search_web_embeddings(query: str = Form(...), k_returns: int = Form(5)):
 #     # Wait for rate limiter before making Gemini API call for embedding
@@ -301,15 +559,15 @@ import csv  # ← Add this at the top of your file
 
 @app.post("/search_vectors")
 async def search_web_embeddings(query: str = Form(...), k_returns: int = Form(5)):
-    query_vector_response = await generate_embedding(query)
+    try:
+        query_vector_response = await generate_embedding(
+            query, rate_limiter=rate_limiters["gemini_embed"], max_wait=RATE_LIMIT_MAX_WAIT
+        )
+    except RateLimitExceeded as e:
+        return rate_limited_response(e)
     query_vector = query_vector_response["embedding"] if isinstance(query_vector_response, dict) else query_vector_response
 
-    search_results = index.query(
-        vector=query_vector,
-        top_k=k_returns,
-        include_values=False,
-        include_metadata=True
-    )
+    search_results = await search_index(query_vector, top_k=k_returns)
 
     formatted_results = [{"id": match.get("id", ""), "score": match.get("score", 0)} for match in search_results.matches]
 
@@ -324,44 +582,132 @@ async def search_web_embeddings(query: str = Form(...), k_returns: int = Form(5)
     return {"results": formatted_results}
 
 
+async def embed_query(query: str):
+    embedding_result = await generate_embedding(
+        query, rate_limiter=rate_limiters["gemini_embed"], max_wait=RATE_LIMIT_MAX_WAIT
+    )
+    return embedding_result["embedding"] if isinstance(embedding_result, dict) else embedding_result
+
 @app.get("/get_coordinates")
 async def get_coordinates(
     axis1: str = Query(...),
     axis2: str = Query(...),
     axis3: Optional[str] = Query(None),
-    k_returns: int = Query(500)
+    k_returns: int = Query(500),
+    debug: bool = Query(False)
 ):
     queries = [axis1, axis2] if axis3 is None else [axis1, axis2, axis3]
+    start = time.perf_counter()
 
-    embeddings = []
-    for query in queries:
-        await gemini_rate_limiter.wait_if_needed()
-        embedding_result = await generate_embedding(query)
-        embedding = embedding_result["embedding"] if isinstance(embedding_result, dict) else embedding_result
-        embeddings.append(embedding)
-
-    search_results = []
-    for embedding in embeddings:
-        search_response = index.query(
-            vector=embedding,
-            top_k=k_returns,
-            include_values=False,
-            include_metadata=True
-        )
-        search_results.append(search_response)
+    async def embed_and_search(query: str):
+        axis_start = time.perf_counter()
+        embedding = await embed_query(query)
+        embedded_at = time.perf_counter()
+
+        search_response = await search_index(embedding, top_k=k_returns)
+        searched_at = time.perf_counter()
 
-    # Format each result like search_vectors does
-    formatted_results = []
-    for search_response in search_results:
         matches = [{"id": match.get("id", ""), "score": match.get("score", 0)} for match in search_response.matches]
-        formatted_results.append(matches)
+        timing = {
+            "query": query,
+            "embed_ms": round((embedded_at - axis_start) * 1000, 2),
+            "search_ms": round((searched_at - embedded_at) * 1000, 2)
+        }
+        return matches, timing
 
-    return {
+    # Each axis embeds and searches concurrently; blocking SDK calls run on the executor
+    try:
+        axis_results = await asyncio.gather(*(embed_and_search(query) for query in queries))
+    except RateLimitExceeded as e:
+        return rate_limited_response(e)
+    formatted_results = [matches for matches, _ in axis_results]
+
+    response = {
         "status": "success",
         "queries": queries,
         "results_count": sum(len(r) for r in formatted_results),
         "results": formatted_results
     }
+    if debug:
+        response["timings"] = {
+            "total_ms": round((time.perf_counter() - start) * 1000, 2),
+            "axes": [timing for _, timing in axis_results]
+        }
+    return response
+
+@app.get("/project_coordinates")
+async def project_coordinates(
+    axis1: str = Query(...),
+    axis2: str = Query(...),
+    axis3: Optional[str] = Query(None),
+    normalize: str = Query("none")  # 'none', 'minmax' or 'zscore'
+):
+    """
+    Scores every indexed site against all axes in one pass over the local
+    embedding matrix and returns struct-of-arrays coordinates.
+    """
+    if local_index is None:
+        return JSONResponse(
+            status_code=503,
+            content={"status": "error", "message": "Projection needs a local index (set VECTOR_INDEX_MODE=exact or hnsw)"}
+        )
+    if normalize not in ("none", "minmax", "zscore"):
+        return JSONResponse(
+            status_code=400,
+            content={"status": "error", "message": "normalize must be 'none', 'minmax' or 'zscore'"}
+        )
+
+    queries = [axis1, axis2] if axis3 is None else [axis1, axis2, axis3]
+    try:
+        embeddings = await asyncio.gather(*(embed_query(query) for query in queries))
+    except RateLimitExceeded as e:
+        return rate_limited_response(e)
+
+    scores = await run_blocking(local_index.score_all, embeddings)
+    scores = np.round(normalize_scores(scores, normalize), 5)
+
+    response = {
+        "status": "success",
+        "queries": queries,
+        "normalize": normalize,
+        "count": len(local_index.ids),
+        "ids": local_index.ids
+    }
+    for name, column in zip(("x", "y", "z"), scores.T):
+        response[name] = column.tolist()
+    return response
+
+@app.post("/warmup")
+async def warmup_models(models: Optional[List[str]] = Query(None)):
+    """Load models in the model workers ahead of the first request that needs them"""
+    unknown = [name for name in models or [] if name not in registry.loaders]
+    if unknown:
+        return JSONResponse(
+            status_code=400,
+            content={"status": "error", "message": f"Unknown models: {unknown}", "available": list(registry.loaders)}
+        )
+    workers = await model_workers.warmup(models)
+    return {"status": "success", "workers": workers}
+
+@app.get("/models")
+async def model_status():
+    """Models loaded in each model worker process, where inference runs"""
+    workers = await model_workers.worker_stats()
+    return {"workers": [{"pid": worker["pid"], "models": worker["models"]} for worker in workers]}
+
+@app.get("/rate_limits")
+async def rate_limits():
+    return {name: limiter.stats() for name, limiter in rate_limiters.items()}
+
+@app.get("/cache_stats")
+async def cache_stats():
+    # Gemini descriptions are cached in this process; captions and vectors in the model workers
+    workers = await model_workers.worker_stats()
+    return {
+        "embedding_cache": embedding_cache.stats(),
+        "stages": stage_cache.stats(),
+        "worker_stages": [{"pid": worker["pid"], "stages": worker["stages"]} for worker in workers],
+    }
 
 @app.get("/get_edges")
 async def get_edges(
@@ -370,6 +716,7 @@ async def get_edges(
     page: int = Query(1),  # Add page number
     page_size: int = Query(1000)  # Add page size
 ):
+    await rate_limiters["supabase"].acquire()
     # Calculate how much to skip
     offset = (page - 1) * page_size
 
@@ -394,6 +741,7 @@ async def get_edges(
 
 @app.get("/target_edge")
 async def get_target_edge(website1: str = Query(...), website2: str = Query(...), users: List[int] = Query(...)):
+    await rate_limiters["supabase"].acquire()
     result = SUPABASE.rpc("count_user_records_between_sites", {
         "user_ids": users, 
         "origin_site": website1,
@@ -412,6 +760,7 @@ async def get_user_edges(
     page: int = Query(1),
     page_size: int = Query(1000)
 ):
+    await rate_limiters["supabase"].acquire()
     offset = (page - 1) * page_size
     result = SUPABASE.table("browsing_complete")\
         .select("*")\
@@ -452,6 +801,7 @@ async def get_node_statistics(
         users = list(range(9))
 
         # Query edges dynamically
+        await rate_limiters["supabase"].acquire()
         query = SUPABASE.table("browsing_complete")\
             .select("*")\
             .in_("user", users)\
@@ -557,39 +907,50 @@ async def get_node_statistics(
 #         return JSONResponse(content={"status": "error", "message": str(e)})
 
 
+RANKINGS_PATH = os.getenv("RANKINGS_PATH", "precomputed_rankings.csv")
+RANKINGS_GZ_DIR = os.getenv("RANKINGS_GZ_DIR", "v1")
+
+rankings_store = RankingsStore(RANKINGS_PATH)
+precompressed_rankings = PrecompressedStore(RANKINGS_GZ_DIR)
+
 @app.get("/get_precomputed_rankings")
 async def get_precomputed_rankings(query: str = Query(...)):
-    filename = "precomputed_rankings.csv"
-    
     try:
-        df = pd.read_csv(filename)
-        query_df = df[df['query'] == query].copy()
-        
-        if query_df.empty:
+        results = rankings_store.get(query)
+
+        if not results:
             return {"status": "error", "message": f"No rankings found for query '{query}'."}
-        
-        query_df.sort_values("rank", inplace=True)
-        
-        results = [
-            {
-                "rank": int(row["rank"]),
-                "id": row["website_id"],
-                "isValidDomain": row["isValidDomain"],
-                "score": float(row["score"])
-            }
-            for _, row in query_df.iterrows()
-        ]
-        
+
         return {
             "status": "success",
             "query": query,
             "results": results
         }
-        
+
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
 
+@app.get("/rankings/{word}")
+async def get_rankings_gz(word: str, request: Request):
+    """Serves v1/<word>.json.gz as-is, without decompressing or re-serializing"""
+    payload = precompressed_rankings.get(word)
+    if payload is None:
+        return JSONResponse(
+            status_code=404,
+            content={"status": "error", "message": f"No rankings found for '{word}'."}
+        )
+
+    headers = {"Vary": "Accept-Encoding", "Cache-Control": "public, max-age=3600"}
+    if "gzip" not in request.headers.get("accept-encoding", ""):
+        return Response(content=gzip.decompress(payload), media_type="application/json", headers=headers)
+    return Response(
+        content=payload,
+        media_type="application/json",
+        headers={**headers, "Content-Encoding": "gzip"}
+    )
+
+
 # def fetch_all_edges():
 #     users = [0, 1, 2, 3, 4, 5, 6, 7, 8]
 #     page_size = 1000
@@ -881,7 +1242,6 @@ async def get_precomputed_rankings(query: str = Query(...)):
 #     except Exception as e:
 #         return JSONResponse(content={"status": "error", "message": str(e)})
 # ---- add near your other imports ----
-import os, json
 from pathlib import Path
 from typing import List
 from fastapi.responses import JSONResponse
@@ -0,0 +1,159 @@
+"""
+Cross-request micro-batching.
+
+Concurrent jobs each ask for embeddings of one or a few items. A MicroBatcher
+queues those requests and merges them. A batch is sent once it holds
+`max_batch` items or its first request has waited `max_wait` seconds. The
+batch runs as one `run_batch` call, and each caller gets back its own slice of
+the results.
+
+At most `concurrency` batches run at once. While all slots are busy, requests
+keep queueing, so batches fill up more under load. close() fails every request
+that hasn't been answered yet, so callers never wait on a stopped batcher.
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+
+MICROBATCH_MAX_WAIT_MS = float(os.getenv("MICROBATCH_MAX_WAIT_MS", "10"))
+MICROBATCH_MAX_SIZE = int(os.getenv("MICROBATCH_MAX_SIZE", "32"))
+
+
+class MicroBatcher:
+    def __init__(self, name: str, run_batch, max_batch: int = MICROBATCH_MAX_SIZE,
+                 max_wait: float = MICROBATCH_MAX_WAIT_MS / 1000, concurrency: int = 1):
+        """`run_batch(items)` is an async callable returning one result per item, in order."""
+        self.name = name
+        self.run_batch = run_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.concurrency = concurrency
+        self.queue = None
+        self.slots = None
+        self.task = None
+        self.dispatches = set()  # running _dispatch tasks, referenced so they aren't collected mid-batch
+        self.queue_waits = deque(maxlen=1000)
+        self.counters = {"requests": 0, "items": 0, "batches": 0, "failed_batches": 0}
+
+    def _ensure_started(self):
+        if self.task is None or self.task.done():
+            self.queue = asyncio.Queue()
+            self.slots = asyncio.Semaphore(self.concurrency)
+            self.task = asyncio.create_task(self._collect())
+
+    async def submit_many(self, items: list) -> list:
+        """Results for `items`, computed in a batch shared with other callers"""
+        if not items:
+            return []
+        self.counters["requests"] += 1
+        if self.max_wait <= 0:
+            self.counters["items"] += len(items)
+            self.counters["batches"] += 1
+            return await self.run_batch(items)
+
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((items, future, time.perf_counter()))
+        return await future
+
+    async def submit(self, item):
+        return (await self.submit_many([item]))[0]
+
+    def _fail(self, pending: list, error: BaseException):
+        for _, future, _ in pending:
+            if not future.done():
+                future.set_exception(error)
+
+    def _closed_error(self) -> RuntimeError:
+        return RuntimeError(f"{self.name} batcher closed")
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        pending = []
+        try:
+            while True:
+                pending = []
+                # Wait for a free slot first, so requests pile up while every batch is busy
+                await self.slots.acquire()
+                await self._fill(pending, loop)
+                task = asyncio.create_task(self._dispatch(pending))
+                self.dispatches.add(task)
+                task.add_done_callback(self.dispatches.discard)
+        except asyncio.CancelledError:
+            # Requests already taken off the queue for the next batch
+            self._fail(pending, self._closed_error())
+            raise
+
+    async def _fill(self, pending: list, loop):
+        """Take queued requests into `pending` until the batch is full or max_wait has passed"""
+        pending.append(await self.queue.get())
+        size = len(pending[0][0])
+        deadline = loop.time() + self.max_wait
+        while size < self.max_batch:
+            if self.queue.empty():
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    entry = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            else:
+                entry = self.queue.get_nowait()
+            pending.append(entry)
+            size += len(entry[0])
+
+    async def _dispatch(self, pending: list):
+        try:
+            # Callers that gave up while queued don't need their items computed
+            pending = [entry for entry in pending if not entry[1].done()]
+            if not pending:
+                return
+            now = time.perf_counter()
+            self.queue_waits.extend(now - enqueued for _, _, enqueued in pending)
+            items = [item for entry_items, _, _ in pending for item in entry_items]
+            self.counters["items"] += len(items)
+            self.counters["batches"] += 1
+            try:
+                results = await self.run_batch(items)
+            except asyncio.CancelledError:
+                self._fail(pending, self._closed_error())
+                raise
+            except Exception as e:
+                self.counters["failed_batches"] += 1
+                self._fail(pending, e)
+                return
+
+            position = 0
+            for entry_items, future, _ in pending:
+                if not future.done():
+                    future.set_result(results[position:position + len(entry_items)])
+                position += len(entry_items)
+        finally:
+            self.slots.release()
+
+    def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        for task in list(self.dispatches):
+            task.cancel()
+        if self.queue is not None:
+            while not self.queue.empty():
+                self._fail([self.queue.get_nowait()], self._closed_error())
+
+    def stats(self) -> dict:
+        batches = self.counters["batches"]
+        waits = sorted(self.queue_waits)
+        return {
+            **self.counters,
+            "max_batch": self.max_batch,
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+            "avg_batch_size": round(self.counters["items"] / batches, 2) if batches else 0.0,
+            "fill_ratio": round(self.counters["items"] / (batches * self.max_batch), 3) if batches else 0.0,
+            "queue_ms_p50": round(1000 * waits[len(waits) // 2], 2) if waits else 0.0,
+            "queue_ms_p95": round(1000 * waits[int(len(waits) * 0.95)], 2) if waits else 0.0,
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+        }
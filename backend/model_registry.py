@@ -0,0 +1,98 @@
+"""
+Lazy model registry.
+
+Modules register a loader per model at import time (cheap); the model itself is
+only loaded the first time registry.get(name) is called, or by an explicit
+warmup(). Models unused for a while can be unloaded to free memory and are
+transparently reloaded on the next get().
+"""
+
+import asyncio
+import gc
+import threading
+import time
+
+
+def torch_device() -> str:
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+class ModelRegistry:
+    def __init__(self):
+        self.loaders = {}
+        self.models = {}
+        self.last_used = {}
+        self.load_seconds = {}
+        self.locks = {}
+        self.lock = threading.Lock()
+
+    def register(self, name: str, loader):
+        """`loader()` returns whatever get(name) should hand back (model, processor tuple, ...)."""
+        with self.lock:
+            self.loaders[name] = loader
+            self.locks[name] = threading.Lock()
+
+    def get(self, name: str):
+        model = self.models.get(name)
+        if model is None:
+            with self.locks[name]:
+                model = self.models.get(name)
+                if model is None:
+                    print(f"[Models] Loading {name}...")
+                    start = time.perf_counter()
+                    model = self.loaders[name]()
+                    self.load_seconds[name] = round(time.perf_counter() - start, 2)
+                    self.models[name] = model
+                    print(f"[Models] Loaded {name} in {self.load_seconds[name]}s")
+        self.last_used[name] = time.time()
+        return model
+
+    def warmup(self, names: list[str] | None = None) -> dict:
+        """Load `names` (default: every registered model) and return load seconds per model."""
+        for name in names or list(self.loaders):
+            self.get(name)
+        return {name: self.load_seconds.get(name) for name in names or self.loaders}
+
+    def unload(self, name: str):
+        with self.locks[name]:
+            if self.models.pop(name, None) is None:
+                return
+        print(f"[Models] Unloaded {name}")
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+
+    def unload_idle(self, max_idle: float) -> list[str]:
+        now = time.time()
+        idle = [
+            name for name in list(self.models)
+            if now - self.last_used.get(name, now) > max_idle
+        ]
+        for name in idle:
+            self.unload(name)
+        return idle
+
+    async def unload_idle_loop(self, max_idle: float, interval: float = 60):
+        while True:
+            await asyncio.sleep(interval)
+            self.unload_idle(max_idle)
+
+    def stats(self) -> dict:
+        now = time.time()
+        return {
+            name: {
+                "loaded": name in self.models,
+                "load_seconds": self.load_seconds.get(name),
+                "idle_seconds": round(now - self.last_used[name], 1) if name in self.last_used else None,
+            }
+            for name in self.loaders
+        }
+
+
+# Shared by img_processing, text_processing and the API
+registry = ModelRegistry()
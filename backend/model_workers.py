@@ -0,0 +1,267 @@
+"""
+Out-of-process model workers.
+
+Image and text embedding run in a pool of spawned processes, so PyTorch never
+holds the API's event loop or GIL. Each worker loads its own copy of the models
+(lazily, through model_registry) and can be pinned to its own group of cores.
+Decoded images go to the workers through shared memory rather than being
+pickled; the returned vectors are small and come back through the pool.
+
+MODEL_WORKERS=0 keeps inference in-process, on the blocking thread pool.
+Requests from concurrent jobs are merged by micro_batcher before they reach
+a worker, so each forward pass covers as many items as possible.
+"""
+
+import asyncio
+import multiprocessing as mp
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+from PIL import Image
+
+from micro_batcher import MicroBatcher
+from server_utils import run_blocking
+
+MODEL_WORKERS = int(os.getenv("MODEL_WORKERS", "1"))
+# Torch threads per worker, and the size of the core group each worker is pinned to
+MODEL_WORKER_THREADS = int(os.getenv("MODEL_WORKER_THREADS", "0"))
+# Models each worker loads as soon as it starts, e.g. "clip,distilbert"
+MODEL_WORKER_WARMUP = [name for name in os.getenv("MODEL_WORKER_WARMUP", "").split(",") if name]
+# Workers unload models nobody has used for this many seconds (0 keeps them loaded)
+MODEL_IDLE_UNLOAD_SECONDS = float(os.getenv("MODEL_IDLE_UNLOAD_SECONDS", "0"))
+
+# Set in each worker by _init_worker; holds every worker on a broadcast call until all have one
+_barrier = None
+
+
+def pack_images(images: list[Image.Image]) -> tuple[SharedMemory, list[tuple]]:
+    """Copy RGB pixels into one shared-memory block; returns it and each image's (offset, shape)"""
+    arrays = [np.asarray(img.convert("RGB")) for img in images]
+    shm = SharedMemory(create=True, size=max(sum(a.nbytes for a in arrays), 1))
+    layout = []
+    offset = 0
+    for array in arrays:
+        np.ndarray(array.shape, dtype=np.uint8, buffer=shm.buf, offset=offset)[:] = array
+        layout.append((offset, array.shape))
+        offset += array.nbytes
+    return shm, layout
+
+
+def unpack_images(shm_name: str, layout: list[tuple]) -> list[Image.Image]:
+    shm = SharedMemory(name=shm_name)
+    try:
+        return [
+            Image.fromarray(np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=offset).copy())
+            for offset, shape in layout
+        ]
+    finally:
+        shm.close()
+
+
+def _init_worker(counter, barrier, threads: int, warmup: list[str], idle_unload: float = 0):
+    global _barrier
+    _barrier = barrier
+    with counter.get_lock():
+        worker_id = counter.value
+        counter.value += 1
+
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+        if hasattr(os, "sched_setaffinity"):
+            cores = sorted(os.sched_getaffinity(0))
+            groups = [cores[i:i + threads] for i in range(0, len(cores), threads)]
+            os.sched_setaffinity(0, groups[worker_id % len(groups)])
+
+    # Imported only for their registry.register calls, which register the models in this process
+    import img_processing, text_processing  # noqa: F401
+    from model_registry import registry
+    if warmup:
+        registry.warmup(warmup)
+    if idle_unload > 0:
+        threading.Thread(target=_unload_idle_forever, args=(idle_unload,), daemon=True).start()
+    print(f"[ModelWorkers] Worker {worker_id} ready (pid {os.getpid()})")
+
+
+def _unload_idle_forever(max_idle: float, interval: float = 60):
+    from model_registry import registry
+    while True:
+        time.sleep(interval)
+        registry.unload_idle(max_idle)
+
+
+def _warmup_worker(names: list[str] | None) -> dict:
+    from model_registry import registry
+    return {"pid": os.getpid(), "load_seconds": registry.warmup(names)}
+
+
+def _worker_stats() -> dict:
+    """What this process has loaded and its stage-cache counters"""
+    from model_registry import registry
+    from stage_cache import stage_cache
+    return {"pid": os.getpid(), "models": registry.stats(), "stages": stage_cache.stats()}
+
+
+def _on_every_worker(fn, timeout: float, *args):
+    """Run fn, then keep this worker busy until every worker has taken its call"""
+    result = fn(*args)
+    try:
+        _barrier.wait(timeout)
+    except threading.BrokenBarrierError:
+        pass  # a worker stayed busy past the timeout; the caller drops duplicate pids
+    return result
+
+
+def _embed_images(shm_name: str, layout: list[tuple], batch_size: int | None):
+    from img_processing import IMG_BATCH_SIZE, embed_images
+    return embed_images(unpack_images(shm_name, layout), batch_size or IMG_BATCH_SIZE)
+
+
+def _text_embeddings(texts: list[str], long_document: bool):
+    from text_processing import get_text_embeddings_batch
+    return get_text_embeddings_batch(texts, long_document=long_document)
+
+
+class ModelWorkerPool:
+    def __init__(self, workers: int = MODEL_WORKERS, threads_per_worker: int = MODEL_WORKER_THREADS,
+                 warmup: list[str] | None = None, idle_unload: float = MODEL_IDLE_UNLOAD_SECONDS):
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker
+        self.warmup_models = list(MODEL_WORKER_WARMUP if warmup is None else warmup)
+        self.idle_unload = idle_unload
+        self.executor = None
+        self.barrier = None
+        self.broadcast_lock = asyncio.Lock()
+        self.in_flight = 0
+        self.counters = {"submitted": 0, "completed": 0, "failed": 0, "restarts": 0, "total_seconds": 0.0}
+        concurrency = max(workers, 1)
+        self.batchers = {
+            "images": MicroBatcher("images", self._embed_images, concurrency=concurrency),
+            "text": MicroBatcher("text", lambda texts: self._text_embeddings(texts, False), concurrency=concurrency),
+            "text_long": MicroBatcher("text_long", lambda texts: self._text_embeddings(texts, True), concurrency=concurrency),
+        }
+
+    def start(self):
+        """Create the process pool; workers are spawned as work arrives"""
+        if self.workers and self.executor is None:
+            ctx = mp.get_context("spawn")
+            self.barrier = ctx.Barrier(self.workers)
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=ctx,
+                initializer=_init_worker,
+                initargs=(ctx.Value("i", 0), self.barrier, self.threads_per_worker, self.warmup_models,
+                          self.idle_unload),
+            )
+
+    def _stop_executor(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def close(self):
+        """Stop the batchers (failing anything still queued) and the worker processes"""
+        for batcher in self.batchers.values():
+            batcher.close()
+        self._stop_executor()
+
+    async def _run(self, fn, *args):
+        self.start()
+        executor = self.executor
+        self.counters["submitted"] += 1
+        self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            if executor is None:
+                result = await run_blocking(fn, *args)
+            else:
+                result = await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+            self.counters["completed"] += 1
+            return result
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM). Replace only the process pool; the batchers keep
+            # running, and the next call starts fresh workers
+            self.counters["failed"] += 1
+            if self.executor is executor:
+                print("[ModelWorkers] Worker pool broke, restarting")
+                self.counters["restarts"] += 1
+                self._stop_executor()
+            raise
+        except Exception:
+            self.counters["failed"] += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self.counters["total_seconds"] += time.perf_counter() - start
+
+    async def _on_every_worker(self, fn, *args, timeout: float) -> list[dict]:
+        """
+        fn(*args) once in each worker process (or in this process with MODEL_WORKERS=0).
+        fn returns a dict with the worker's "pid". A worker held up by other work for
+        longer than `timeout` may be missed.
+        """
+        if not self.workers:
+            return [await run_blocking(fn, *args)]
+        async with self.broadcast_lock:
+            self.start()
+            self.barrier.reset()
+            results = await asyncio.gather(
+                *(self._run(_on_every_worker, fn, timeout, *args) for _ in range(self.workers))
+            )
+        return list({result["pid"]: result for result in results}.values())
+
+    async def warmup(self, names: list[str] | None = None) -> list[dict]:
+        """
+        Load `names` (default: every registered model) where inference runs. Workers
+        started later (or after a crash) load them on start-up too.
+        """
+        if names:
+            self.warmup_models = list(dict.fromkeys([*self.warmup_models, *names]))
+        return await self._on_every_worker(_warmup_worker, names, timeout=300)
+
+    async def worker_stats(self) -> list[dict]:
+        """Loaded models and stage-cache counters of each worker process"""
+        return await self._on_every_worker(_worker_stats, timeout=10)
+
+    async def embed_images(self, images: list[Image.Image]) -> list[list[float]]:
+        """img_processing.embed_images in a worker process, batched with other callers' images"""
+        return await self.batchers["images"].submit_many(images)
+
+    async def text_embeddings(self, texts: list[str], long_document: bool = False) -> list[list[float]]:
+        """text_processing.get_text_embeddings_batch in a worker process, batched with other callers' texts"""
+        return await self.batchers["text_long" if long_document else "text"].submit_many(texts)
+
+    async def _embed_images(self, images: list[Image.Image], batch_size: int | None = None) -> list[list[float]]:
+        if not images:
+            return []
+        if not self.workers:
+            from img_processing import IMG_BATCH_SIZE, embed_images
+            return await self._run(embed_images, images, batch_size or IMG_BATCH_SIZE)
+
+        shm, layout = pack_images(images)
+        try:
+            return await self._run(_embed_images, shm.name, layout, batch_size)
+        finally:
+            shm.close()
+            shm.unlink()
+
+    async def _text_embeddings(self, texts: list[str], long_document: bool) -> list[list[float]]:
+        if not texts:
+            return []
+        return await self._run(_text_embeddings, texts, long_document)
+
+    def stats(self) -> dict:
+        done = self.counters["completed"] + self.counters["failed"]
+        return {
+            "workers": self.workers,
+            "threads_per_worker": self.threads_per_worker,
+            "in_flight": self.in_flight,
+            **{k: v for k, v in self.counters.items() if k != "total_seconds"},
+            "avg_seconds": round(self.counters["total_seconds"] / done, 3) if done else 0.0,
+            "batching": {name: batcher.stats() for name, batcher in self.batchers.items()},
+        }
@@ -0,0 +1,159 @@
+"""
+Optional ONNX Runtime backend for the CLIP and DistilBERT encoders.
+
+INFERENCE_BACKEND selects how img_processing / text_processing run them:
+    torch      PyTorch eager (default)
+    onnx       ONNX Runtime, fp32
+    onnx-int8  ONNX Runtime with dynamic int8 weight quantization
+
+Models are exported to ONNX_MODEL_DIR on first use and reused afterwards.
+BLIP captioning is autoregressive generation and stays on PyTorch.
+Needs `onnx` and `onnxruntime` (requirements-onnx.txt) for the onnx backends.
+"""
+
+import os
+from pathlib import Path
+
+from model_registry import registry
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+ONNX_MODEL_DIR = Path(os.getenv("ONNX_MODEL_DIR", "onnx_models"))
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0"))  # 0 lets ONNX Runtime decide
+OPSET = 17
+
+CLIP_NAME = "openai/clip-vit-base-patch32"
+DISTILBERT_NAME = "distilbert-base-uncased"
+
+if INFERENCE_BACKEND not in BACKENDS:
+    raise ValueError(f"INFERENCE_BACKEND must be one of {BACKENDS}, got {INFERENCE_BACKEND!r}")
+
+
+def use_onnx() -> bool:
+    return INFERENCE_BACKEND != "torch"
+
+
+def quantized() -> bool:
+    return INFERENCE_BACKEND == "onnx-int8"
+
+
+def export_clip(out_dir: Path) -> tuple[Path, Path]:
+    import torch
+    from transformers import CLIPModel
+
+    clip_model = CLIPModel.from_pretrained(CLIP_NAME).eval()
+
+    class ImageEncoder(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.clip = clip_model
+
+        def forward(self, pixel_values):
+            return self.clip.get_image_features(pixel_values=pixel_values)
+
+    class TextEncoder(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.clip = clip_model
+
+        def forward(self, input_ids, attention_mask):
+            return self.clip.get_text_features(input_ids=input_ids, attention_mask=attention_mask)
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    image_path, text_path = out_dir / "clip_image.onnx", out_dir / "clip_text.onnx"
+    with torch.no_grad():
+        torch.onnx.export(
+            ImageEncoder(), (torch.zeros(1, 3, 224, 224),), str(image_path),
+            input_names=["pixel_values"], output_names=["embeds"],
+            dynamic_axes={"pixel_values": {0: "batch"}, "embeds": {0: "batch"}},
+            opset_version=OPSET,
+        )
+        tokens = torch.ones(1, 8, dtype=torch.long)
+        torch.onnx.export(
+            TextEncoder(), (tokens, tokens), str(text_path),
+            input_names=["input_ids", "attention_mask"], output_names=["embeds"],
+            dynamic_axes={"input_ids": {0: "batch", 1: "sequence"},
+                          "attention_mask": {0: "batch", 1: "sequence"},
+                          "embeds": {0: "batch"}},
+            opset_version=OPSET,
+        )
+    return image_path, text_path
+
+
+def export_distilbert(out_dir: Path) -> Path:
+    """Exports DistilBERT up to the [CLS] hidden state (768-d); the projection stays in text_processing."""
+    import torch
+    from transformers import DistilBertModel
+
+    model = DistilBertModel.from_pretrained(DISTILBERT_NAME).eval()
+
+    class ClsEncoder(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state[:, 0, :]
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    path = out_dir / "distilbert_cls.onnx"
+    tokens = torch.ones(1, 8, dtype=torch.long)
+    with torch.no_grad():
+        torch.onnx.export(
+            ClsEncoder(), (tokens, tokens), str(path),
+            input_names=["input_ids", "attention_mask"], output_names=["cls"],
+            dynamic_axes={"input_ids": {0: "batch", 1: "sequence"},
+                          "attention_mask": {0: "batch", 1: "sequence"},
+                          "cls": {0: "batch"}},
+            opset_version=OPSET,
+        )
+    return path
+
+
+def quantize(path: Path) -> Path:
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    int8_path = path.with_name(path.stem + ".int8.onnx")
+    if not int8_path.exists():
+        quantize_dynamic(str(path), str(int8_path), weight_type=QuantType.QInt8)
+    return int8_path
+
+
+def load_session(path: Path):
+    import onnxruntime as ort
+
+    if quantized():
+        path = quantize(path)
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if ONNX_THREADS:
+        options.intra_op_num_threads = ONNX_THREADS
+    return ort.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+
+
+def load_clip_onnx():
+    from transformers import CLIPProcessor
+
+    image_path, text_path = ONNX_MODEL_DIR / "clip_image.onnx", ONNX_MODEL_DIR / "clip_text.onnx"
+    if not (image_path.exists() and text_path.exists()):
+        print(f"[Models] Exporting CLIP to {ONNX_MODEL_DIR}...")
+        export_clip(ONNX_MODEL_DIR)
+    clip_processor = CLIPProcessor.from_pretrained(CLIP_NAME)
+    return clip_processor, load_session(image_path), load_session(text_path)
+
+
+def load_distilbert_onnx():
+    from transformers import DistilBertTokenizerFast
+
+    path = ONNX_MODEL_DIR / "distilbert_cls.onnx"
+    if not path.exists():
+        print(f"[Models] Exporting DistilBERT to {ONNX_MODEL_DIR}...")
+        export_distilbert(ONNX_MODEL_DIR)
+    tokenizer = DistilBertTokenizerFast.from_pretrained(DISTILBERT_NAME)
+    return tokenizer, load_session(path)
+
+
+# Only registered for the onnx backends, so a default warmup under torch never exports or imports onnxruntime
+if use_onnx():
+    registry.register("clip_onnx", load_clip_onnx)
+    registry.register("distilbert_onnx", load_distilbert_onnx)
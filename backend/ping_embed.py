@@ -1,5 +1,4 @@
 import requests
-import time
 
 
 websites = [
@@ -508,33 +507,19 @@ websites = [
 
 
 
-base_url = "http://127.0.0.1:8000/embed-website"
+base_url = "http://127.0.0.1:8000/embed-websites"
 
 
 def main():
-    for website in websites:
-        try:
-            # Ensure the URL has a scheme (http/https)
-            if not website.startswith(('http://', 'https://')):
-                url_to_send = f"https://{website}"
-            else:
-                url_to_send = website
-                
-            print(f"Processing: {url_to_send}")
-            
-            response = requests.post(base_url, data={"url": url_to_send})
-            
-            print(f"Response: {response.status_code} - {response.json()}")
-            
-            # Add a small delay to avoid overwhelming the server
-            time.sleep(.5)
-            
-        except Exception as e:
-            print(f"Error processing {website}: {str(e)}")
-            continue
+    # One bulk request: the server normalizes, dedupes and skips sites already embedded
+    try:
+        response = requests.post(base_url, json={"urls": websites})
+        print(f"Response: {response.status_code} - {response.json()}")
+    except Exception as e:
+        print(f"Error submitting websites: {str(e)}")
 
 print("Finished processing all websites")
 
     
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,94 @@
+"""
+Startup-loaded stores for the precomputed rankings.
+
+RankingsStore keeps precomputed_rankings.csv grouped per query as columns, so a
+lookup only touches that query's rows. PrecompressedStore serves the
+v1/<word>.json.gz payloads as raw gzip bytes. Both reload a file when its mtime
+changes.
+"""
+
+import re
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+WORD_RE = re.compile(r"^[a-z0-9_-]+$")
+
+
+class RankingsStore:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.mtime = None
+        self.by_query = {}
+        try:
+            self.refresh()
+        except FileNotFoundError:
+            print(f"[Rankings] {self.path} not found, will retry on first request")
+
+    def _load(self):
+        df = pd.read_csv(self.path)
+        df = df.sort_values(["query", "rank"], kind="mergesort")
+        has_valid = "isValidDomain" in df.columns
+
+        by_query = {}
+        for query, group in df.groupby("query", sort=False):
+            by_query[query] = {
+                "rank": group["rank"].astype(int).tolist(),
+                "id": group["website_id"].tolist(),
+                "isValidDomain": group["isValidDomain"].tolist() if has_valid else [None] * len(group),
+                "score": group["score"].astype(float).tolist(),
+            }
+        return by_query
+
+    def refresh(self):
+        """Reload the CSV if it changed on disk since the last load."""
+        mtime = self.path.stat().st_mtime_ns
+        if mtime == self.mtime:
+            return
+        with self.lock:
+            if mtime == self.mtime:
+                return
+            self.by_query = self._load()
+            self.mtime = mtime
+            print(f"[Rankings] Loaded {len(self.by_query)} queries from {self.path}")
+
+    def get(self, query: str) -> list[dict] | None:
+        self.refresh()
+        columns = self.by_query.get(query)
+        if columns is None:
+            return None
+        return [
+            {"rank": rank, "id": website_id, "isValidDomain": valid, "score": score}
+            for rank, website_id, valid, score in zip(
+                columns["rank"], columns["id"], columns["isValidDomain"], columns["score"]
+            )
+        ]
+
+
+class PrecompressedStore:
+    """In-memory cache of <dir>/<word>.json.gz files, kept as compressed bytes."""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.lock = threading.Lock()
+        self.files = {}  # word -> (mtime, bytes)
+
+    def get(self, word: str) -> bytes | None:
+        if not WORD_RE.match(word):
+            return None
+        path = self.directory / f"{word}.json.gz"
+        try:
+            mtime = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+        cached = self.files.get(word)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        payload = path.read_bytes()
+        with self.lock:
+            self.files[word] = (mtime, payload)
+        return payload
@@ -0,0 +1,114 @@
+"""
+Asyncio token-bucket rate limiters, one budget per upstream provider.
+
+Each bucket refills at `per_minute / 60` tokens per second up to `burst`.
+Waiters are served strictly in arrival order: the head of the queue holds the
+lock while it sleeps for its tokens, and everyone behind it queues on the lock.
+would_wait() answers "how long would I wait" without blocking, so callers can
+shed load instead of queueing.
+"""
+
+import asyncio
+import os
+import time
+
+# provider -> (calls per minute, burst)
+DEFAULT_BUDGETS = {
+    "gemini_generate": (30, 5),  # the old RateLimiter(calls_per_minute=30) budget
+    "gemini_embed": (30, 10),
+    "pinecone": (600, 100),
+    "supabase": (600, 100),
+}
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, name: str, wait: float):
+        super().__init__(f"{name} rate limit: would wait {wait:.1f}s")
+        self.name = name
+        self.wait = wait
+
+
+class TokenBucket:
+    def __init__(self, name: str, per_minute: float, burst: float | None = None):
+        self.name = name
+        self.rate = per_minute / 60.0
+        self.capacity = burst if burst is not None else per_minute
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.queued_tokens = 0.0
+        self.waiters = 0
+        self._lock = asyncio.Lock()
+        self.counters = {"acquired": 0, "waited": 0, "total_wait": 0.0, "max_wait": 0.0}
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def would_wait(self, tokens: float = 1) -> float:
+        """Seconds a new caller would wait for `tokens`, counting everyone already queued."""
+        self._refill()
+        deficit = self.queued_tokens + tokens - self.tokens
+        return max(0.0, deficit / self.rate)
+
+    async def acquire(self, tokens: float = 1) -> float:
+        """Wait for `tokens` (FIFO) and return how long the caller waited."""
+        if tokens > self.capacity:
+            raise ValueError(f"{self.name}: cannot acquire {tokens} tokens with burst {self.capacity}")
+
+        start = time.monotonic()
+        self.queued_tokens += tokens
+        self.waiters += 1
+        try:
+            async with self._lock:
+                self._refill()
+                if self.tokens < tokens:
+                    await asyncio.sleep((tokens - self.tokens) / self.rate)
+                    self._refill()
+                self.tokens -= tokens
+        finally:
+            self.queued_tokens -= tokens
+            self.waiters -= 1
+
+        waited = time.monotonic() - start
+        self.counters["acquired"] += 1
+        if waited > 0.001:
+            self.counters["waited"] += 1
+            self.counters["total_wait"] += waited
+            self.counters["max_wait"] = max(self.counters["max_wait"], waited)
+        return waited
+
+    async def wait_if_needed(self):
+        """Compatibility name for the old sliding-window RateLimiter"""
+        await self.acquire()
+
+    def stats(self) -> dict:
+        self._refill()
+        waited = self.counters["waited"]
+        return {
+            "per_minute": round(self.rate * 60, 2),
+            "burst": self.capacity,
+            "tokens": round(self.tokens, 2),
+            "waiters": self.waiters,
+            "would_wait": round(self.would_wait(), 3),
+            "acquired": self.counters["acquired"],
+            "waited": waited,
+            "avg_wait": round(self.counters["total_wait"] / waited, 3) if waited else 0.0,
+            "max_wait": round(self.counters["max_wait"], 3),
+        }
+
+
+def build_limiters(budgets: dict | None = None) -> dict[str, TokenBucket]:
+    """
+    One TokenBucket per provider. Each budget can be overridden with
+    RATE_LIMIT_<PROVIDER>="<per_minute>[:<burst>]", e.g. RATE_LIMIT_GEMINI_EMBED=60:20.
+    """
+    limiters = {}
+    for name, (per_minute, burst) in (budgets or DEFAULT_BUDGETS).items():
+        override = os.getenv(f"RATE_LIMIT_{name.upper()}")
+        if override:
+            per_minute, _, burst_override = override.partition(":")
+            per_minute = float(per_minute)
+            burst = float(burst_override) if burst_override else per_minute
+        limiters[name] = TokenBucket(name, per_minute, burst)
+    return limiters
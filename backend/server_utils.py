@@ -1,6 +1,19 @@
 import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import httpx
 
+# Bounded pool for blocking SDK calls (Gemini, Pinecone) made from async endpoints
+BLOCKING_WORKERS = int(os.getenv("BLOCKING_WORKERS", "8"))
+blocking_executor = ThreadPoolExecutor(max_workers=BLOCKING_WORKERS, thread_name_prefix="blocking")
+
+async def run_blocking(fn, *args, **kwargs):
+    """Run a blocking call on blocking_executor without stalling the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(blocking_executor, functools.partial(fn, *args, **kwargs))
+
 async def keep_alive():
     """Keep the server alive"""
     while True:
@@ -9,4 +22,4 @@ async def keep_alive():
                 await client.get("https://internet-atlas.onrender.com/", timeout = 10.0)
         except Exception as e:
             print(e)
-        await asyncio.sleep(300)
\ No newline at end of file
+        await asyncio.sleep(300)
@@ -0,0 +1,95 @@
+"""
+Content-addressed cache for pipeline stage outputs (captions, per-modality
+vectors, LLM descriptions).
+
+Entries are keyed by the stage name, a version string identifying the model
+(and anything else that changes its output), and a hash of the stage input.
+Re-crawling an unchanged page therefore skips captioning and embedding.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import defaultdict
+
+
+def content_hash(*parts) -> str:
+    """sha256 over str/bytes parts (PIL images are hashed by mode, size and pixels)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        if hasattr(part, "tobytes") and hasattr(part, "size") and hasattr(part, "mode"):
+            digest.update(f"{part.mode}:{part.size}".encode("utf-8"))
+            part = part.tobytes()
+        elif isinstance(part, str):
+            part = part.encode("utf-8")
+        digest.update(len(part).to_bytes(8, "little"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class StageCache:
+    def __init__(self, path: str | None = "stage_cache.sqlite3"):
+        self.lock = threading.Lock()
+        self.counters = defaultdict(lambda: {"hits": 0, "misses": 0})
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS stage_outputs ("
+                " stage TEXT, version TEXT, input_hash TEXT, value TEXT,"
+                " PRIMARY KEY (stage, version, input_hash))"
+            )
+
+    def get(self, stage: str, version: str, input_hash: str):
+        row = None
+        if self.db is not None:
+            with self.lock:
+                row = self.db.execute(
+                    "SELECT value FROM stage_outputs WHERE stage = ? AND version = ? AND input_hash = ?",
+                    (stage, version, input_hash),
+                ).fetchone()
+        self.counters[stage]["hits" if row else "misses"] += 1
+        return json.loads(row[0]) if row else None
+
+    def put(self, stage: str, version: str, input_hash: str, value):
+        if self.db is None:
+            return
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO stage_outputs VALUES (?, ?, ?, ?)",
+                (stage, version, input_hash, json.dumps(value)),
+            )
+
+    def get_many(self, stage: str, version: str, input_hashes: list[str]) -> list:
+        return [self.get(stage, version, h) for h in input_hashes]
+
+    def cached(self, stage: str, version: str, input_hashes: list[str], items: list, compute) -> list:
+        """
+        Outputs for `items`, reusing cached ones. `compute(list_of_items)` is
+        called once with only the misses and must return outputs in order.
+        """
+        results = self.get_many(stage, version, input_hashes)
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            computed = compute([items[i] for i in missing])
+            for i, value in zip(missing, computed):
+                results[i] = value
+                self.put(stage, version, input_hashes[i], value)
+        return results
+
+    def stats(self) -> dict:
+        return {
+            stage: {
+                **counts,
+                "hit_rate": round(counts["hits"] / (counts["hits"] + counts["misses"]), 4)
+                if counts["hits"] + counts["misses"] else 0.0,
+            }
+            for stage, counts in self.counters.items()
+        }
+
+
+# STAGE_CACHE_PATH="" disables persistence (every lookup is a miss)
+stage_cache = StageCache(os.getenv("STAGE_CACHE_PATH", "stage_cache.sqlite3"))
@@ -0,0 +1,95 @@
+"""
+Checks for crawl_scheduler's robots.txt handling and page counters, against a
+local aiohttp server (no outside network needed).
+
+    python -m pytest backend/test_crawl_scheduler.py
+"""
+
+import asyncio
+import time
+from urllib.robotparser import RobotFileParser
+
+import pytest
+from aiohttp import web
+
+from crawl_scheduler import CrawlSkipped, HostScheduler, RobotsCache
+
+
+def parsed(lines: list[str]) -> RobotFileParser:
+    parser = RobotFileParser()
+    parser.parse(lines)
+    parser.modified()
+    return parser
+
+
+def cached_robots(origin: str, lines: list[str]) -> RobotsCache:
+    robots = RobotsCache()
+    robots.entries[origin] = (time.monotonic() + 60, parsed(lines))
+    return robots
+
+
+@pytest.mark.parametrize("url", ["tripado.de", "tripado.de/", "https://tripado.de", "https://www.tripado.de/about"])
+def test_disallow_all_applies_to_bare_domains(url):
+    robots = cached_robots("https://tripado.de", ["User-agent: *", "Disallow: /"])
+    robots.entries["https://www.tripado.de"] = robots.entries["https://tripado.de"]
+    allowed, _ = asyncio.run(robots.allowed(url))
+    assert not allowed
+
+
+def test_disallowed_path_only():
+    robots = cached_robots("https://example.com", ["User-agent: *", "Disallow: /private"])
+    assert asyncio.run(robots.allowed("example.com"))[0]
+    assert not asyncio.run(robots.allowed("example.com/private/page"))[0]
+
+
+async def fetch_with_status(status: int) -> tuple[bool, float]:
+    async def handler(request):
+        return web.Response(status=status, text="User-agent: *\nDisallow: /\n")
+
+    app = web.Application()
+    app.router.add_get("/robots.txt", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    robots = RobotsCache(ttl=3600, error_ttl=30)
+    try:
+        allowed, _ = await robots.allowed(f"http://127.0.0.1:{port}/")
+        expires = robots.entries[f"http://127.0.0.1:{port}"][0]
+        return allowed, expires - time.monotonic()
+    finally:
+        await robots.close()
+        await runner.cleanup()
+
+
+def test_missing_robots_allows_everything():
+    allowed, ttl = asyncio.run(fetch_with_status(404))
+    assert allowed
+    assert ttl > 60
+
+
+def test_server_error_disallows_until_retried():
+    allowed, ttl = asyncio.run(fetch_with_status(503))
+    assert not allowed
+    assert ttl <= 30
+
+
+def test_skipped_pages_are_not_counted_as_crawled():
+    async def run():
+        scheduler = HostScheduler(delay=0)
+        scheduler.dns.entries["blocked.com"] = (time.monotonic() + 60, ["127.0.0.1"])
+        scheduler.robots.entries["https://blocked.com"] = (
+            time.monotonic() + 60, parsed(["User-agent: *", "Disallow: /"])
+        )
+        scheduler.add("blocked.com")
+        url = await scheduler.next()
+        with pytest.raises(CrawlSkipped):
+            await scheduler.check(url)
+        scheduler.done(url)
+        return scheduler.stats()
+
+    stats = asyncio.run(run())
+    assert stats["skipped"] == 1
+    assert stats["pages"] == 0
+    assert stats["pages_per_minute"] == 0
@@ -0,0 +1,88 @@
+"""
+ONNX Runtime vs PyTorch parity for the exported CLIP and DistilBERT encoders,
+on a small fixed input. Skipped unless torch, transformers and onnxruntime
+are installed and the models have been exported to ONNX_MODEL_DIR (run once
+with INFERENCE_BACKEND=onnx, or bench_inference_backends.py). The int8
+models are checked too when they exist.
+
+    python -m pytest backend/test_inference_backends.py
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("transformers")
+ort = pytest.importorskip("onnxruntime")
+
+from bench_inference_backends import min_cosine
+from onnx_backend import CLIP_NAME, DISTILBERT_NAME, ONNX_MODEL_DIR
+
+MIN_COSINE = float(os.getenv("ONNX_PARITY_MIN_COSINE", "0.98"))
+TEXTS = [
+    "calm minimal blog about bread",
+    "bold playful shop with retro sneakers and a very long product description " * 4,
+    "news",
+]
+
+
+def sessions(name: str) -> list:
+    """InferenceSessions for the exported model and its int8 variant, whichever exist"""
+    paths = [ONNX_MODEL_DIR / f"{name}.onnx", ONNX_MODEL_DIR / f"{name}.int8.onnx"]
+    if not paths[0].exists():
+        pytest.skip(f"{paths[0]} not exported")
+    return [
+        (path.name, ort.InferenceSession(str(path), providers=["CPUExecutionProvider"]))
+        for path in paths if path.exists()
+    ]
+
+
+@pytest.fixture(scope="module")
+def clip():
+    if not (ONNX_MODEL_DIR / "clip_image.onnx").exists():
+        pytest.skip("CLIP not exported")
+    from transformers import CLIPModel, CLIPProcessor
+    return CLIPProcessor.from_pretrained(CLIP_NAME), CLIPModel.from_pretrained(CLIP_NAME).eval()
+
+
+def test_distilbert_cls_parity():
+    from transformers import DistilBertModel, DistilBertTokenizerFast
+
+    exported = sessions("distilbert_cls")
+    tokenizer = DistilBertTokenizerFast.from_pretrained(DISTILBERT_NAME)
+    model = DistilBertModel.from_pretrained(DISTILBERT_NAME).eval()
+    inputs = tokenizer(TEXTS, padding=True, truncation=True, max_length=512, return_tensors="pt")
+    with torch.no_grad():
+        reference = model(**inputs).last_hidden_state[:, 0, :].numpy()
+    feeds = {name: inputs[name].numpy() for name in ("input_ids", "attention_mask")}
+    for name, session in exported:
+        assert min_cosine(session.run(None, feeds)[0], reference) >= MIN_COSINE, name
+
+
+def test_clip_image_parity(clip):
+    from PIL import Image
+
+    exported = sessions("clip_image")
+    processor, model = clip
+    images = [Image.fromarray(np.random.default_rng(i).integers(0, 255, (96, 128, 3), dtype=np.uint8))
+              for i in range(2)]
+    pixel_values = processor(images=images, return_tensors="pt")["pixel_values"]
+    with torch.no_grad():
+        reference = model.get_image_features(pixel_values=pixel_values).numpy()
+    for name, session in exported:
+        output = session.run(None, {"pixel_values": pixel_values.numpy()})[0]
+        assert min_cosine(output, reference) >= MIN_COSINE, name
+
+
+def test_clip_text_parity(clip):
+    exported = sessions("clip_text")
+    processor, model = clip
+    inputs = processor(text=TEXTS, padding=True, truncation=True, return_tensors="pt")
+    with torch.no_grad():
+        reference = model.get_text_features(input_ids=inputs["input_ids"],
+                                            attention_mask=inputs["attention_mask"]).numpy()
+    feeds = {name: inputs[name].numpy() for name in ("input_ids", "attention_mask")}
+    for name, session in exported:
+        assert min_cosine(session.run(None, feeds)[0], reference) >= MIN_COSINE, name
@@ -0,0 +1,79 @@
+"""
+Checks for text_extraction: boilerplate is dropped, but page wrappers whose
+class happens to match a boilerplate word are not.
+
+    python -m pytest backend/test_text_extraction.py
+"""
+
+import pytest
+
+from text_extraction import extract_visible_text
+
+ARTICLE = "<h1>Hello</h1><p>Some real page content that should survive.</p>"
+
+
+@pytest.mark.parametrize("wrapper_class", [
+    "site layout-with-sidebar",
+    "modal-open",
+    "overlay-enabled",
+    "ad-free",
+])
+def test_wrapper_with_main_is_kept(wrapper_class):
+    html = f'<html><body><div class="{wrapper_class}"><main>{ARTICLE}</main></div></body></html>'
+    text = extract_visible_text(html)
+    assert "Hello" in text
+    assert "real page content" in text
+
+
+def test_wrapper_with_most_of_the_text_is_kept():
+    html = f'<html><body><div id="page" class="modal-open"><div>{ARTICLE}</div></div></body></html>'
+    assert "real page content" in extract_visible_text(html)
+
+
+def test_boilerplate_inside_wrapper_is_dropped():
+    html = (
+        '<html><body><div class="layout-with-sidebar">'
+        f'<main>{ARTICLE}</main>'
+        '<div class="sidebar">Related links</div>'
+        '<div class="cookie-banner">We use cookies</div>'
+        '</div></body></html>'
+    )
+    text = extract_visible_text(html)
+    assert "real page content" in text
+    assert "Related links" not in text
+    assert "We use cookies" not in text
+
+
+def test_hidden_wrapper_is_dropped():
+    html = f'<html><body><div style="display:none"><main>{ARTICLE}</main></div><p>Visible</p></body></html>'
+    text = extract_visible_text(html)
+    assert "Hello" not in text
+    assert "Visible" in text
+
+
+def test_page_wrapped_in_a_form_is_kept():
+    # ASP.NET WebForms: the whole body sits in one <form runat="server">
+    html = (
+        '<html><body><form method="post" action="./Default.aspx" id="form1">'
+        '<input type="hidden" name="__VIEWSTATE" value="abc" />'
+        '<header><nav>Home | About</nav></header>'
+        f'<div class="content">{ARTICLE}</div>'
+        '<footer>Copyright</footer>'
+        '</form></body></html>'
+    )
+    text = extract_visible_text(html)
+    assert "real page content" in text
+    assert "Home | About" not in text
+    assert "Copyright" not in text
+
+
+def test_page_wrapped_in_a_header_is_kept():
+    html = f'<html><body><header class="site"><div>{ARTICLE}</div></header></body></html>'
+    assert "real page content" in extract_visible_text(html)
+
+
+def test_small_form_is_dropped():
+    html = f'<html><body><main>{ARTICLE}</main><form><label>Email</label><input name="e"/></form></body></html>'
+    text = extract_visible_text(html)
+    assert "real page content" in text
+    assert "Email" not in text
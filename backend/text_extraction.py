@@ -0,0 +1,137 @@
+"""
+Visible-text extraction for crawled pages.
+
+Raw HTML is mostly script, style and markup. Before page text reaches DistilBERT
+or the Gemini prompt, this module drops non-visible elements and common
+boilerplate (nav, header/footer, cookie and consent banners, modals). It keeps
+the remaining text one line per block, removes repeated lines, and caps the
+result at TEXT_MAX_CHARS.
+"""
+
+import os
+import re
+
+from bs4 import BeautifulSoup
+
+TEXT_MAX_CHARS = int(os.getenv("TEXT_MAX_CHARS", "32000"))
+
+# Never visible, or never page content
+DROP_TAGS = [
+    "script", "style", "noscript", "template", "svg", "canvas", "iframe", "object",
+    "head", "meta", "link", "button", "select", "option", "input", "textarea",
+]
+# Usually boilerplate, but dropped like a class/role match: only when not a page wrapper
+# (ASP.NET WebForms puts the whole body in one <form>)
+BOILERPLATE_TAGS = {"form", "nav", "header", "footer", "aside"}
+DROP_ROLES = {"navigation", "banner", "contentinfo", "dialog", "alertdialog", "menu", "menubar", "search"}
+# Whole words within id/class names, so "cookie-banner" matches but "shared-layout" doesn't
+BOILERPLATE_RE = re.compile(
+    r"(?<![a-z])(cookies?|consent|gdpr|onetrust|newsletter|subscribe|popup|modal|overlay|"
+    r"breadcrumbs?|nav|navbar|navigation|menu|sidebar|footer|social|share|skip-link|ad|ads|advert)(?![a-z])",
+    re.IGNORECASE,
+)
+HIDDEN_STYLE_RE = re.compile(r"display\s*:\s*none|visibility\s*:\s*hidden", re.IGNORECASE)
+# Wrappers that often carry page-level classes ("has-cookie-banner"); never dropped by class
+KEEP_TAGS = {"html", "body", "main", "article"}
+# A class/role match holding more than this share of the page text is a layout wrapper
+# ("layout-with-sidebar", "modal-open", "ad-free"), not boilerplate
+WRAPPER_TEXT_SHARE = 0.5
+
+TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+# Running totals across pages, for /job-stats
+extraction_stats = {"pages": 0, "raw_tokens": 0, "extracted_tokens": 0}
+
+
+def count_tokens(text: str) -> int:
+    """Cheap tokenizer-independent estimate: words and punctuation marks"""
+    return len(TOKEN_RE.findall(text))
+
+
+def _parser() -> str:
+    try:
+        import lxml  # noqa: F401
+        return "lxml"
+    except ImportError:
+        return "html.parser"
+
+
+def _is_hidden(tag) -> bool:
+    if tag.name in KEEP_TAGS or tag.attrs is None:
+        return False
+    if tag.get("aria-hidden") == "true" or tag.has_attr("hidden"):
+        return True
+    return bool(HIDDEN_STYLE_RE.search(tag.get("style", "")))
+
+
+def _looks_like_boilerplate(tag) -> bool:
+    """Tag, role or id/class marks it as boilerplate; the caller still checks it isn't a page wrapper"""
+    if tag.name in KEEP_TAGS or tag.attrs is None:
+        return False
+    if tag.name in BOILERPLATE_TAGS:
+        return True
+    if tag.get("role", "").lower() in DROP_ROLES:
+        return True
+    marker = " ".join([tag.get("id", ""), *tag.get("class", [])])
+    return bool(marker.strip()) and bool(BOILERPLATE_RE.search(marker))
+
+
+def _is_wrapper(tag, page_chars: int) -> bool:
+    """Holds the main content or most of the page text, so dropping it would empty the page"""
+    if tag.find(["main", "article"]) is not None:
+        return True
+    return page_chars > 0 and len(tag.get_text(" ", strip=True)) > WRAPPER_TEXT_SHARE * page_chars
+
+
+def extract_visible_text(html: str, max_chars: int = TEXT_MAX_CHARS) -> str:
+    """Visible, non-boilerplate text of an HTML page, one block per line"""
+    if not html:
+        return ""
+    soup = BeautifulSoup(html, _parser())
+    title = soup.title.get_text(" ", strip=True) if soup.title else ""
+    for tag in soup(DROP_TAGS):
+        if not tag.decomposed:
+            tag.decompose()
+    for tag in soup.find_all(_is_hidden):
+        if not tag.decomposed:
+            tag.decompose()
+    page_chars = len(soup.get_text(" ", strip=True))
+    for tag in soup.find_all(_looks_like_boilerplate):
+        if tag.decomposed or _is_wrapper(tag, page_chars):
+            continue
+        # An article's own header/footer holds its title and byline
+        if tag.name in ("header", "footer") and tag.find_parent("article"):
+            continue
+        tag.decompose()
+
+    lines, seen, size = [], set(), 0
+    for line in [title, *soup.get_text("\n").splitlines()]:
+        line = " ".join(line.split())
+        if not line or line.casefold() in seen:
+            continue
+        seen.add(line.casefold())
+        if size + len(line) > max_chars:
+            break
+        lines.append(line)
+        size += len(line) + 1
+    return "\n".join(lines)
+
+
+def extract_page_text(url: str, html: str, max_chars: int = TEXT_MAX_CHARS) -> tuple[str, dict]:
+    """extract_visible_text plus before/after token counts, which are logged and added to extraction_stats"""
+    text = extract_visible_text(html, max_chars)
+    counts = {"raw_tokens": count_tokens(html or ""), "extracted_tokens": count_tokens(text)}
+    extraction_stats["pages"] += 1
+    extraction_stats["raw_tokens"] += counts["raw_tokens"]
+    extraction_stats["extracted_tokens"] += counts["extracted_tokens"]
+    saved = 1 - counts["extracted_tokens"] / counts["raw_tokens"] if counts["raw_tokens"] else 0.0
+    print(f"[Extract] {url}: {counts['raw_tokens']} -> {counts['extracted_tokens']} tokens ({saved:.0%} saved)")
+    return text, counts
+
+
+def stats() -> dict:
+    raw = extraction_stats["raw_tokens"]
+    return {
+        **extraction_stats,
+        "saved_ratio": round(1 - extraction_stats["extracted_tokens"] / raw, 4) if raw else 0.0,
+    }
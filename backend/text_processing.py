@@ -1,28 +1,163 @@
-import torch
-from transformers import DistilBertTokenizer, DistilBertModel
-
-# Load BERT model and tokenizer
-tokenizer = DistilBertTokenizer.from_pretrained("distilbert-base-uncased")
-device = "cuda" if torch.cuda.is_available() else "cpu"
-model = DistilBertModel.from_pretrained("distilbert-base-uncased").to(device)
-
-# Define projection layer outside the function to ensure it's consistent across calls
-linear_projection = torch.nn.Linear(768, 512).to(device)
-
-def get_text_embeddings(web_text: str):
-    inputs = tokenizer(web_text, return_tensors="pt", padding=True, truncation=True, max_length=512)
-    
-    # Forward pass through BERT
-    with torch.no_grad():
-        inputs = {i: k.to(device) for i, k in inputs.items()}
-        outputs = model(**inputs)
-    
+import os
+import tempfile
+
+from model_registry import registry, torch_device
+from stage_cache import stage_cache, content_hash
+import onnx_backend
+
+# The 768 -> 512 projection is persisted so text vectors (and cached ones) stay
+# comparable across processes instead of being re-randomized on every start
+TEXT_PROJECTION_PATH = os.getenv(
+    "TEXT_PROJECTION_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "text_projection.pt")
+)
+PROJECTION_SEED = 0
+
+# DistilBERT's max sequence length; long documents are split into windows of this size
+WINDOW_TOKENS = 512
+TEXT_BATCH_SIZE = int(os.getenv("TEXT_BATCH_SIZE", "16"))
+TEXT_MAX_WINDOWS = int(os.getenv("TEXT_MAX_WINDOWS", "16"))
+
+# Load BERT model and tokenizer on first use (or via registry.warmup)
+def load_distilbert():
+    from transformers import DistilBertTokenizerFast, DistilBertModel
+
+    tokenizer = DistilBertTokenizerFast.from_pretrained("distilbert-base-uncased")
+    model = DistilBertModel.from_pretrained("distilbert-base-uncased").to(torch_device())
+    return tokenizer, model
+
+def save_atomically(state_dict, path: str):
+    """torch.save to a temp file, then rename: workers starting together never read a half-written file"""
+    import torch
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            torch.save(state_dict, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def load_text_projection():
+    """Returns the projection layer and a version string identifying its weights"""
+    import torch
+
+    linear_projection = torch.nn.Linear(768, 512)
+    if os.path.exists(TEXT_PROJECTION_PATH):
+        linear_projection.load_state_dict(torch.load(TEXT_PROJECTION_PATH, map_location="cpu"))
+    else:
+        with torch.random.fork_rng(devices=[]):
+            torch.manual_seed(PROJECTION_SEED)
+            linear_projection.reset_parameters()
+        save_atomically(linear_projection.state_dict(), TEXT_PROJECTION_PATH)
+        print(f"[Models] Saved new text projection to {TEXT_PROJECTION_PATH}")
+
+    weights_hash = content_hash(
+        linear_projection.weight.detach().numpy().tobytes(),
+        linear_projection.bias.detach().numpy().tobytes()
+    )
+    version = f"distilbert-base-uncased|cls|proj:{weights_hash[:16]}"
+    return linear_projection.to(torch_device()), version
+
+registry.register("distilbert", load_distilbert)
+registry.register("text_projection", load_text_projection)
+
+def get_tokenizer():
+    """The tokenizer alone, without loading the eager model when running on ONNX"""
+    tokenizer, _ = registry.get("distilbert_onnx" if onnx_backend.use_onnx() else "distilbert")
+    return tokenizer
+
+def _cls_embeddings(inputs: dict):
+    """[CLS] hidden states (batch x 768) from whichever backend is configured"""
+    import torch
+    if onnx_backend.use_onnx():
+        _, session = registry.get("distilbert_onnx")
+        feeds = {name: inputs[name].numpy() for name in ("input_ids", "attention_mask")}
+        return torch.from_numpy(session.run(None, feeds)[0])
+
+    _, model = registry.get("distilbert")
+    inputs = {i: k.to(model.device) for i, k in inputs.items()}
+    outputs = model(**inputs)
     # Extract the [CLS] token embedding, which represents the entire sentence
-    # The [CLS] token is the first token (index 0) in the sequence
-    cls_embedding = outputs.last_hidden_state[:, 0, :]  # Shape: [batch_size, 768]
-    
-    # Apply the linear projection to reduce from 768 to 512 dimensions
-    projected_embedding = linear_projection(cls_embedding)  # Shape: [batch_size, 512]
-    
-    # Convert to a 1D list for the API response
-    return projected_embedding.cpu().detach().numpy()[0].tolist()  # Shape: [512]
\ No newline at end of file
+    return outputs.last_hidden_state[:, 0, :]  # Shape: [batch_size, 768]
+
+def embed_windows(token_windows: list[list[int]], batch_size: int = TEXT_BATCH_SIZE):
+    """
+    Projected [CLS] vectors for pre-tokenized windows (special tokens included).
+    Windows are sorted by length so each batch is only padded to its own longest window.
+    """
+    import torch
+    tokenizer = get_tokenizer()
+    linear_projection, _ = registry.get("text_projection")
+
+    order = sorted(range(len(token_windows)), key=lambda i: len(token_windows[i]))
+    embeddings = [None] * len(token_windows)
+    for start in range(0, len(order), batch_size):
+        batch = order[start:start + batch_size]
+        inputs = tokenizer.pad({"input_ids": [token_windows[i] for i in batch]}, padding=True, return_tensors="pt")
+
+        # Forward pass through BERT
+        with torch.no_grad():
+            cls_embedding = _cls_embeddings(inputs).to(linear_projection.weight.device)
+
+            # Apply the linear projection to reduce from 768 to 512 dimensions
+            projected = linear_projection(cls_embedding).cpu().numpy()  # Shape: [batch_size, 512]
+
+        for i, vector in zip(batch, projected):
+            embeddings[i] = vector
+    return embeddings
+
+def split_windows(token_ids: list[int], max_windows: int) -> list[list[int]]:
+    """Cut a document's tokens into <=512-token windows, each wrapped in [CLS] ... [SEP]"""
+    tokenizer = get_tokenizer()
+    body = WINDOW_TOKENS - 2
+    chunks = [token_ids[i:i + body] for i in range(0, max(len(token_ids), 1), body)][:max_windows]
+    return [tokenizer.build_inputs_with_special_tokens(chunk) for chunk in chunks]
+
+def get_text_embeddings_batch(texts: list[str], batch_size: int = TEXT_BATCH_SIZE, long_document: bool = False):
+    """
+    512-d embeddings for many texts at once.
+    By default only the first 512 tokens of each text count, like get_text_embeddings.
+    With long_document=True every text is split into 512-token windows (up to
+    TEXT_MAX_WINDOWS), all windows run as one batch, and each text's window
+    vectors are mean-pooled weighted by window length.
+    """
+    _, version = registry.get("text_projection")
+    if onnx_backend.use_onnx():
+        version = f"{version}|{onnx_backend.INFERENCE_BACKEND}"
+    if long_document:
+        version = f"{version}|windows{TEXT_MAX_WINDOWS}"
+    text_hashes = [content_hash(text) for text in texts]
+    return stage_cache.cached(
+        "text_embedding", version, text_hashes, texts,
+        lambda misses: _embed_texts(misses, batch_size, long_document)
+    )
+
+def _embed_texts(texts: list[str], batch_size: int, long_document: bool) -> list[list[float]]:
+    import numpy as np
+    tokenizer = get_tokenizer()
+
+    if long_document:
+        token_ids = tokenizer(
+            texts, add_special_tokens=False, truncation=True,
+            max_length=TEXT_MAX_WINDOWS * (WINDOW_TOKENS - 2)
+        )["input_ids"]
+        doc_windows = [split_windows(ids, TEXT_MAX_WINDOWS) for ids in token_ids]
+    else:
+        token_ids = tokenizer(texts, truncation=True, max_length=WINDOW_TOKENS)["input_ids"]
+        doc_windows = [[ids] for ids in token_ids]
+
+    flat_windows = [window for windows in doc_windows for window in windows]
+    window_vectors = embed_windows(flat_windows, batch_size=batch_size)
+
+    embeddings = []
+    position = 0
+    for windows in doc_windows:
+        vectors = window_vectors[position:position + len(windows)]
+        weights = [len(window) for window in windows]
+        embeddings.append(np.average(vectors, axis=0, weights=weights).tolist())
+        position += len(windows)
+    return embeddings
+
+def get_text_embeddings(web_text: str, long_document: bool = False):
+    return get_text_embeddings_batch([web_text], long_document=long_document)[0]
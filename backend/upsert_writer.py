@@ -0,0 +1,169 @@
+"""
+Buffered, batched upserts into a Pinecone index.
+
+Callers add one vector at a time. The writer buffers vectors and sends them as
+one index.upsert call when the buffer reaches `batch_size` vectors or
+`max_bytes` of estimated request size, or when its oldest vector has waited
+`flush_interval` seconds. Up to `max_parallel` batches are in flight at once.
+
+A failed batch is retried with backoff. If it still fails, it is split in
+half, so one bad vector only fails its own caller. Each caller's future
+resolves once its vector is written. close() flushes whatever is left.
+"""
+
+import asyncio
+import json
+import os
+
+import numpy as np
+
+from server_utils import run_blocking
+
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "100"))
+# Pinecone rejects requests over 2 MB; stay under it
+UPSERT_MAX_BYTES = int(os.getenv("UPSERT_MAX_BYTES", str(1_800_000)))
+UPSERT_FLUSH_INTERVAL = float(os.getenv("UPSERT_FLUSH_INTERVAL", "1.0"))
+UPSERT_MAX_PARALLEL = int(os.getenv("UPSERT_MAX_PARALLEL", "4"))
+UPSERT_MAX_RETRIES = int(os.getenv("UPSERT_MAX_RETRIES", "3"))
+# JSON bytes per value once sent with 9 significant digits (float32 precision): embedding
+# values average ~14.7 with their ", ", and tiny ones reach 17 ("-1.23456784e-05, ").
+# A batch that still comes out over Pinecone's limit fails and is split like any other
+FLOAT32_JSON_BYTES = 16
+
+
+def estimate_bytes(vector: dict) -> int:
+    """JSON size of one vector in an upsert request, without serializing the values"""
+    size = 32 + len(vector["id"]) + FLOAT32_JSON_BYTES * len(vector["values"])
+    if vector.get("metadata"):
+        size += len(json.dumps(vector["metadata"]))
+    return size
+
+
+def float32_values(values) -> list[float]:
+    """
+    values rounded to 9 significant digits, which round-trips float32 (all Pinecone
+    stores), so each serializes to ~15 bytes of JSON instead of ~22
+    """
+    values = np.asarray(values, dtype=np.float32).tolist()
+    # parse_int: "%g" writes 0.0 as "0", and Pinecone's client wants floats
+    return json.loads("[" + ",".join(["%.9g"] * len(values)) % tuple(values) + "]", parse_int=float)
+
+
+def float32_vectors(vectors: list[dict]) -> list[dict]:
+    return [{**vector, "values": float32_values(vector["values"])} for vector in vectors]
+
+
+class UpsertWriter:
+    def __init__(self, index, namespace: str = "", batch_size: int = UPSERT_BATCH_SIZE,
+                 max_bytes: int = UPSERT_MAX_BYTES, flush_interval: float = UPSERT_FLUSH_INTERVAL,
+                 max_parallel: int = UPSERT_MAX_PARALLEL, max_retries: int = UPSERT_MAX_RETRIES,
+                 rate_limiter=None):
+        self.index = index
+        self.namespace = namespace
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.rate_limiter = rate_limiter
+        self.slots = asyncio.Semaphore(max_parallel)
+        self.buffer = []  # (vector, size, future)
+        self.buffer_bytes = 0
+        self.timer = None
+        self.flushes = set()
+        self.counters = {"vectors": 0, "batches": 0, "bytes": 0, "retries": 0, "splits": 0, "failed": 0}
+
+    def add(self, vector: dict) -> asyncio.Future:
+        """Queue {"id", "values", ["metadata"]}; the returned future resolves once it is written"""
+        size = estimate_bytes(vector)
+        if self.buffer and self.buffer_bytes + size > self.max_bytes:
+            self._flush_buffer()
+        future = asyncio.get_running_loop().create_future()
+        self.buffer.append((vector, size, future))
+        self.buffer_bytes += size
+        if len(self.buffer) >= self.batch_size:
+            self._flush_buffer()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(self.flush_interval, self._flush_buffer)
+        return future
+
+    async def upsert(self, vector_id: str, values, metadata: dict | None = None):
+        """Add one vector and wait until it is written"""
+        vector = {"id": vector_id, "values": [float(v) for v in values]}
+        if metadata:
+            vector["metadata"] = metadata
+        await self.add(vector)
+
+    def _flush_buffer(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if not self.buffer:
+            return
+        batch, self.buffer, self.buffer_bytes = self.buffer, [], 0
+        task = asyncio.create_task(self._write(batch))
+        self.flushes.add(task)
+        task.add_done_callback(self.flushes.discard)
+
+    async def _write(self, batch: list):
+        async with self.slots:
+            error = await self._upsert_with_retries(batch)
+        if error is None:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_result(None)
+        elif len(batch) > 1:
+            # Split so only the vectors that really fail are reported as failed
+            self.counters["splits"] += 1
+            middle = len(batch) // 2
+            await asyncio.gather(self._write(batch[:middle]), self._write(batch[middle:]))
+        else:
+            self.counters["failed"] += 1
+            vector, _, future = batch[0]
+            print(f"[Upsert] Giving up on {vector['id']}: {error!r}")
+            if not future.done():
+                future.set_exception(error)
+
+    async def _upsert_with_retries(self, batch: list):
+        """None on success, else the last error"""
+        vectors = await run_blocking(float32_vectors, [vector for vector, _, _ in batch])
+        error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.counters["retries"] += 1
+                await asyncio.sleep(min(0.5 * 2 ** (attempt - 1), 8))
+            try:
+                if self.rate_limiter is not None:
+                    await self.rate_limiter.acquire()
+                response = await run_blocking(self.index.upsert, vectors=vectors, namespace=self.namespace)
+                upserted = getattr(response, "upserted_count", None)
+                if upserted is None and isinstance(response, dict):
+                    upserted = response.get("upserted_count")
+                if upserted is not None and upserted < len(vectors):
+                    # Upserts are idempotent, so resending the whole batch is safe
+                    raise RuntimeError(f"partial upsert: {upserted}/{len(vectors)}")
+                self.counters["vectors"] += len(vectors)
+                self.counters["batches"] += 1
+                self.counters["bytes"] += sum(size for _, size, _ in batch)
+                return None
+            except Exception as e:
+                error = e
+                print(f"[Upsert] Batch of {len(vectors)} failed (attempt {attempt + 1}): {e!r}")
+        return error
+
+    async def flush(self):
+        """Write everything buffered so far and wait for all in-flight batches"""
+        self._flush_buffer()
+        while self.flushes:
+            await asyncio.gather(*list(self.flushes), return_exceptions=True)
+
+    async def close(self):
+        await self.flush()
+
+    def stats(self) -> dict:
+        batches = self.counters["batches"]
+        return {
+            **self.counters,
+            "buffered": len(self.buffer),
+            "in_flight_batches": len(self.flushes),
+            "avg_batch_size": round(self.counters["vectors"] / batches, 2) if batches else 0.0,
+        }
@@ -0,0 +1,81 @@
+import csv
+import io
+from urllib.parse import urlsplit, urlunsplit
+
+DEFAULT_PORTS = {("http", 80), ("https", 443)}
+
+def normalize_url(url: str) -> str:
+    """
+    Canonical form of a submitted site URL, used to dedupe jobs:
+    adds https:// when missing, lowercases scheme and host, drops default
+    ports, fragments and trailing slashes.
+    """
+    url = url.strip()
+    if "://" not in url:
+        url = "https://" + url
+    try:
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        host = (parts.hostname or "").rstrip(".")
+        port = parts.port
+    except ValueError:
+        return url.lower()
+
+    netloc = host if port is None or (scheme, port) in DEFAULT_PORTS else f"{host}:{port}"
+    return urlunsplit((scheme, netloc, parts.path.rstrip("/"), parts.query, ""))
+
+# Second-level labels that country-code domains are registered under (bbc.co.uk, abc.net.au)
+SECOND_LEVEL_LABELS = {"ac", "co", "com", "edu", "gob", "go", "gov", "mil", "ne", "net", "or", "org"}
+
+def registrable_domain(url: str) -> str:
+    """
+    The domain a site is registered under, used to group hosts for crawl politeness:
+    support.google.com -> google.com, news.bbc.co.uk -> bbc.co.uk. A heuristic stand-in
+    for the public suffix list; IP addresses come back unchanged.
+    """
+    host = urlsplit(normalize_url(url)).hostname or ""
+    if ":" in host or host.replace(".", "").isdigit():
+        return host
+    labels = host.split(".")
+    keep = 3 if len(labels) >= 3 and len(labels[-1]) == 2 and labels[-2] in SECOND_LEVEL_LABELS else 2
+    return ".".join(labels[-keep:])
+
+# Header names recognised as the URL column of an uploaded CSV
+URL_COLUMNS = ("url", "origin", "website", "site", "domain")
+
+def urls_from_csv(text: str) -> list[str]:
+    """URL cells from CSV text: the first column named like URL_COLUMNS, else the first column"""
+    rows = [row for row in csv.reader(io.StringIO(text)) if row]
+    if not rows:
+        return []
+    header = [cell.strip().lower() for cell in rows[0]]
+    column = next((header.index(name) for name in URL_COLUMNS if name in header), None)
+    if column is not None:
+        rows = rows[1:]
+    else:
+        column = 0
+    return [row[column] for row in rows if len(row) > column]
+
+def is_valid_site_url(url: str) -> bool:
+    parts = urlsplit(url)
+    host = parts.hostname or ""
+    return parts.scheme in ("http", "https") and ("." in host or host == "localhost") and not any(c.isspace() for c in url)
+
+def clean_urls(urls: list) -> tuple[list[str], list[str], int]:
+    """Normalize and dedupe submitted URLs: (unique valid urls in order, invalid entries, duplicate count)"""
+    unique, invalid, duplicates = {}, [], 0
+    for url in urls:
+        if not isinstance(url, str) or not url.strip():
+            continue
+        try:
+            normalized = normalize_url(url)
+            valid = is_valid_site_url(normalized)
+        except ValueError:
+            valid = False
+        if not valid:
+            invalid.append(url)
+        elif normalized in unique:
+            duplicates += 1
+        else:
+            unique[normalized] = None
+    return list(unique), invalid, duplicates
@@ -0,0 +1,177 @@
+"""
+In-process vector index over an exported snapshot of the Pinecone site index.
+
+The site corpus is only a few thousand vectors, so a brute-force matmul over a
+memory-mapped matrix is faster than a network round-trip to Pinecone. An
+optional HNSW mode (hnswlib) is available for larger snapshots.
+
+Snapshot layout (written by export_index.py):
+    <dir>/vectors.npy   float32 or float16 matrix, one L2-normalized row per site
+    <dir>/ids.json      list of site ids, same order as the rows
+    <dir>/hnsw.bin      optional, cached HNSW graph (built on first load)
+"""
+
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import hnswlib
+except ImportError:  # only needed for mode="hnsw"
+    hnswlib = None
+
+INDEX_MODES = ("pinecone", "exact", "hnsw")
+
+# Rows are scored in chunks so float16 snapshots are upcast a slice at a time
+CHUNK_ROWS = 8192
+
+
+class QueryResult:
+    """Mirrors the part of Pinecone's QueryResponse that main.py reads."""
+
+    def __init__(self, matches):
+        self.matches = matches
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def write_snapshot(path, ids: list[str], vectors, dtype: str = "float32") -> Path:
+    """Normalize `vectors` and write them as a snapshot directory."""
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+
+    matrix = normalize_rows(np.asarray(vectors, dtype=np.float32)).astype(dtype)
+    np.save(path / "vectors.npy", matrix)
+    (path / "ids.json").write_text(json.dumps(ids), encoding="utf-8")
+
+    # A stale graph would point at the wrong rows
+    (path / "hnsw.bin").unlink(missing_ok=True)
+    return path
+
+
+class LocalIndex:
+    """Exact (or HNSW) cosine search over a snapshot directory."""
+
+    def __init__(self, path, mode: str = "exact", ef: int = 200):
+        if mode not in ("exact", "hnsw"):
+            raise ValueError(f"Unknown local index mode: {mode}")
+
+        self.path = Path(path)
+        self.mode = mode
+        self.ids = json.loads((self.path / "ids.json").read_text(encoding="utf-8"))
+        self.matrix = np.load(self.path / "vectors.npy", mmap_mode="r")
+
+        if len(self.ids) != self.matrix.shape[0]:
+            raise ValueError(
+                f"Snapshot mismatch: {len(self.ids)} ids vs {self.matrix.shape[0]} vectors"
+            )
+
+        self.hnsw = None
+        if mode == "hnsw":
+            self.hnsw = self._load_hnsw(ef)
+
+    @property
+    def dim(self) -> int:
+        return self.matrix.shape[1]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _load_hnsw(self, ef: int):
+        if hnswlib is None:
+            raise ImportError("mode='hnsw' requires hnswlib (pip install hnswlib)")
+
+        graph = hnswlib.Index(space="ip", dim=self.dim)
+        graph_path = self.path / "hnsw.bin"
+        if graph_path.exists():
+            graph.load_index(str(graph_path), max_elements=len(self))
+        else:
+            print(f"[Index] Building HNSW graph for {len(self)} vectors...")
+            graph.init_index(max_elements=len(self), ef_construction=200, M=32)
+            for start in range(0, len(self), CHUNK_ROWS):
+                chunk = np.asarray(self.matrix[start:start + CHUNK_ROWS], dtype=np.float32)
+                graph.add_items(chunk, np.arange(start, start + len(chunk)))
+            graph.save_index(str(graph_path))
+        graph.set_ef(ef)
+        return graph
+
+    def score_all(self, vectors) -> np.ndarray:
+        """Cosine scores of every site against each query, shape (n_sites, n_queries)."""
+        queries = normalize_rows(np.atleast_2d(np.asarray(vectors, dtype=np.float32)))
+        if queries.shape[1] != self.dim:
+            raise ValueError(f"Query dimension {queries.shape[1]} != index dimension {self.dim}")
+
+        if self.matrix.dtype == np.float32:
+            return np.asarray(self.matrix @ queries.T)
+
+        scores = np.empty((len(self), len(queries)), dtype=np.float32)
+        for start in range(0, len(self), CHUNK_ROWS):
+            chunk = np.asarray(self.matrix[start:start + CHUNK_ROWS], dtype=np.float32)
+            scores[start:start + len(chunk)] = chunk @ queries.T
+        return scores
+
+    def _top_k(self, scores: np.ndarray, top_k: int):
+        top_k = min(top_k, len(scores))
+        if top_k <= 0:
+            return []
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [{"id": self.ids[i], "score": float(scores[i])} for i in top]
+
+    def query_many(self, vectors, top_k: int = 500) -> list[QueryResult]:
+        """Run several queries in one pass over the matrix."""
+        if self.hnsw is not None:
+            queries = normalize_rows(np.atleast_2d(np.asarray(vectors, dtype=np.float32)))
+            labels, distances = self.hnsw.knn_query(queries, k=min(top_k, len(self)))
+            # hnswlib's "ip" space returns 1 - dot product
+            return [
+                QueryResult([
+                    {"id": self.ids[label], "score": float(1.0 - dist)}
+                    for label, dist in zip(row_labels, row_distances)
+                ])
+                for row_labels, row_distances in zip(labels, distances)
+            ]
+
+        scores = self.score_all(vectors)
+        return [QueryResult(self._top_k(scores[:, q], top_k)) for q in range(scores.shape[1])]
+
+    def query(self, vector, top_k: int = 500) -> QueryResult:
+        return self.query_many([vector], top_k=top_k)[0]
+
+
+def normalize_scores(scores: np.ndarray, method: str = "none") -> np.ndarray:
+    """Per-column score normalization: "none", "minmax" (to [0, 1]) or "zscore"."""
+    if method == "none":
+        return scores
+    if method == "minmax":
+        low, high = scores.min(axis=0), scores.max(axis=0)
+        span = np.where(high > low, high - low, 1.0)
+        return (scores - low) / span
+    if method == "zscore":
+        std = scores.std(axis=0)
+        return (scores - scores.mean(axis=0)) / np.where(std > 0, std, 1.0)
+    raise ValueError(f"Unknown normalization: {method}")
+
+
+def load_local_index(mode: str | None = None, path: str | None = None):
+    """
+    Load the local index selected by VECTOR_INDEX_MODE / VECTOR_INDEX_PATH.
+    Returns None when the mode is "pinecone" (the default).
+    """
+    mode = mode or os.getenv("VECTOR_INDEX_MODE", "pinecone")
+    path = path or os.getenv("VECTOR_INDEX_PATH", "index_snapshot")
+
+    if mode not in INDEX_MODES:
+        raise ValueError(f"VECTOR_INDEX_MODE must be one of {INDEX_MODES}, got {mode!r}")
+    if mode == "pinecone":
+        return None
+
+    local_index = LocalIndex(path, mode=mode, ef=int(os.getenv("VECTOR_INDEX_EF", "200")))
+    print(f"[Index] Loaded {len(local_index)} vectors from {path} (mode={mode}, dtype={local_index.matrix.dtype})")
+    return local_index